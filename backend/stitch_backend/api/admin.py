@@ -4,19 +4,37 @@ from .models import (
     Address,
     Categories,
     Products,
+    ProductVariant,
     ShoppingCarts,
     CartItems,
     Payments,
     Orders,
-    OrderItems
+    OrderItems,
+    InventorySlot,
+    InventoryReservation,
+    IdempotencyKey,
+    OutboxJob,
+    PaymentWebhookEvent,
+    ArchivedOrder,
+    ArchivedOrderItem,
+    ArchivedPayment,
 )
 
 admin.site.register(AppUser)
 admin.site.register(Address)
 admin.site.register(Categories)
 admin.site.register(Products)
+admin.site.register(ProductVariant)
 admin.site.register(ShoppingCarts)
 admin.site.register(CartItems)
 admin.site.register(Payments)
 admin.site.register(Orders)
-admin.site.register(OrderItems)
\ No newline at end of file
+admin.site.register(OrderItems)
+admin.site.register(InventorySlot)
+admin.site.register(InventoryReservation)
+admin.site.register(IdempotencyKey)
+admin.site.register(OutboxJob)
+admin.site.register(PaymentWebhookEvent)
+admin.site.register(ArchivedOrder)
+admin.site.register(ArchivedOrderItem)
+admin.site.register(ArchivedPayment)
@@ -0,0 +1,73 @@
+# stitch_backend/api/archive.py
+"""
+Moves closed orders out of the hot tables.
+
+orders, order_items and payments only grow, and every per-user order query
+and admin list pays for the years of Delivered/Cancelled history in them.
+`manage.py archive_orders --older-than DAYS` moves orders in a closed status
+(ARCHIVABLE_STATUSES) that have not changed for DAYS into archived_orders,
+together with their items (archived_order_items) and payment
+(archived_payments). Rows keep their primary keys, so ids already handed to
+clients stay valid.
+
+Work is done in batches. Candidates are found with a plain read that walks
+the primary key. Each batch is then one short transaction: lock the orders,
+re-check them, copy them with their items and payment, and delete the
+originals.
+
+Archived rows are read-only. Reads include them only on request
+(?include_archived=1, see ArchiveMixin in api/views.py). Sales history
+readers such as rankings.backfill_from_order_items() read both tables.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    ArchivedOrder, ArchivedOrderItem, ArchivedPayment, OrderItems, Orders, OrderStatus, Payments,
+)
+
+# Statuses an order does not normally leave. Delivered orders can still be refunded, so pick
+# an age past the refund window.
+ARCHIVABLE_STATUSES = (OrderStatus.DELIVERED, OrderStatus.CANCELLED, OrderStatus.REFUNDED)
+
+
+def _copy(archive_model, row, archived_at):
+    # The archive models share the originals' column names
+    return archive_model(
+        archived_at=archived_at,
+        **{field.attname: getattr(row, field.attname) for field in type(row)._meta.concrete_fields},
+    )
+
+
+def archivable(cutoff):
+    return Orders.objects.filter(order_status__in=ARCHIVABLE_STATUSES, updated_at__lt=cutoff)
+
+
+def archive_orders(cutoff, batch_size=500, now=None):
+    """
+    Archives closed orders last changed before `cutoff`, batch_size per
+    transaction. Yields (orders, items, payments) moved per batch.
+    """
+    now = now or timezone.now()
+    last_pk = 0
+    while True:
+        pks = list(
+            archivable(cutoff).filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not pks:
+            return
+        last_pk = pks[-1]
+        with transaction.atomic():
+            # Re-checked under the lock: an order may have changed since it was picked
+            orders = list(archivable(cutoff).select_for_update().filter(pk__in=pks).order_by('pk'))
+            if not orders:
+                continue
+            ids = [order.pk for order in orders]
+            items = list(OrderItems.objects.filter(order_id__in=ids).order_by('pk'))
+            payments = list(Payments.objects.filter(order_id__in=ids).order_by('pk'))
+            ArchivedOrder.objects.bulk_create([_copy(ArchivedOrder, order, now) for order in orders])
+            ArchivedOrderItem.objects.bulk_create([_copy(ArchivedOrderItem, item, now) for item in items])
+            ArchivedPayment.objects.bulk_create([_copy(ArchivedPayment, payment, now) for payment in payments])
+            # Cascades to the items and payment, and unlinks any inventory reservations
+            Orders.objects.filter(pk__in=ids).delete()
+        yield len(orders), len(items), len(payments)
@@ -0,0 +1,175 @@
+# stitch_backend/api/cache.py
+"""
+Versioned read-through cache for catalog (products and categories) reads.
+
+Every cache key embeds the current catalog version, so bumping the version
+invalidates every cached catalog response at once without having to find
+and delete the individual keys. Old entries simply age out of the cache.
+
+Stock levels and sales counters change with every order, so they are not
+taken from the cached payload. refresh_live_fields() overwrites them with
+current values, read by primary key for just the rows in the response.
+Checkouts, recorded sales and inventory syncs therefore leave the version
+alone, with two exceptions for stock:
+
+* Which rows match a filter on an exact stock level (?stock_quantity_gte=)
+  changes with every sale, so those requests skip the cache
+  (depends_on_stock).
+* Filters that only ask whether stock is above zero (?size=, variant
+  ?in_stock=) stay cached. Checkout and the inventory sync bump the version
+  when a product or variant sells out or comes back into stock.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
+
+from .models import Products, ProductVariant
+
+VERSION_KEY = 'catalog:version'
+
+_MISSING = object()
+
+# Primary key of a serialized row -> (model, fields served live rather than from the cache)
+LIVE_FIELDS = {
+    'product_id': (Products, ('stock_quantity', 'purchase_quantity')),
+    'variant_id': (ProductVariant, ('stock_quantity',)),
+}
+
+# Query parameters that select or order rows by their exact stock level
+STOCK_PARAMS = frozenset({'stock_quantity', 'stock_quantity_gte'})
+
+DEFAULTS = {
+    'ALIAS': 'default',
+    'TIMEOUT': 60 * 15,   # seconds a cached catalog response lives
+    'LOCK_TIMEOUT': 10,   # seconds a single rebuild may hold the rebuild lock
+    'WAIT_TIMEOUT': 5,    # seconds other readers wait for that rebuild
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'CATALOG_CACHE', {})}
+
+
+def get_cache():
+    return caches[get_config()['ALIAS']]
+
+
+def get_catalog_version():
+    cache = get_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Seed from the clock rather than 1 so that a version key lost to
+        # eviction can never restart at a number that old entries still use.
+        cache.add(VERSION_KEY, time.time_ns() // 1000, timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """Invalidates every cached catalog response. Call after catalog writes commit."""
+    cache = get_cache()
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        # The version key was never set or has been evicted
+        return get_catalog_version()
+
+
+def depends_on_stock(request):
+    """True if the request's rows depend on exact stock levels; such responses are not cached."""
+    return not STOCK_PARAMS.isdisjoint(request.query_params) or any(
+        'stock_quantity' in value for value in request.query_params.getlist('ordering')
+    )
+
+
+def request_key(request, namespace):
+    """Builds a cache key from the request URL, its query parameters and the catalog version."""
+    params = sorted(
+        (name, value)
+        for name in request.query_params
+        for value in request.query_params.getlist(name)
+    )
+    # The host is part of the key because paginated responses embed absolute next/previous links
+    digest = hashlib.sha1(repr((request.get_host(), request.path, params)).encode()).hexdigest()
+    return f'catalog:{get_catalog_version()}:{namespace}:{digest}'
+
+
+def _plain(data):
+    # ReturnDict/ReturnList keep a reference to their serializer, which we do not want pickled
+    if isinstance(data, (dict, ReturnDict)):
+        return {key: _plain(value) for key, value in data.items()}
+    if isinstance(data, (list, ReturnList)):
+        return [_plain(value) for value in data]
+    return data
+
+
+def get_or_build(key, builder):
+    """
+    Returns the cached value for key, calling builder() to rebuild it on a miss.
+
+    Only one caller rebuilds a cold key: it takes a short-lived lock with
+    cache.add(), which is atomic on every Django cache backend. Everyone else
+    polls for the rebuilt value until WAIT_TIMEOUT and only then falls back to
+    building it themselves, so a cold key under load costs one rebuild.
+    """
+    cache = get_cache()
+    config = get_config()
+
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, timeout=config['LOCK_TIMEOUT']):
+        try:
+            value = _plain(builder())
+            cache.set(key, value, timeout=config['TIMEOUT'])
+            return value
+        finally:
+            cache.delete(lock_key)
+
+    deadline = time.monotonic() + config['WAIT_TIMEOUT']
+    delay = 0.01
+    while time.monotonic() < deadline:
+        time.sleep(delay)
+        delay = min(delay * 2, 0.25)
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if cache.get(lock_key) is None:
+            # The rebuild finished without caching anything (e.g. it raised a 404)
+            break
+    return _plain(builder())
+
+
+def refresh_live_fields(data):
+    """Overwrites the LIVE_FIELDS of every product and variant in a response with current values, in place."""
+    rows = {key: [] for key in LIVE_FIELDS}
+
+    def collect(value):
+        if isinstance(value, dict):
+            for key, (_, fields) in LIVE_FIELDS.items():
+                if key in value and any(field in value for field in fields):
+                    rows[key].append(value)
+            for child in value.values():
+                collect(child)
+        elif isinstance(value, list):
+            for child in value:
+                collect(child)
+
+    collect(data)
+    for key, (model, fields) in LIVE_FIELDS.items():
+        if not rows[key]:
+            continue
+        current = {
+            pk: values
+            for pk, *values in model.objects.filter(pk__in={row[key] for row in rows[key]}).values_list('pk', *fields)
+        }
+        for row in rows[key]:
+            for field, value in zip(fields, current.get(row[key], ())):
+                if field in row:
+                    row[field] = value
+    return data
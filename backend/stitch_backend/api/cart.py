@@ -0,0 +1,246 @@
+# stitch_backend/api/cart.py
+"""
+Cart pricing, shared by the cart summary endpoint and checkout.
+
+The discounted price of every line and the cart totals are computed by the
+database in one query over cart_items joined to products (and the optional
+variant): per-line values come from annotations and the totals from window
+sums over the same rows, so lines and totals can never disagree.
+
+    unit_price = round((product.price + variant.price_delta) * (100 - product.discount) / 100, 2)
+    line_total = unit_price * quantity
+
+Products.discount is a percentage (0-100).
+
+Batched cart edits (fold_operations/apply_operations) are written with
+INSERT ... ON DUPLICATE KEY UPDATE (ON CONFLICT elsewhere) against the
+(cart, product, variant_key) unique key, so a line that already exists is
+updated in place instead of tripping the constraint.
+
+Carts expire CART_TTL after their last change (touch_cart); the sweep_carts
+command empties expired carts with sweep_expired_items().
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (
+    BooleanField, DecimalField, ExpressionWrapper, F, IntegerField, Q, Sum, Value, Window,
+)
+from django.db.models.functions import Coalesce, Round
+from django.utils import timezone
+
+from .db import upsert
+from .models import CartItems, Products, ProductVariant, ShoppingCarts
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+ZERO = Decimal('0.00')
+
+DEFAULT_CART_TTL = timedelta(days=30)
+# A cart touched again within this long keeps its expiry, so bursts of edits cost one write
+TOUCH_GRANULARITY = timedelta(minutes=5)
+
+
+def list_price(prefix=''):
+    """Product price plus the variant's price delta, for rows that reach products via `prefix`."""
+    return ExpressionWrapper(
+        F(f'{prefix}product__price') + Coalesce(F(f'{prefix}variant__price_delta'), Value(ZERO), output_field=MONEY),
+        output_field=MONEY,
+    )
+
+
+def unit_price(prefix=''):
+    """The discounted, rounded price of one unit."""
+    return Round(
+        ExpressionWrapper(
+            list_price(prefix) * (Value(Decimal('100')) - F(f'{prefix}product__discount')) / Value(Decimal('100')),
+            output_field=MONEY,
+        ),
+        2,
+        output_field=MONEY,
+    )
+
+
+def priced_items(cart_id):
+    """
+    The cart's items as dicts with unit_price, line_total and stock/availability
+    per line, plus cart-wide totals (repeated on every row). One query.
+    """
+    return (
+        CartItems.objects.filter(cart_id=cart_id)
+        .annotate(
+            list_price=list_price(),
+            unit_price=unit_price(),
+            line_total=ExpressionWrapper(unit_price() * F('quantity'), output_field=MONEY),
+            available_stock=Coalesce(F('variant__stock_quantity'), F('product__stock_quantity'), output_field=IntegerField()),
+            available=ExpressionWrapper(
+                Q(product__is_available=True) & (Q(variant__isnull=True) | Q(variant__is_available=True)),
+                output_field=BooleanField(),
+            ),
+            item_count=Window(expression=Sum(F('quantity'))),
+            cart_total=Window(expression=Sum(unit_price() * F('quantity'), output_field=MONEY)),
+            cart_list_total=Window(expression=Sum(list_price() * F('quantity'), output_field=MONEY)),
+        )
+        .order_by('added_at', 'pk')
+        .values(
+            'cart_item_id', 'product_id', 'variant_id', 'quantity',
+            'product__name', 'product__image_url', 'product__discount', 'variant__size',
+            'list_price', 'unit_price', 'line_total', 'available_stock', 'available',
+            'item_count', 'cart_total', 'cart_list_total',
+        )
+    )
+
+
+def _money(value):
+    return (value if value is not None else ZERO).quantize(Decimal('0.01'))
+
+
+def cart_summary(cart_id):
+    """Line items and totals for a cart, as plain data (money as Decimal)."""
+    rows = list(priced_items(cart_id)) if cart_id is not None else []
+    first = rows[0] if rows else {}
+    subtotal = _money(first.get('cart_list_total'))
+    total = _money(first.get('cart_total'))
+    return {
+        'cart_id': cart_id,
+        'items': [
+            {
+                'cart_item_id': row['cart_item_id'],
+                'product_id': row['product_id'],
+                'variant_id': row['variant_id'],
+                'name': row['product__name'],
+                'image_url': row['product__image_url'],
+                'size': row['variant__size'],
+                'quantity': row['quantity'],
+                'list_price': _money(row['list_price']),
+                'discount': row['product__discount'],
+                'unit_price': _money(row['unit_price']),
+                'line_total': _money(row['line_total']),
+                'on_sale': bool(row['available']),
+                'available': bool(row['available']) and row['available_stock'] >= row['quantity'],
+                'stock_quantity': row['available_stock'],
+            }
+            for row in rows
+        ],
+        'line_count': len(rows),
+        'item_count': first.get('item_count') or 0,
+        'subtotal': subtotal,
+        'discount_total': subtotal - total,
+        'total': total,
+    }
+
+
+def check_operations(operations):
+    """
+    Validates the products and variants named by a batch of cart operations
+    in two queries. Returns {operation index: error message}.
+    Removing a line is always allowed, even for a product no longer on sale.
+    """
+    product_ids = {operation['product_id'] for operation in operations}
+    products = dict(Products.objects.filter(pk__in=product_ids).values_list('pk', 'is_available'))
+    variants = {}
+    for variant_id, product_id, is_available in (
+        ProductVariant.objects.filter(product_id__in=product_ids).values_list('pk', 'product_id', 'is_available')
+    ):
+        variants[variant_id] = (product_id, is_available)
+    sized_products = {product_id for product_id, _ in variants.values()}
+
+    errors = {}
+    for index, operation in enumerate(operations):
+        product_id, variant_id = operation['product_id'], operation.get('variant_id')
+        if product_id not in products:
+            errors[index] = "No such product."
+        elif variant_id is not None and variants.get(variant_id, (None,))[0] != product_id:
+            errors[index] = "This variant does not belong to the product."
+        elif operation['op'] == 'remove' or (operation['op'] == 'set' and operation['quantity'] == 0):
+            continue
+        elif not products[product_id] or (variant_id is not None and not variants[variant_id][1]):
+            errors[index] = "This product is not available."
+        elif variant_id is None and product_id in sized_products:
+            errors[index] = "Choose a size: variant_id is required for this product."
+    return errors
+
+
+def fold_operations(operations):
+    """
+    Collapses a batch of validated operations into one action per
+    (product_id, variant_id) line, applied in request order:
+    ('set', quantity) or ('increment', delta). A removal is ('set', 0).
+    """
+    lines = {}
+    for operation in operations:
+        key = (operation['product_id'], operation.get('variant_id'))
+        if operation['op'] == 'remove':
+            lines[key] = ('set', 0)
+        elif operation['op'] == 'set':
+            lines[key] = ('set', operation['quantity'])
+        else:
+            action, quantity = lines.get(key, ('increment', 0))
+            lines[key] = (action, quantity + operation['quantity'])
+    return lines
+
+
+def apply_operations(cart_id, lines):
+    """
+    Writes folded cart operations with at most two upserts and one delete.
+    Lines set to 0, or incremented to 0 or below, are removed.
+    """
+    now = timezone.now()
+
+    def row(product_id, variant_id, quantity):
+        return {
+            'cart_id': cart_id, 'product_id': product_id, 'variant_id': variant_id,
+            'variant_key': variant_id or 0, 'quantity': quantity, 'added_at': now,
+        }
+
+    sets = [row(*key, quantity) for key, (action, quantity) in lines.items() if action == 'set' and quantity > 0]
+    increments = [row(*key, quantity) for key, (action, quantity) in lines.items() if action == 'increment']
+    removals = [key for key, (action, quantity) in lines.items() if action == 'set' and quantity <= 0]
+
+    unique_fields = ['cart', 'product', 'variant_key']
+    upsert(CartItems, sets, unique_fields, update_fields=['quantity'])
+    upsert(CartItems, increments, unique_fields, update_fields=['quantity'], increment_fields=['quantity'])
+
+    stale = Q(quantity__lte=0)
+    for product_id, variant_id in removals:
+        stale |= Q(product_id=product_id, variant_key=variant_id or 0)
+    if removals or increments:
+        CartItems.objects.filter(cart_id=cart_id).filter(stale).delete()
+
+
+def get_cart_ttl():
+    return getattr(settings, 'CART_TTL', DEFAULT_CART_TTL)
+
+
+def touch_cart(cart_id):
+    """Slides the cart's expiry to now + CART_TTL. Call after any change to its items."""
+    expires_at = timezone.now() + get_cart_ttl()
+    ShoppingCarts.objects.filter(
+        Q(expires_at__isnull=True) | Q(expires_at__lt=expires_at - TOUCH_GRANULARITY), pk=cart_id,
+    ).update(expires_at=expires_at)
+
+
+def sweep_expired_items(now=None, batch_size=1000):
+    """
+    Deletes the items of carts whose expiry has passed, batch_size rows per
+    short transaction, and yields the number deleted after each batch. A
+    cart that is touched mid-sweep drops out of the delete's WHERE clause.
+    """
+    now = now or timezone.now()
+    while True:
+        with transaction.atomic():
+            pks = list(
+                CartItems.objects.filter(cart__expires_at__lt=now).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not pks:
+                break
+            deleted, _ = CartItems.objects.filter(pk__in=pks, cart__expires_at__lt=now).delete()
+        yield deleted
+    # Emptied carts start a fresh clock the next time they are used
+    while True:
+        cart_ids = list(ShoppingCarts.objects.filter(expires_at__lt=now).values_list('pk', flat=True)[:batch_size])
+        if not cart_ids:
+            break
+        ShoppingCarts.objects.filter(pk__in=cart_ids, expires_at__lt=now).update(expires_at=None)
+
@@ -0,0 +1,59 @@
+# stitch_backend/api/category_tree.py
+"""
+Maintains the CategoryClosure table alongside Categories.parent_category.
+
+Every category has a (self, self, 0) row plus one row for each of its
+ancestors, so "this category and everything under it" is a single indexed
+lookup on ancestor_id instead of a recursive walk.
+"""
+from .models import Categories, CategoryClosure
+
+
+def insert_node(category_id, parent_id):
+    links = [CategoryClosure(ancestor_id=category_id, descendant_id=category_id, depth=0)]
+    if parent_id is not None:
+        links += [
+            CategoryClosure(ancestor_id=ancestor_id, descendant_id=category_id, depth=depth + 1)
+            for ancestor_id, depth in CategoryClosure.objects.filter(descendant_id=parent_id).values_list('ancestor_id', 'depth')
+        ]
+    CategoryClosure.objects.bulk_create(links)
+
+
+def move_subtree(category_id, new_parent_id):
+    subtree = list(CategoryClosure.objects.filter(ancestor_id=category_id).values_list('descendant_id', 'depth'))
+    subtree_ids = [descendant_id for descendant_id, _ in subtree]
+    if new_parent_id in subtree_ids:
+        raise ValueError('A category cannot be moved under itself or one of its subcategories.')
+
+    # Cut the subtree loose from its old ancestors, then hang it under the new parent's ancestors
+    CategoryClosure.objects.filter(descendant_id__in=subtree_ids).exclude(ancestor_id__in=subtree_ids).delete()
+    if new_parent_id is not None:
+        ancestors = CategoryClosure.objects.filter(descendant_id=new_parent_id).values_list('ancestor_id', 'depth')
+        CategoryClosure.objects.bulk_create([
+            CategoryClosure(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=ancestor_depth + depth + 1)
+            for ancestor_id, ancestor_depth in ancestors
+            for descendant_id, depth in subtree
+        ])
+
+
+def is_descendant(category_id, ancestor_id):
+    return CategoryClosure.objects.filter(ancestor_id=ancestor_id, descendant_id=category_id).exists()
+
+
+def subtree_ids(category_id):
+    """Subquery of the category ids at or below category_id, for use in __in filters."""
+    return CategoryClosure.objects.filter(ancestor_id=category_id).values('descendant_id')
+
+
+def build_tree():
+    """Returns the whole category forest as nested dicts, from a single query."""
+    rows = list(
+        Categories.objects.order_by('name')
+        .values('category_id', 'name', 'description', 'parent_category_id')
+    )
+    nodes = {row['category_id']: {**row, 'children': []} for row in rows}
+    roots = []
+    for node in nodes.values():
+        parent = nodes.get(node['parent_category_id'])
+        (parent['children'] if parent else roots).append(node)
+    return roots
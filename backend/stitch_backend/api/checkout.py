@@ -0,0 +1,181 @@
+# stitch_backend/api/checkout.py
+"""
+Turns a user's cart into an order in one transaction and a fixed number of
+queries, however many lines the cart has:
+
+    lock cart row -> lock products (pk order) -> lock variants (pk order)
+    -> price the cart (api/cart.py) -> validate stock -> insert order
+    -> bulk insert order items -> insert payment -> decrement stock and bump
+    purchase_quantity (one UPDATE each for products and variants)
+    -> enqueue the follow-up jobs (api/outbox.py) -> empty the cart
+
+Rows are always locked products first, then variants, each in primary-key
+order, so two checkouts sharing products queue instead of deadlocking.
+
+Stock for a line with a variant is tracked on the variant; stock for a line
+without one is tracked on the product. Lines whose product or variant has
+inventory slots (api/inventory.py) are the exception: their rows are not
+locked. Their units are claimed from the slots instead: the buyer's holds
+first, then fresh reservations. purchase_quantity and the rankings for those
+units are settled later by the reservation reaper. Each such line adds a few
+queries.
+
+The confirmation email, the ranking update and the low-stock check are
+outbox jobs. They commit with the order and run in `manage.py run_worker`,
+not in the request.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from . import cache as catalog_cache
+from . import cart as cart_pricing
+from . import inventory
+from . import outbox
+from .models import (
+    CartItems, InventoryReservation, OrderItems, Orders, OrderStatus, Payments, PaymentStatus, Products,
+    ProductVariant, ShoppingCarts,
+)
+
+
+class CheckoutError(Exception):
+    """Raised when the cart cannot be checked out. `lines` holds per-line problems, if any."""
+    def __init__(self, detail, lines=None, conflict=False):
+        super().__init__(detail)
+        self.detail = detail
+        self.lines = lines or []
+        self.conflict = conflict
+
+
+def _quantity_case(quantities):
+    return Case(
+        *[When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def place_order(app_user, shipping_address, billing_address, payment_method):
+    """
+    Creates the order, its items and its payment from the user's cart and
+    returns (order, order_items). Raises CheckoutError without writing
+    anything if the cart is empty, a line of a product that comes in sizes
+    names no size, or a line is unavailable or short of stock.
+    """
+    with transaction.atomic():
+        cart = ShoppingCarts.objects.select_for_update().filter(user=app_user).first()
+        if cart is None:
+            raise CheckoutError("Your cart is empty.")
+        in_cart = CartItems.objects.filter(cart=cart)
+        hot = inventory.slotted_keys(in_cart.values('product_id'))
+        locked = in_cart
+        for product_id, variant_key in hot:
+            locked = locked.exclude(product_id=product_id, variant_key=variant_key)
+        # Evaluated for their side effect: row locks held until commit
+        list(Products.objects.select_for_update().filter(pk__in=locked.values('product_id')).order_by('pk').values_list('pk'))
+        list(ProductVariant.objects.select_for_update().filter(pk__in=locked.values('variant_id')).order_by('pk').values_list('pk'))
+
+        summary = cart_pricing.cart_summary(cart.pk)
+        lines = summary['items']
+        if not lines:
+            raise CheckoutError("Your cart is empty.")
+
+        def problem(line, available):
+            return {
+                'cart_item_id': line['cart_item_id'],
+                'product_id': line['product_id'],
+                'variant_id': line['variant_id'],
+                'requested': line['quantity'],
+                'available': available,
+            }
+
+        # A sized product's stock is on its variants; its product-level stock_quantity is not sold from
+        unsized = {line['product_id'] for line in lines if line['variant_id'] is None}
+        if unsized:
+            sized = set(ProductVariant.objects.filter(product_id__in=unsized).values_list('product_id', flat=True))
+            missing = [problem(line, 0) for line in lines if line['variant_id'] is None and line['product_id'] in sized]
+            if missing:
+                raise CheckoutError("Choose a size for every item that comes in sizes.", lines=missing)
+
+        def is_hot(line):
+            return (line['product_id'], line['variant_id'] or 0) in hot
+
+        problems = [problem(line, line['stock_quantity']) for line in lines if not is_hot(line) and not line['available']]
+        problems += [problem(line, 0) for line in lines if is_hot(line) and not line['on_sale']]
+        reservation_ids = []
+        if not problems:
+            # Slotted lines in key order, so two checkouts take slot locks in the same order
+            for line in sorted(filter(is_hot, lines), key=lambda line: (line['product_id'], line['variant_id'] or 0)):
+                try:
+                    reservation_ids += inventory.claim(app_user, line['product_id'], line['variant_id'], line['quantity'])
+                except inventory.InsufficientStock as exc:
+                    problems.append(problem(line, exc.available))
+        if problems:
+            raise CheckoutError("Some items are unavailable or short of stock.", lines=problems, conflict=True)
+
+        order = Orders.objects.create(
+            user=app_user,
+            total_amount=summary['total'],
+            order_status=OrderStatus.PENDING,
+            shipping_address=shipping_address,
+            billing_address=billing_address,
+        )
+        order_items = OrderItems.objects.bulk_create([
+            OrderItems(
+                order=order,
+                product_id=line['product_id'],
+                variant_id=line['variant_id'],
+                quantity=line['quantity'],
+                price_at_time_of_order=line['unit_price'],
+                subtotal=line['line_total'],
+            )
+            for line in lines
+        ])
+        Payments.objects.create(
+            order=order,
+            payment_method=payment_method,
+            amount=summary['total'],
+            payment_status=PaymentStatus.PENDING,
+        )
+
+        if reservation_ids:
+            InventoryReservation.objects.filter(pk__in=reservation_ids).update(order=order)
+
+        sold = Counter()
+        product_stock = Counter()
+        variant_stock = Counter()
+        for line in lines:
+            if is_hot(line):
+                continue
+            sold[line['product_id']] += line['quantity']
+            if line['variant_id'] is None:
+                product_stock[line['product_id']] += line['quantity']
+            else:
+                variant_stock[line['variant_id']] += line['quantity']
+        if sold:
+            Products.objects.filter(pk__in=list(sold)).update(
+                stock_quantity=F('stock_quantity') - _quantity_case(product_stock),
+                purchase_quantity=F('purchase_quantity') + _quantity_case(sold),
+            )
+        if variant_stock:
+            ProductVariant.objects.filter(pk__in=list(variant_stock)).update(
+                stock_quantity=F('stock_quantity') - _quantity_case(variant_stock),
+            )
+        # bulk_create sends no post_save, so the per-item ranking signal does not fire. The ranking
+        # update and the low-stock check run in the worker; purchase_quantity was bumped above.
+        jobs = [('inventory.check_stock', {
+            'product_ids': sorted({line['product_id'] for line in lines if line['variant_id'] is None}),
+            'variant_ids': sorted({line['variant_id'] for line in lines if line['variant_id'] is not None}),
+        })]
+        if sold:
+            jobs.append(('rankings.record_sales', {'lines': sorted(sold.items())}))
+        outbox.enqueue_many(jobs)
+        # Cached listings serve stock live, but ?size= and ?in_stock= chose their rows by it.
+        # Only a sell-out changes those, so only a sell-out empties the cache.
+        if any(line['stock_quantity'] <= line['quantity'] for line in lines if not is_hot(line)):
+            transaction.on_commit(catalog_cache.bump_catalog_version)
+
+        in_cart.delete()
+        ShoppingCarts.objects.filter(pk=cart.pk).update(expires_at=None)
+    return order, order_items
@@ -0,0 +1,65 @@
+# stitch_backend/api/db.py
+"""
+Database helpers the ORM doesn't offer directly.
+"""
+from django.db import connections, router
+
+
+def upsert(model, rows, unique_fields, update_fields, increment_fields=(), batch_size=500):
+    """
+    Inserts rows, or updates the existing row when a unique key collides, in a
+    single statement per batch:
+
+        MySQL:              INSERT ... ON DUPLICATE KEY UPDATE
+        SQLite/PostgreSQL:  INSERT ... ON CONFLICT (unique_fields) DO UPDATE
+
+    rows are dicts keyed by field name (or attname, e.g. product_id). Fields in
+    increment_fields are added to the stored value instead of replacing it,
+    which makes counters safe under concurrent writers. Returns the number of
+    rows the database reports as affected.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    opts = model._meta
+
+    names = list(rows[0])
+    fields = [opts.get_field(name) for name in names]
+    columns = [quote(field.column) for field in fields]
+    table = quote(opts.db_table)
+
+    def assignment(name):
+        column = quote(opts.get_field(name).column)
+        if connection.vendor == 'mysql':
+            new_value = f'VALUES({column})'
+        else:
+            new_value = f'EXCLUDED.{column}'
+        if name in increment_fields:
+            return f'{column} = {table}.{column} + {new_value}'
+        return f'{column} = {new_value}'
+
+    assignments = ', '.join(assignment(name) for name in update_fields)
+    if connection.vendor == 'mysql':
+        conflict = f'ON DUPLICATE KEY UPDATE {assignments}'
+    else:
+        conflict_columns = ', '.join(quote(opts.get_field(name).column) for name in unique_fields)
+        conflict = f'ON CONFLICT ({conflict_columns}) DO UPDATE SET {assignments}'
+
+    affected = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            placeholders = ', '.join(['(' + ', '.join(['%s'] * len(fields)) + ')'] * len(batch))
+            params = [
+                field.get_db_prep_save(row[name], connection)
+                for row in batch
+                for name, field in zip(names, fields)
+            ]
+            cursor.execute(
+                f'INSERT INTO {table} ({", ".join(columns)}) VALUES {placeholders} {conflict}',
+                params,
+            )
+            affected += cursor.rowcount
+    return affected
@@ -1,16 +1,27 @@
 # stitch_backend/products/filters.py
+from decimal import Decimal
+
 import django_filters
+from django.conf import settings
+from django.db.models import Case, Count, Exists, IntegerField, OuterRef, Value, When
+from rest_framework.filters import SearchFilter
+
+from . import category_tree
+from . import search
 
 from .models import (
     AppUser,
     Categories,
     Products,
+    ProductVariant,
     Orders,
     ShoppingCarts, # Make sure ShoppingCarts is imported for ShoppingCartFilter and CartItems
     CartItems,
     Address,
     Payments,
     OrderItems,
+    ArchivedOrder,
+    ArchivedPayment,
     UserRole,
     OrderStatus,
     AddressType,   # Corrected import for AddressType
@@ -53,11 +64,39 @@ class ProductFilter(django_filters.FilterSet):
     category_name = django_filters.CharFilter(field_name="category__name", lookup_expr='icontains') # Filter by category name
     is_available = django_filters.BooleanFilter(field_name="is_available")
     stock_quantity_gte = django_filters.NumberFilter(field_name="stock_quantity", lookup_expr='gte')
+    category_subtree = django_filters.NumberFilter(method='filter_category_subtree') # Category ID plus all its subcategories
+    size = django_filters.CharFilter(method='filter_size') # Has an available variant in this size, e.g. ?size=M
 
     class Meta:
         model = Products
         fields = ['name', 'price', 'category', 'is_available', 'stock_quantity']
 
+    def filter_category_subtree(self, queryset, name, value):
+        # One query: category_id IN (SELECT descendant_id FROM category_closure WHERE ancestor_id = value)
+        return queryset.filter(category__in=category_tree.subtree_ids(value))
+
+    def filter_size(self, queryset, name, value):
+        # EXISTS probe on variants_size_available_idx (size, is_available, product) per candidate product
+        in_stock = ProductVariant.objects.filter(
+            product=OuterRef('pk'), size=value.strip().upper(), is_available=True, stock_quantity__gt=0,
+        )
+        return queryset.filter(Exists(in_stock))
+
+# Filter for ProductVariants
+class ProductVariantFilter(django_filters.FilterSet):
+    size = django_filters.CharFilter(method='filter_size')
+    in_stock = django_filters.BooleanFilter(method='filter_in_stock')
+
+    class Meta:
+        model = ProductVariant
+        fields = ['size', 'is_available']
+
+    def filter_size(self, queryset, name, value):
+        return queryset.filter(size=value.strip().upper())
+
+    def filter_in_stock(self, queryset, name, value):
+        return queryset.filter(stock_quantity__gt=0) if value else queryset.filter(stock_quantity__lte=0)
+
 # Filter for Orders
 class OrderFilter(django_filters.FilterSet):
     user_username = django_filters.CharFilter(field_name='user__user__username', lookup_expr='icontains')
@@ -71,6 +110,11 @@ class OrderFilter(django_filters.FilterSet):
         model = Orders
         fields = ['user', 'total_amount', 'order_status', 'order_date']
 
+# The same filters over the archive tables, for ?include_archived=1
+class ArchivedOrderFilter(OrderFilter):
+    class Meta(OrderFilter.Meta):
+        model = ArchivedOrder
+
 # Filter for CartItems
 class CartItemFilter(django_filters.FilterSet):
     product_name = django_filters.CharFilter(field_name='product__name', lookup_expr='icontains')
@@ -106,6 +150,10 @@ class PaymentFilter(django_filters.FilterSet):
         model = Payments
         fields = ['order', 'payment_method', 'payment_status', 'amount', 'paid_at']
 
+class ArchivedPaymentFilter(PaymentFilter):
+    class Meta(PaymentFilter.Meta):
+        model = ArchivedPayment
+
 # Filter for OrderItems
 class OrderItemFilter(django_filters.FilterSet):
     order_id = django_filters.NumberFilter(field_name='order__order_id')
@@ -115,4 +163,83 @@ class OrderItemFilter(django_filters.FilterSet):
 
     class Meta:
         model = OrderItems
-        fields = ['order', 'product', 'quantity']
\ No newline at end of file
+        fields = ['order', 'product', 'quantity']
+
+
+# Relevance-ranked product search (see api/search.py)
+class ProductSearchFilter(SearchFilter):
+    """
+    Replaces SearchFilter's LIKE '%term%' scans with the product search index.
+    Results come back ordered by relevance (annotated as `search_rank`), which
+    KeysetPagination notices and pages by offset instead of by created_at.
+    """
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        limit = getattr(settings, 'PRODUCT_SEARCH_MAX_HITS', 500)
+        ranked = search.rank_products(' '.join(terms), limit=limit)
+        if not ranked:
+            return queryset.annotate(search_rank=Value(0)).none()
+        rank = Case(
+            *[When(pk=product_id, then=Value(position)) for position, (product_id, _) in enumerate(ranked)],
+            output_field=IntegerField(),
+        )
+        return (
+            queryset.filter(pk__in=[product_id for product_id, _ in ranked])
+            .annotate(search_rank=rank)
+            .order_by('search_rank')
+        )
+
+
+# Facet counts for the product listing
+def product_facets(queryset):
+    """
+    Returns category, price-range and availability counts for a filtered product
+    queryset. All three come out of one GROUP BY (category, price bucket,
+    availability) query and are rolled up here.
+    """
+    bounds = [Decimal(str(bound)) for bound in getattr(settings, 'PRODUCT_PRICE_BUCKETS', [0, 10, 25, 50, 100])]
+    ranges = list(zip(bounds, bounds[1:] + [None]))
+    bucket = Case(
+        *[
+            When(price__gte=low, price__lt=high, then=Value(index)) if high is not None
+            else When(price__gte=low, then=Value(index))
+            for index, (low, high) in enumerate(ranges)
+        ],
+        default=Value(-1),
+        output_field=IntegerField(),
+    )
+    rows = (
+        queryset.order_by()
+        .annotate(price_bucket=bucket)
+        .values('category_id', 'category__name', 'price_bucket', 'is_available')
+        .annotate(count=Count('pk'))
+    )
+
+    total = 0
+    categories = {}
+    price_counts = [0] * len(ranges)
+    availability = {'available': 0, 'unavailable': 0}
+    for row in rows:
+        count = row['count']
+        total += count
+        category = categories.setdefault(row['category_id'], {
+            'category_id': row['category_id'],
+            'name': row['category__name'],
+            'count': 0,
+        })
+        category['count'] += count
+        if row['price_bucket'] >= 0:
+            price_counts[row['price_bucket']] += count
+        availability['available' if row['is_available'] else 'unavailable'] += count
+
+    return {
+        'total': total,
+        'categories': sorted(categories.values(), key=lambda c: (-c['count'], c['name'] or '')),
+        'price_ranges': [
+            {'min': str(low), 'max': str(high) if high is not None else None, 'count': count}
+            for (low, high), count in zip(ranges, price_counts)
+        ],
+        'availability': availability,
+    }
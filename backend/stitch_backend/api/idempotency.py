@@ -0,0 +1,141 @@
+# stitch_backend/api/idempotency.py
+"""
+Idempotency keys for POSTs that create things (see IdempotencyMixin in
+api/views.py).
+
+A client that may retry sends `Idempotency-Key: <unique string>`, for
+example a UUID generated per logical request, and the same value on every
+retry. Keys are scoped to the endpoint and the user.
+
+  1. The first request inserts an IdempotencyKey row with no response. The
+     unique key_hash makes this insert a lock: of several concurrent
+     duplicates, exactly one wins it and runs the view.
+  2. Its response (status and data) is stored on the row. A 5xx response or
+     an uncaught exception deletes the row instead, so the next retry runs
+     for real.
+  3. A duplicate that loses the insert reads the row. It replays a finished
+     response without running the view. While the first request is still in
+     flight it polls the row until WAIT_TIMEOUT, then gives up with 409. A
+     key reused with a different body is refused (422).
+
+Rows expire after TTL; `manage.py purge_idempotency_keys` deletes them.
+"""
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+DEFAULTS = {
+    'TTL': 60 * 60 * 24,    # seconds a stored response is replayed
+    'WAIT_TIMEOUT': 10,     # seconds a duplicate waits for the in-flight original
+    'LOCK_TIMEOUT': 60,     # seconds after which an unfinished original is presumed dead
+    'POLL_INTERVAL': 0.1,   # seconds between checks while waiting
+}
+
+
+class KeyReused(Exception):
+    """The key was already used for a request with a different body."""
+
+
+class InFlight(Exception):
+    """The original request is still running after WAIT_TIMEOUT."""
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'IDEMPOTENCY', {})}
+
+
+def scope(request):
+    """The endpoint and user a key belongs to."""
+    user = request.user
+    return f"{request.method}:{request.path}:{user.pk if user.is_authenticated else '-'}"
+
+
+def key_digest(scope, key):
+    return hashlib.sha256(f'{scope}\n{key}'.encode()).hexdigest()
+
+
+def fingerprint(data):
+    # Keyed, because bodies such as a registration carry passwords
+    body = json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder, default=str)
+    return salted_hmac('api.idempotency', body, algorithm='sha256').hexdigest()
+
+
+def begin(scope, key, body_fingerprint):
+    """
+    Claims the key for this request. Returns (record, finished). If finished
+    is true, record holds the stored response to replay. Otherwise the caller
+    owns the key and must call finish() or abandon(). Raises KeyReused or
+    InFlight.
+    """
+    config = get_config()
+    key_hash = key_digest(scope, key)
+    deadline = time.monotonic() + config['WAIT_TIMEOUT']
+    while True:
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    key_hash=key_hash,
+                    fingerprint=body_fingerprint,
+                    locked_until=now + timedelta(seconds=config['LOCK_TIMEOUT']),
+                    expires_at=now + timedelta(seconds=config['TTL']),
+                )
+            return record, False
+        except IntegrityError:
+            pass
+
+        record = IdempotencyKey.objects.filter(key_hash=key_hash).first()
+        if record is None:
+            continue  # Purged between the insert and the read
+        if record.expires_at <= now:
+            IdempotencyKey.objects.filter(pk=record.pk, expires_at__lte=now).delete()
+            continue
+        if record.fingerprint != body_fingerprint:
+            raise KeyReused()
+        if record.status_code is not None:
+            return record, True
+        if record.locked_until is not None and record.locked_until <= now:
+            # The original died without finishing: take the key over, unless another duplicate just did
+            took_over = IdempotencyKey.objects.filter(
+                pk=record.pk, status_code__isnull=True, locked_until=record.locked_until,
+            ).update(locked_until=now + timedelta(seconds=config['LOCK_TIMEOUT']))
+            if took_over:
+                return record, False
+        if time.monotonic() >= deadline:
+            raise InFlight()
+        time.sleep(config['POLL_INTERVAL'])
+
+
+def finish(record, status_code, data):
+    """Stores the response for replay."""
+    IdempotencyKey.objects.filter(pk=record.pk).update(
+        status_code=status_code, response_body=data, locked_until=None,
+    )
+
+
+def abandon(record):
+    """Releases the key without storing a response, so a retry runs again."""
+    IdempotencyKey.objects.filter(pk=record.pk, status_code__isnull=True).delete()
+
+
+def purge_expired(now=None, batch_size=1000):
+    """Deletes expired keys, batch_size per statement. Yields the number deleted per batch."""
+    now = now or timezone.now()
+    while True:
+        pks = list(IdempotencyKey.objects.filter(expires_at__lte=now).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return
+        deleted, _ = IdempotencyKey.objects.filter(pk__in=pks, expires_at__lte=now).delete()
+        yield deleted
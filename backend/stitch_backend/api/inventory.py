@@ -0,0 +1,419 @@
+# stitch_backend/api/inventory.py
+"""
+Inventory reservations for hot products.
+
+Checkout normally locks the Products (or ProductVariant) row of every line
+and decrements stock_quantity. Under a flash sale, every buyer of the same
+product queues on that one row lock. For products with inventory slots the
+path is different:
+
+* The stock is split across N InventorySlot rows (enable_slots). While the
+  slots exist they are the authoritative stock, and
+  Products/ProductVariant.stock_quantity is a mirror refreshed by
+  sync_stock().
+* A reservation takes units from one slot, picked at random, with a single
+  conditional UPDATE:
+
+      UPDATE inventory_slots SET quantity = quantity - n
+       WHERE id = ? AND quantity >= n
+
+  It also writes an InventoryReservation ledger row. Concurrent buyers
+  usually land on different slots, so they do not wait for each other. The
+  conditional UPDATE can never take a slot below zero, so stock cannot be
+  oversold. Only when no single slot can cover a request does reserve()
+  lock all of the product's slots, in slot order, and take the units from
+  several of them.
+* Held reservations expire after INVENTORY_RESERVATION_TTL. Checkout
+  commits them (claim()). `manage.py reap_reservations` releases expired
+  holds back to their slots. It also settles committed units into
+  purchase_quantity and the rankings, and refreshes the stock mirror. As a
+  result the hot product row is written by the reaper, not by every
+  checkout.
+
+Slotted stock is keyed like cart lines: (product_id, variant_key), where
+variant_key is the variant_id, or 0 for a product without sizes.
+"""
+import random
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import cache as catalog_cache
+from . import rankings
+from .models import AppUser, InventoryReservation, InventorySlot, Products, ProductVariant, ReservationStatus
+
+DEFAULT_RESERVATION_TTL = timedelta(minutes=10)
+DEFAULT_MAX_HELD = 10
+
+
+class InsufficientStock(Exception):
+    """Raised when the slots of a product hold fewer units than were asked for."""
+    def __init__(self, requested, available):
+        super().__init__(f"Requested {requested}, only {available} left.")
+        self.requested = requested
+        self.available = available
+
+
+class HoldLimitExceeded(ValueError):
+    """Raised when a hold would take a user's live holds on a product past the per-user limit."""
+    def __init__(self, limit, held):
+        super().__init__(f"At most {limit} units of this product may be held at once; you already hold {held}.")
+        self.limit = limit
+        self.held = held
+
+
+def get_reservation_ttl():
+    return getattr(settings, 'INVENTORY_RESERVATION_TTL', DEFAULT_RESERVATION_TTL)
+
+
+def get_max_held():
+    return getattr(settings, 'INVENTORY_RESERVATION_MAX_QUANTITY', DEFAULT_MAX_HELD)
+
+
+def slotted_keys(product_ids):
+    """The (product_id, variant_key) pairs among product_ids that have inventory slots. One query."""
+    return set(
+        InventorySlot.objects.filter(product_id__in=product_ids)
+        .order_by().values_list('product_id', 'variant_key').distinct()
+    )
+
+
+def _stock_row(product_id, variant_id):
+    if variant_id is None:
+        return Products.objects.filter(pk=product_id)
+    return ProductVariant.objects.filter(pk=variant_id, product_id=product_id)
+
+
+def enable_slots(product_id, variant_id=None, slots=8):
+    """
+    Moves the stock of a product (or one of its variants) into `slots` slot
+    rows, spread evenly. Calling it again re-spreads the stock over the
+    existing slots plus any new ones. Slots are never dropped, because held
+    reservations point at them; use disable_slots() first to shrink.
+    """
+    key = variant_id or 0
+    with transaction.atomic():
+        stock_row = _stock_row(product_id, variant_id).select_for_update()
+        current = stock_row.values_list('stock_quantity', flat=True).first()
+        if current is None:
+            raise ValueError("No such product or variant.")
+        existing = list(
+            InventorySlot.objects.select_for_update().filter(product_id=product_id, variant_key=key).order_by('slot')
+        )
+        total = sum(slot.quantity for slot in existing) if existing else max(current, 0)
+        count = max(slots, len(existing))
+        share, extra = divmod(total, count)
+        rows = {slot.slot: slot for slot in existing}
+        for number in range(count):
+            slot = rows.get(number) or InventorySlot(product_id=product_id, variant_id=variant_id, variant_key=key, slot=number)
+            slot.quantity = share + (1 if number < extra else 0)
+            rows[number] = slot
+        InventorySlot.objects.bulk_update([rows[number] for number in rows if rows[number].pk], ['quantity'])
+        InventorySlot.objects.bulk_create([slot for slot in rows.values() if not slot.pk])
+        stock_row.update(stock_quantity=total)
+        if (current > 0) != (total > 0):
+            transaction.on_commit(catalog_cache.bump_catalog_version)
+    return count
+
+
+def disable_slots(product_id, variant_id=None):
+    """
+    Folds a product's slots back into stock_quantity. Outstanding holds are
+    released and committed units are settled first.
+    """
+    key = variant_id or 0
+    with transaction.atomic():
+        stock_row = _stock_row(product_id, variant_id).select_for_update()
+        current = stock_row.values_list('stock_quantity', flat=True).first() or 0
+        slots = InventorySlot.objects.select_for_update().filter(product_id=product_id, variant_key=key)
+        list(slots.order_by('slot').values_list('pk'))
+        ledger = InventoryReservation.objects.select_for_update().filter(product_id=product_id, variant_key=key)
+        _release(list(
+            ledger.filter(status=ReservationStatus.HELD).values_list('pk', 'product_id', 'variant_key', 'slot', 'quantity')
+        ))
+        _settle(list(ledger.filter(status=ReservationStatus.COMMITTED).values_list('pk', 'product_id', 'quantity')))
+        total = slots.aggregate(total=Sum('quantity'))['total'] or 0
+        stock_row.update(stock_quantity=total)
+        slots.delete()
+        if (current > 0) != (total > 0):
+            transaction.on_commit(catalog_cache.bump_catalog_version)
+    return total
+
+
+def reserve(product_id, variant_id=None, quantity=1, user=None, status=ReservationStatus.HELD, ttl=None, now=None,
+            max_held=None):
+    """
+    Takes `quantity` units from the product's slots and records them in the
+    ledger. Returns the new InventoryReservation rows: one per slot the units
+    came from, normally exactly one. Raises InsufficientStock if the slots
+    hold too few units, or ValueError if the product has no slots.
+
+    With max_held, the user's live holds on the product plus `quantity` may
+    not exceed it (HoldLimitExceeded). Otherwise one account could hold a
+    hot product's whole stock with repeated requests. The count runs under a
+    lock on the user's row, so the same user's concurrent requests are
+    counted one at a time while other buyers are not held up.
+
+    The usual path is three queries: read the slot levels, run one
+    conditional UPDATE and insert one ledger row. A conditional UPDATE fails
+    only if another buyer drained that slot between the read and the update.
+    In that case the next candidate slot is tried.
+    """
+    key = variant_id or 0
+    now = now or timezone.now()
+    expires_at = now + (ttl or get_reservation_ttl())
+    slots = InventorySlot.objects.filter(product_id=product_id, variant_key=key)
+
+    def ledger(taken):
+        return InventoryReservation.objects.bulk_create([
+            InventoryReservation(
+                user=user, product_id=product_id, variant_id=variant_id, variant_key=key,
+                slot=number, quantity=units, status=status, expires_at=expires_at,
+            )
+            for number, units in taken
+        ])
+
+    with transaction.atomic():
+        if max_held is not None and user is not None:
+            list(AppUser.objects.select_for_update().filter(pk=user.pk).values_list('pk'))
+            held = InventoryReservation.objects.filter(
+                user=user, product_id=product_id, variant_key=key, status=ReservationStatus.HELD, expires_at__gt=now,
+            ).aggregate(total=Sum('quantity'))['total'] or 0
+            if held + quantity > max_held:
+                raise HoldLimitExceeded(max_held, held)
+        levels = list(slots.values_list('slot', 'quantity'))
+        if not levels:
+            raise ValueError("This product does not take reservations.")
+        candidates = [number for number, units in levels if units >= quantity]
+        random.shuffle(candidates)
+        for number in candidates:
+            if slots.filter(slot=number, quantity__gte=quantity).update(quantity=F('quantity') - quantity):
+                return ledger([(number, quantity)])
+
+        # No single slot covers the request (typically near sell-out): gather from several
+        # under locks, always taken in slot order so two gatherers cannot deadlock
+        locked = list(slots.select_for_update().order_by('slot'))
+        available = sum(max(slot.quantity, 0) for slot in locked)
+        if available < quantity:
+            raise InsufficientStock(quantity, available)
+        taken, wanted = [], quantity
+        for slot in locked:
+            units = min(max(slot.quantity, 0), wanted)
+            if units:
+                slot.quantity -= units
+                taken.append((slot.slot, units))
+                wanted -= units
+            if not wanted:
+                break
+        InventorySlot.objects.bulk_update([slot for slot in locked if slot.slot in dict(taken)], ['quantity'])
+        return ledger(taken)
+
+
+def release(reservation_ids):
+    """Returns held units to their slots. Reservations no longer held are skipped. Returns units released."""
+    with transaction.atomic():
+        rows = list(
+            InventoryReservation.objects.select_for_update()
+            .filter(pk__in=reservation_ids, status=ReservationStatus.HELD).order_by('pk')
+            .values_list('pk', 'product_id', 'variant_key', 'slot', 'quantity')
+        )
+        return _release(rows)
+
+
+def _release(rows):
+    if not rows:
+        return 0
+    InventoryReservation.objects.filter(pk__in=[row[0] for row in rows], status=ReservationStatus.HELD).update(
+        status=ReservationStatus.RELEASED, updated_at=timezone.now(),
+    )
+    returned = Counter()
+    for _, product_id, variant_key, slot, quantity in rows:
+        returned[(product_id, variant_key, slot)] += quantity
+    # One UPDATE per slot, in key order so concurrent releases take slot locks in the same order
+    for (product_id, variant_key, slot), quantity in sorted(returned.items()):
+        InventorySlot.objects.filter(product_id=product_id, variant_key=variant_key, slot=slot).update(
+            quantity=F('quantity') + quantity,
+        )
+    return sum(returned.values())
+
+
+def claim(user, product_id, variant_id, quantity, now=None):
+    """
+    Commits `quantity` units of a slotted product for checkout. The user's
+    live holds on it are used first, oldest first. Units held beyond
+    `quantity` are returned to their slot. Any shortfall is reserved now.
+    Returns the ids of the committed reservations, for the caller to attach
+    to the order. Raises InsufficientStock.
+    """
+    key = variant_id or 0
+    now = now or timezone.now()
+    held = list(
+        InventoryReservation.objects.select_for_update()
+        .filter(user=user, product_id=product_id, variant_key=key, status=ReservationStatus.HELD, expires_at__gt=now)
+        .order_by('pk')
+    )
+    committed, surplus, wanted = [], [], quantity
+    for reservation in held:
+        if not wanted:
+            surplus.append(reservation)
+            continue
+        if reservation.quantity > wanted:
+            # Keep what is needed; the rest goes back to the slot
+            InventorySlot.objects.filter(product_id=product_id, variant_key=key, slot=reservation.slot).update(
+                quantity=F('quantity') + (reservation.quantity - wanted),
+            )
+            InventoryReservation.objects.filter(pk=reservation.pk).update(quantity=wanted)
+            reservation.quantity = wanted
+        committed.append(reservation.pk)
+        wanted -= reservation.quantity
+    if surplus:
+        _release([(r.pk, r.product_id, r.variant_key, r.slot, r.quantity) for r in surplus])
+    if committed:
+        InventoryReservation.objects.filter(pk__in=committed).update(
+            status=ReservationStatus.COMMITTED, updated_at=now,
+        )
+    if wanted:
+        committed += [
+            reservation.pk
+            for reservation in reserve(product_id, variant_id, wanted, user=user, status=ReservationStatus.COMMITTED, now=now)
+        ]
+    return committed
+
+
+def release_expired(now=None, batch_size=1000):
+    """
+    Releases held reservations past their expiry, batch_size per
+    transaction. Yields (reservations, units) released per batch.
+    """
+    now = now or timezone.now()
+    while True:
+        with transaction.atomic():
+            rows = list(
+                InventoryReservation.objects.select_for_update()
+                .filter(status=ReservationStatus.HELD, expires_at__lte=now).order_by('pk')
+                .values_list('pk', 'product_id', 'variant_key', 'slot', 'quantity')[:batch_size]
+            )
+            if not rows:
+                return
+            released = _release(rows)
+        yield len(rows), released
+
+
+def _settle(rows):
+    if not rows:
+        return 0
+    InventoryReservation.objects.filter(pk__in=[row[0] for row in rows], status=ReservationStatus.COMMITTED).update(
+        status=ReservationStatus.SETTLED, updated_at=timezone.now(),
+    )
+    sold = Counter()
+    for _, product_id, quantity in rows:
+        sold[product_id] += quantity
+    rankings.record_sales(sold.items())
+    return sum(sold.values())
+
+
+def settle_committed(batch_size=1000):
+    """
+    Adds committed units to purchase_quantity and the rankings, batch_size
+    reservations per transaction. Yields (reservations, units) per batch.
+    """
+    while True:
+        with transaction.atomic():
+            rows = list(
+                InventoryReservation.objects.select_for_update()
+                .filter(status=ReservationStatus.COMMITTED).order_by('pk')
+                .values_list('pk', 'product_id', 'quantity')[:batch_size]
+            )
+            if not rows:
+                return
+            settled = _settle(rows)
+        yield len(rows), settled
+
+
+def sync_stock():
+    """
+    Copies each slotted product's and variant's slot total into its
+    stock_quantity, so that listings, filters and the cart summary see
+    roughly current stock. Returns the number of stock rows refreshed. The
+    catalog cache is only invalidated if a row sold out or came back.
+    """
+    product_ids, variant_ids = set(), set()
+    for product_id, variant_key in InventorySlot.objects.order_by().values_list('product_id', 'variant_key').distinct():
+        if variant_key:
+            variant_ids.add(variant_key)
+        else:
+            product_ids.add(product_id)
+    if not product_ids and not variant_ids:
+        return 0
+
+    def slot_total(**match):
+        return Coalesce(
+            Subquery(
+                InventorySlot.objects.filter(**match).order_by().values('variant_key')
+                .annotate(total=Sum('quantity')).values('total')
+            ),
+            Value(0),
+            output_field=IntegerField(),
+        )
+
+    def in_stock():
+        return (
+            set(Products.objects.filter(pk__in=product_ids, stock_quantity__gt=0).values_list('pk', flat=True)),
+            set(ProductVariant.objects.filter(pk__in=variant_ids, stock_quantity__gt=0).values_list('pk', flat=True)),
+        )
+
+    with transaction.atomic():
+        before = in_stock()
+        refreshed = Products.objects.filter(pk__in=product_ids).update(
+            stock_quantity=slot_total(product_id=OuterRef('pk'), variant_key=0),
+        )
+        refreshed += ProductVariant.objects.filter(pk__in=variant_ids).update(
+            stock_quantity=slot_total(variant_key=OuterRef('pk')),
+        )
+        if in_stock() != before:
+            transaction.on_commit(catalog_cache.bump_catalog_version)
+    return refreshed
+
+
+def rebalance(product_id, variant_id=None):
+    """
+    Re-spreads a product's slot stock evenly once some slots run dry, so
+    that reservations keep taking the single-UPDATE path. Locks the slots in
+    slot order.
+    """
+    key = variant_id or 0
+    with transaction.atomic():
+        slots = list(
+            InventorySlot.objects.select_for_update().filter(product_id=product_id, variant_key=key).order_by('slot')
+        )
+        total = sum(max(slot.quantity, 0) for slot in slots)
+        if not slots or not total:
+            return
+        share, extra = divmod(total, len(slots))
+        for index, slot in enumerate(slots):
+            slot.quantity = share + (1 if index < extra else 0)
+        InventorySlot.objects.bulk_update(slots, ['quantity'])
+
+
+def rebalance_drained(min_quantity=1):
+    """
+    Rebalances every slotted product that has a slot below min_quantity
+    while its total could still give each slot that much. Returns the number
+    of products rebalanced.
+    """
+    drained = (
+        InventorySlot.objects.order_by().values('product_id', 'variant_key')
+        .annotate(low=Min('quantity'), total=Sum('quantity'), slots=Count('pk'))
+        .filter(low__lt=min_quantity, total__gte=F('slots') * min_quantity)
+        .values_list('product_id', 'variant_key')
+    )
+    count = 0
+    for product_id, variant_key in list(drained):
+        rebalance(product_id, variant_key or None)
+        count += 1
+    return count
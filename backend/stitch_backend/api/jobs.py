@@ -0,0 +1,80 @@
+# stitch_backend/api/jobs.py
+"""
+Outbox job handlers (see api/outbox.py), run by `manage.py run_worker`.
+Imported by ApiConfig.ready() so that every process registers them.
+"""
+import logging
+
+from django.conf import settings
+from django.core.mail import mail_admins, send_mail
+
+from . import rankings
+from .models import Orders, Payments, PaymentStatus, Products, ProductVariant
+from .outbox import handler
+
+logger = logging.getLogger(__name__)
+
+
+@handler('order.placed')
+def send_order_confirmation(payload):
+    order = Orders.objects.select_related('user__user').filter(pk=payload['order_id']).first()
+    if order is None or not order.user.user.email:
+        return
+    lines = [
+        f"  {item.quantity} x {item.product.name}{f' ({item.variant.size})' if item.variant else ''}: {item.subtotal}"
+        for item in order.items.select_related('product', 'variant').order_by('pk')
+    ]
+    send_mail(
+        subject=f"Stitch Shop order #{order.pk} received",
+        message="\n".join([
+            f"Hi {order.user.first_name},",
+            "",
+            f"We have received your order #{order.pk}.",
+            *lines,
+            f"Total: {order.total_amount}",
+        ]),
+        from_email=None,
+        recipient_list=[order.user.user.email],
+    )
+
+
+@handler('payment.status_changed')
+def send_payment_receipt(payload):
+    if payload.get('payment_status') != PaymentStatus.COMPLETED:
+        return
+    payment = Payments.objects.select_related('order__user__user').filter(pk=payload['payment_id']).first()
+    if payment is None or not payment.order.user.user.email:
+        return
+    send_mail(
+        subject=f"Stitch Shop payment for order #{payment.order_id}",
+        message=f"We have received your {payment.payment_method} payment of {payment.amount} for order #{payment.order_id}.",
+        from_email=None,
+        recipient_list=[payment.order.user.user.email],
+    )
+
+
+# The upserts increment counters, so they commit with the job's Done status (see outbox.run)
+@handler('rankings.record_sales', atomic=True)
+def record_sales(payload):
+    rankings.record_sales(payload['lines'], update_purchase_quantity=False)
+
+
+@handler('inventory.check_stock')
+def check_stock(payload):
+    """Reports products and variants that an order took to or below INVENTORY_LOW_STOCK_THRESHOLD."""
+    threshold = getattr(settings, 'INVENTORY_LOW_STOCK_THRESHOLD', 5)
+    low = [
+        f"{name}: {stock} left"
+        for name, stock in Products.objects.filter(
+            pk__in=payload.get('product_ids', []), stock_quantity__lte=threshold,
+        ).values_list('name', 'stock_quantity')
+    ]
+    low += [
+        f"{name} ({size}): {stock} left"
+        for name, size, stock in ProductVariant.objects.filter(
+            pk__in=payload.get('variant_ids', []), stock_quantity__lte=threshold,
+        ).values_list('product__name', 'size', 'stock_quantity')
+    ]
+    if low:
+        logger.warning("Low stock: %s", "; ".join(low))
+        mail_admins("Low stock", "\n".join(low))
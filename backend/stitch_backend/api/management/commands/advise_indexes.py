@@ -0,0 +1,106 @@
+# api/management/commands/advise_indexes.py
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+
+from api import querylog
+
+
+class Command(BaseCommand):
+    help = (
+        'Reads the SQL captured by QueryCaptureMiddleware (QUERY_CAPTURE), ranks endpoints and '
+        'statements by database time, EXPLAINs the slowest statements and reports full table '
+        'scans and unindexed sorts, with a suggested composite index for each. Run it against '
+        'a database with production-like data; plans on a near-empty table mean little.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', help='Capture log to read (default: QUERY_CAPTURE["PATH"]).')
+        parser.add_argument('--top', type=int, default=20, help='Statements to EXPLAIN, slowest total time first.')
+        parser.add_argument('--endpoint', help='Only endpoints containing this text, e.g. "api/orders/".')
+        parser.add_argument('--json', action='store_true', help='Print the suggested indexes as JSON.')
+
+    def handle(self, *args, **options):
+        path = options['log'] or querylog.get_config()['PATH']
+        if not os.path.exists(path):
+            raise CommandError(f'No capture log at {path}. Set QUERY_CAPTURE=True and exercise the API first.')
+        endpoints, statements = querylog.load(path)
+        if options['endpoint']:
+            endpoints = {name: stats for name, stats in endpoints.items() if options['endpoint'] in name}
+            statements = {key: stats for key, stats in statements.items() if key[0] in endpoints}
+
+        # With --json only the suggestions are printed, for piping
+        write = (lambda message: None) if options['json'] else self.stdout.write
+        write(self.style.MIGRATE_HEADING('Endpoints by database time'))
+        for name, stats in sorted(endpoints.items(), key=lambda item: -item[1]['db_ms']):
+            requests = stats['requests']
+            write(
+                f'  {name}: {requests} requests, {stats["queries"] / requests:.1f} queries and '
+                f'{stats["db_ms"] / requests:.1f} ms in SQL per request ({stats["ms"] / requests:.1f} ms total)'
+            )
+
+        suggestions = {}
+        ranked = sorted(statements.items(), key=lambda item: -item[1]['ms'])
+        explainable = [
+            (key, stats) for key, stats in ranked
+            if stats.get('params') is not None and stats['sql'].split(' ', 1)[0].upper() in ('SELECT', 'UPDATE', 'DELETE')
+        ][:options['top']]
+        write(self.style.MIGRATE_HEADING(f'Slowest {len(explainable)} statements'))
+        for rank, ((endpoint, sql), stats) in enumerate(explainable, 1):
+            write(
+                f'  [{rank}] {stats["ms"]:.1f} ms over {stats["count"]} calls (max {stats["max_ms"]:.1f} ms), {endpoint}'
+            )
+            write(f'      {sql[:300]}{"..." if len(sql) > 300 else ""}')
+            try:
+                plan, scans, sorts = querylog.explain(connection, stats['example'], stats['params'])
+            except DatabaseError as exc:
+                write(self.style.WARNING(f'      EXPLAIN failed: {exc}'))
+                continue
+            for line in plan:
+                write(f'      | {line}')
+            main = querylog.main_table(stats['example'])
+            problems = {table: 'full scan' for table in scans}
+            for table in sorts:
+                problems.setdefault(table or main, 'sort without an index')
+            for table, problem in problems.items():
+                columns = querylog.suggest_index(stats['example'], table) if table else None
+                model = querylog.model_for_table(table)
+                if columns and len(columns) > 1 and model is not None and columns[-1] == model._meta.pk.column:
+                    columns = columns[:-1] # The primary key is implied (InnoDB appends it to every index)
+                if not columns:
+                    write(self.style.WARNING(f'      {problem} of {table}; nothing to index on'))
+                    continue
+                if querylog.is_covered(columns, querylog.existing_indexes(connection, table)):
+                    write(f'      {problem} of {table}, though an index on ({", ".join(columns)}) exists')
+                    continue
+                write(self.style.WARNING(f'      {problem} of {table}: index ({", ".join(columns)})'))
+                suggestion = suggestions.setdefault((table, tuple(columns)), {
+                    'table': table, 'columns': columns, 'statements': 0, 'calls': 0, 'ms': 0.0, 'endpoints': set(),
+                })
+                suggestion['statements'] += 1
+                suggestion['calls'] += stats['count']
+                suggestion['ms'] += stats['ms']
+                suggestion['endpoints'].add(endpoint)
+
+        suggestions = sorted(suggestions.values(), key=lambda suggestion: -suggestion['ms'])
+        if options['json']:
+            self.stdout.write(json.dumps([
+                {**suggestion, 'ms': round(suggestion['ms'], 3), 'endpoints': sorted(suggestion['endpoints'])}
+                for suggestion in suggestions
+            ], indent=2))
+            return
+        self.stdout.write(self.style.MIGRATE_HEADING('Suggested indexes'))
+        if not suggestions:
+            self.stdout.write(self.style.SUCCESS('  None: every explained statement uses an index.'))
+        for suggestion in suggestions:
+            model = querylog.model_for_table(suggestion['table'])
+            hint = (
+                f'{model.__name__}: models.Index(fields={querylog.field_names(model, suggestion["columns"])!r})'
+                if model is not None else f'{suggestion["table"]} ({", ".join(suggestion["columns"])})'
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f'  {hint}  # {suggestion["statements"]} statements, {suggestion["calls"]} calls, '
+                f'{suggestion["ms"]:.1f} ms; {", ".join(sorted(suggestion["endpoints"]))}'
+            ))
@@ -0,0 +1,62 @@
+# api/management/commands/bench_rendering.py
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.text import compress_string
+from rest_framework.renderers import JSONRenderer
+
+from api import renderers
+from api.middleware import brotli, get_compression_config
+from api.models import Orders, Products
+from api.serializers import OrdersSerializer, ProductsSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks JSON rendering (DRF stdlib json vs orjson) and gzip/brotli '
+        'compression on full product and order lists.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=500, help='Rows per list (capped by what is in the database).')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed iterations per measurement.')
+
+    def handle(self, *args, **options):
+        if renderers.orjson is None:
+            self.stdout.write(self.style.WARNING('orjson is not installed; ORJSONRenderer falls back to stdlib json.'))
+        lists = [
+            ('products', ProductsSerializer, Products.objects.order_by('-created_at')),
+            ('orders', OrdersSerializer, Orders.objects.order_by('-created_at')),
+        ]
+        for name, serializer_class, queryset in lists:
+            rows = serializer_class.setup_eager_loading(queryset)[:options['rows']]
+            data = serializer_class(rows, many=True).data
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{name}: {len(data)} rows'))
+            self.bench(data, options['repeat'])
+
+    def bench(self, data, repeat):
+        stdlib = self.timed(lambda: JSONRenderer().render(data), repeat)
+        fast = self.timed(lambda: renderers.ORJSONRenderer().render(data), repeat)
+        body = renderers.ORJSONRenderer().render(data)
+        self.report('render  json', stdlib, len(JSONRenderer().render(data)))
+        self.report('render  orjson', fast, len(body), f'{stdlib / fast if fast else 0:.1f}x faster')
+
+        gzip_time = self.timed(lambda: compress_string(body, max_random_bytes=100), repeat)
+        gzipped = len(compress_string(body, max_random_bytes=100))
+        self.report('gzip', gzip_time, gzipped, f'{100 - gzipped * 100 / len(body):.0f}% fewer bytes')
+        if brotli is not None:
+            quality = get_compression_config()['BROTLI_QUALITY']
+            br_time = self.timed(lambda: brotli.compress(body, quality=quality), repeat)
+            compressed = len(brotli.compress(body, quality=quality))
+            self.report(f'brotli q{quality}', br_time, compressed, f'{100 - compressed * 100 / len(body):.0f}% fewer bytes')
+
+    @staticmethod
+    def timed(func, repeat):
+        func()  # warm up
+        started = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - started) / repeat
+
+    def report(self, label, seconds, size, note=''):
+        self.stdout.write(f'  {label:<16} {seconds * 1000:8.2f} ms  {size:>9} bytes  {note}')
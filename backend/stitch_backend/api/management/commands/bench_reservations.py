@@ -0,0 +1,112 @@
+# api/management/commands/bench_reservations.py
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, transaction
+from django.db.models import Sum
+
+from api import inventory
+from api.models import InventoryReservation, InventorySlot, Products, ReservationStatus
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulates a flash sale: many concurrent buyers check out the same product through '
+        'the inventory slots (the same claim() the checkout uses), then verifies that nothing '
+        'was oversold. Creates a throwaway product and deletes it afterwards. Run it against '
+        'MySQL for meaningful timings; SQLite serialises all writers on one file lock.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=2000, help='Simulated checkouts.')
+        parser.add_argument('--stock', type=int, default=500, help='Units on sale.')
+        parser.add_argument('--quantity', type=int, default=1, help='Units each buyer takes.')
+        parser.add_argument('--slots', type=int, default=8, help='Inventory slots for the product.')
+        parser.add_argument('--threads', type=int, default=32, help='Concurrent database connections.')
+        parser.add_argument('--compare', action='store_true', help='Also run with a single slot, for contrast.')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark product and its ledger.')
+
+    def handle(self, *args, **options):
+        runs = [options['slots']]
+        if options['compare'] and options['slots'] != 1:
+            runs.append(1)
+        oversold = False
+        for slots in runs:
+            oversold |= self.run(slots, options)
+        if oversold:
+            self.stderr.write(self.style.ERROR('Stock was oversold.'))
+            raise SystemExit(1)
+
+    def run(self, slots, options):
+        stock, buyers, quantity = options['stock'], options['buyers'], options['quantity']
+        product = Products.objects.create(
+            name=f'bench-reservations-{uuid.uuid4().hex[:12]}', price=1, discount=0, stock_quantity=stock,
+        )
+        inventory.enable_slots(product.pk, None, slots)
+
+        pending = iter(range(buyers))
+        pending_lock = threading.Lock()
+        outcomes = Counter()
+        outcomes_lock = threading.Lock()
+        start = threading.Barrier(options['threads'])
+
+        def buy():
+            for attempt in range(10):
+                try:
+                    with transaction.atomic():
+                        inventory.claim(None, product.pk, None, quantity)
+                    return 'sold', attempt
+                except inventory.InsufficientStock:
+                    return 'sold out', attempt
+                except OperationalError:
+                    # Deadlock victim or lock wait timeout: back off and retry like a client would
+                    time.sleep(0.005 * (attempt + 1))
+            return 'failed', attempt
+
+        def worker():
+            try:
+                start.wait()
+                while True:
+                    with pending_lock:
+                        if next(pending, None) is None:
+                            return
+                    outcome, retries = buy()
+                    with outcomes_lock:
+                        outcomes[outcome] += 1
+                        outcomes['retries'] += retries
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        left = InventorySlot.objects.filter(product=product).aggregate(total=Sum('quantity'))['total'] or 0
+        negative = InventorySlot.objects.filter(product=product, quantity__lt=0).count()
+        committed = (
+            InventoryReservation.objects.filter(product=product, status=ReservationStatus.COMMITTED)
+            .aggregate(total=Sum('quantity'))['total'] or 0
+        )
+        expected = min(stock // quantity, buyers) * quantity
+        oversold = committed + left != stock or negative or committed > stock
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{slots} slot(s), {options["threads"]} threads'))
+        self.stdout.write(
+            f'  {buyers} buyers in {elapsed:.2f}s ({buyers / elapsed:.0f} checkouts/s): '
+            f'{outcomes["sold"]} sold, {outcomes["sold out"]} sold out, {outcomes["failed"]} failed, '
+            f'{outcomes["retries"]} retries'
+        )
+        self.stdout.write(
+            f'  units: {stock} on sale, {committed} committed, {left} left in slots'
+            + ('' if committed == expected or outcomes['failed'] else f' (expected {expected} committed)')
+        )
+        self.stdout.write(self.style.ERROR('  OVERSOLD') if oversold else self.style.SUCCESS('  no overselling'))
+        if not options['keep']:
+            product.delete()
+        return bool(oversold)
@@ -0,0 +1,50 @@
+# api/management/commands/import_products.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import product_io
+
+
+class Command(BaseCommand):
+    help = 'Streams products from a CSV or JSONL file into the catalog, upserting by SKU in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for stdin.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension (csv otherwise).')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows upserted per statement/transaction.')
+        parser.add_argument('--create-categories', action='store_true', help='Create categories that do not exist yet instead of rejecting the row.')
+        parser.add_argument('--no-index', action='store_true', help='Skip search indexing (run reindex_products afterwards).')
+
+    def handle(self, *args, **options):
+        fmt = product_io.detect_format(options['path'], options['format'])
+        importer = product_io.ProductImporter(
+            batch_size=options['batch_size'],
+            create_categories=options['create_categories'],
+            index=not options['no_index'],
+        )
+        started = time.monotonic()
+        report_every = max(1, 50000 // options['batch_size'])
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Importing products from {options['path']} ({fmt})..."))
+        try:
+            with product_io.open_stream(options['path'], 'r') as stream:
+                for batch_number, imported in enumerate(importer.run(product_io.iter_rows(stream, fmt)), start=1):
+                    if batch_number % report_every == 0:
+                        self.stdout.write(self.progress(imported, started))
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+
+        for line_number, error in importer.errors[:50]:
+            self.stdout.write(self.style.ERROR(f'Line {line_number}: {error}'))
+        if len(importer.errors) > 50:
+            self.stdout.write(self.style.ERROR(f'... and {len(importer.errors) - 50} more rejected rows'))
+        self.stdout.write(self.style.SUCCESS(
+            f'{self.progress(importer.imported, started)}, {len(importer.errors)} rejected'
+        ))
+
+    @staticmethod
+    def progress(rows, started):
+        elapsed = time.monotonic() - started
+        rate = rows / elapsed if elapsed else rows
+        return f'Imported {rows} products in {elapsed:.1f}s ({rate:.0f} rows/s)'
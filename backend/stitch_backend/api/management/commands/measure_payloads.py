@@ -0,0 +1,63 @@
+# api/management/commands/measure_payloads.py
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from api import cache as catalog_cache
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares response size, query count and time of the full and compact '
+        '(Meta.list_fields / ?fields=) representations of list endpoints.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', default=['/api/products/', '/api/orders/'])
+        parser.add_argument('--user', help='Username to authenticate as (defaults to the first superuser).')
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=5, help='Requests per variant; the median time is reported.')
+        parser.add_argument(
+            '--fields', action='append', default=[],
+            help='Extra ?fields= list to measure, e.g. --fields name,price (repeatable).',
+        )
+
+    def handle(self, *args, **options):
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+        else:
+            user = User.objects.filter(is_superuser=True).order_by('pk').first()
+        if user is None:
+            raise CommandError('No such user; pass --user <username>.')
+
+        client = Client()
+        client.force_login(user)
+        variants = [('full', {'full': '1'}), ('compact', {})]
+        variants += [(f'fields={fields}', {'fields': fields}) for fields in options['fields']]
+
+        for path in options['paths']:
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{path} (page_size={options["page_size"]}, as {user.username})'))
+            baseline = None
+            for label, params in variants:
+                size, queries, elapsed = self.measure(client, path, {**params, 'page_size': options['page_size']}, options['repeat'])
+                baseline = baseline or size
+                saved = f'{100 - size * 100 / baseline:5.1f}% smaller' if baseline and size != baseline else ''
+                self.stdout.write(f'  {label:<28} {size:>9} bytes  {queries:>3} queries  {elapsed * 1000:7.1f} ms  {saved}')
+
+    def measure(self, client, path, params, repeat):
+        timings = []
+        for _ in range(max(repeat, 1)):
+            # Measure the uncached path: serializing is what the compact representation saves
+            catalog_cache.bump_catalog_version()
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = client.get(path, params)
+                timings.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise CommandError(f'GET {path} returned {response.status_code}')
+        return len(response.content), len(queries.captured_queries), statistics.median(timings)
@@ -0,0 +1,55 @@
+# api/management/commands/process_webhooks.py
+import signal
+import threading
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from api import webhooks
+
+
+class Command(BaseCommand):
+    help = (
+        'Applies stored GCash webhook events to payments and orders, in batches. Events are '
+        'claimed with SELECT ... FOR UPDATE SKIP LOCKED, so several processes can share the '
+        'work; each order\'s events are applied in occurred_at order. Stops after the current '
+        'batch on SIGINT or SIGTERM.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Events per transaction (default: GCASH_WEBHOOK["BATCH_SIZE"]).')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when no event is waiting.')
+        parser.add_argument('--once', action='store_true', help='Exit once no event is waiting instead of polling.')
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: stop.set())
+
+        outcomes = Counter()
+        started = last_purge = time.monotonic()
+        try:
+            while not stop.is_set():
+                close_old_connections()
+                batch = webhooks.process_batch(options['batch_size'])
+                outcomes.update(batch)
+                if batch and options['verbosity'] > 1:
+                    self.stdout.write(', '.join(f'{count} {status.lower()}' for status, count in batch.items()))
+                if time.monotonic() - last_purge > 60:
+                    webhooks.purge_handled()
+                    last_purge = time.monotonic()
+                if not batch:
+                    if options['once']:
+                        break
+                    stop.wait(options['poll_interval'])
+        finally:
+            connection.close()
+
+        elapsed = time.monotonic() - started
+        handled = sum(outcomes.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Handled {handled} events ({", ".join(f"{count} {status.lower()}" for status, count in outcomes.items()) or "none"}) '
+            f'in {elapsed:.1f}s ({handled / elapsed if elapsed else handled:.0f} events/s)'
+        ))
@@ -0,0 +1,27 @@
+# api/management/commands/rebuild_rankings.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import rankings
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the best-seller ranking windows from daily sales and prunes expired daily rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from-order-items', action='store_true',
+            help='First recount purchase_quantity and daily sales from the full order_items history (one-off backfill).'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options['from_order_items']:
+            self.stdout.write(self.style.MIGRATE_HEADING('Recounting sales from order items...'))
+            rankings.backfill_from_order_items()
+        self.stdout.write(self.style.MIGRATE_HEADING('Rebuilding product rankings...'))
+        pruned = rankings.rebuild_rankings(stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rankings rebuilt in {time.monotonic() - started:.1f}s ({pruned} expired daily rows pruned)'
+        ))
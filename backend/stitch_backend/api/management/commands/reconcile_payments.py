@@ -0,0 +1,59 @@
+# api/management/commands/reconcile_payments.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import product_io, reconciliation
+
+
+class Command(BaseCommand):
+    help = (
+        'Streams a GCash settlement CSV and reconciles it against payments by transaction_id: '
+        'settles matching payments (payment_status, paid_at) with batched bulk updates and writes '
+        'every row that does not match cleanly to a discrepancy report. Memory use does not grow '
+        'with the size of the file.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Settlement CSV, or '-' for stdin.")
+        parser.add_argument('--report', help="Discrepancy report CSV (default: <path>.discrepancies.csv; '-' for stdout).")
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows matched per lookup and update.')
+        parser.add_argument('--dry-run', action='store_true', help='Match and report, but change nothing.')
+
+    def handle(self, *args, **options):
+        report_path = options['report'] or (
+            f"{options['path']}.discrepancies.csv" if options['path'] != '-' else 'discrepancies.csv'
+        )
+        started = time.monotonic()
+        report_every = max(1, 100000 // options['batch_size'])
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"Reconciling {options['path']}{' (dry run)' if options['dry_run'] else ''}..."
+        ))
+        try:
+            with product_io.open_stream(options['path'], 'r') as stream, \
+                    product_io.open_stream(report_path, 'w') as report:
+                reconciler = reconciliation.PaymentReconciler(
+                    reconciliation.open_report(report), batch_size=options['batch_size'], dry_run=options['dry_run'],
+                )
+                rows = reconciliation.iter_rows(stream)
+                for batch_number, read in enumerate(reconciler.run(rows), start=1):
+                    if batch_number % report_every == 0:
+                        self.stdout.write(self.progress(read, started))
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+
+        counts = reconciler.counts
+        self.stdout.write(
+            f"  {counts['matched']} matched, {counts['updated']} {'to update' if options['dry_run'] else 'updated'}, "
+            f"{counts['unchanged']} already settled, {counts['skipped']} skipped (not final)"
+        )
+        style = self.style.WARNING if counts['discrepancies'] else self.style.SUCCESS
+        self.stdout.write(style(f"  {counts['discrepancies']} discrepancies written to {report_path}"))
+        self.stdout.write(self.style.SUCCESS(self.progress(counts['rows'], started)))
+
+    @staticmethod
+    def progress(rows, started):
+        elapsed = time.monotonic() - started
+        rate = rows / elapsed if elapsed else rows
+        return f'Reconciled {rows} rows in {elapsed:.1f}s ({rate:.0f} rows/s)'
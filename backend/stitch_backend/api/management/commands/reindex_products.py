@@ -0,0 +1,23 @@
+# api/management/commands/reindex_products.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the product search index from the products table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Products indexed per transaction.')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        self.stdout.write(self.style.MIGRATE_HEADING('Reindexing products...'))
+        products, terms = search.reindex_all(batch_size=options['batch_size'], stdout=self.stdout)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {products} products ({terms} terms) in {elapsed:.1f}s '
+            f'({products / elapsed if elapsed else products:.0f} products/s)'
+        ))
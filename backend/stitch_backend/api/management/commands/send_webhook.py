@@ -0,0 +1,64 @@
+# api/management/commands/send_webhook.py
+import json
+import time
+import uuid
+import urllib.error
+import urllib.request
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api import webhooks
+from api.models import Payments
+
+
+class Command(BaseCommand):
+    help = (
+        'Stands in for the GCash provider during development: signs a payment event for an order '
+        'with GCASH_WEBHOOK["SECRET"] and POSTs it to the webhook endpoint of a running server. '
+        'Use --times to redeliver the same event and --occurred-at to send events out of order.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('order_id', type=int)
+        parser.add_argument('--type', default='payment.succeeded', help=f'Event type: {", ".join(webhooks.EVENT_STATUSES)}.')
+        parser.add_argument('--url', default='http://127.0.0.1:8000/api/webhooks/gcash/')
+        parser.add_argument('--event-id', help='Default: a new random id.')
+        parser.add_argument('--occurred-at', help='ISO 8601 time of the event (default: now).')
+        parser.add_argument('--amount', help="Default: the order's payment amount.")
+        parser.add_argument('--transaction-id', help="Default: the payment's, or a new random one.")
+        parser.add_argument('--times', type=int, default=1, help='Send the identical event this many times.')
+
+    def handle(self, *args, **options):
+        secret = webhooks.get_config()['SECRET']
+        if not secret:
+            raise CommandError('Set GCASH_WEBHOOK_SECRET first; the server must use the same value.')
+        payment = Payments.objects.filter(order_id=options['order_id']).first()
+        amount = options['amount'] or (str(payment.amount) if payment else None)
+        if amount is None:
+            raise CommandError(f"Order {options['order_id']} has no payment; pass --amount to send anyway.")
+
+        body = json.dumps({
+            'id': options['event_id'] or f'evt_{uuid.uuid4().hex}',
+            'type': options['type'],
+            'occurred_at': options['occurred_at'] or timezone.now().isoformat(),
+            'order_id': options['order_id'],
+            'transaction_id': options['transaction_id'] or (payment and payment.transaction_id) or f'GC{uuid.uuid4().hex[:12].upper()}',
+            'amount': amount,
+        }).encode()
+        self.stdout.write(body.decode())
+        for _ in range(max(options['times'], 1)):
+            request = urllib.request.Request(options['url'], data=body, method='POST', headers={
+                'Content-Type': 'application/json',
+                webhooks.HEADER: webhooks.sign(body, secret),
+            })
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=10) as response:
+                    code, reply = response.status, response.read()
+            except urllib.error.HTTPError as exc:
+                code, reply = exc.code, exc.read()
+            except urllib.error.URLError as exc:
+                raise CommandError(f"Could not reach {options['url']}: {exc.reason}")
+            style = self.style.SUCCESS if code == 200 else self.style.ERROR
+            self.stdout.write(style(f'{code} in {(time.perf_counter() - started) * 1000:.1f} ms: {reply.decode()}'))
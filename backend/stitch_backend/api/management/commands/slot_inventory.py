@@ -0,0 +1,32 @@
+# api/management/commands/slot_inventory.py
+from django.core.management.base import BaseCommand, CommandError
+
+from api import inventory
+
+
+class Command(BaseCommand):
+    help = (
+        'Splits the stock of a hot product (or one of its variants) across inventory slots, so '
+        'flash-sale buyers reserve from different rows instead of queueing on one. --off folds '
+        'the slots back into stock_quantity.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('product_id', type=int)
+        parser.add_argument('--variant-id', type=int, help='Slot this variant instead of the product itself.')
+        parser.add_argument('--slots', type=int, default=8, help='Number of slots (default 8).')
+        parser.add_argument('--off', action='store_true', help='Remove the slots and restore stock_quantity.')
+
+    def handle(self, *args, **options):
+        product_id, variant_id = options['product_id'], options['variant_id']
+        if options['off']:
+            total = inventory.disable_slots(product_id, variant_id)
+            self.stdout.write(self.style.SUCCESS(f'Folded slots back into stock_quantity ({total} units).'))
+            return
+        if options['slots'] < 1:
+            raise CommandError('--slots must be at least 1.')
+        try:
+            count = inventory.enable_slots(product_id, variant_id, options['slots'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(f'Stock now spread over {count} slots.'))
@@ -0,0 +1,41 @@
+# api/management/commands/sweep_carts.py
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api import cart
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes the items of shopping carts whose expires_at has passed, in small '
+        'batches with one short transaction each, so it is safe to run against live traffic.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows deleted per transaction.')
+        parser.add_argument('--sleep', type=float, default=0.0, help='Seconds to pause between batches.')
+        parser.add_argument('--loop', type=float, metavar='SECONDS', help='Keep running, sweeping again every SECONDS.')
+
+    def handle(self, *args, **options):
+        while True:
+            self.sweep(options['batch_size'], options['sleep'], options['verbosity'])
+            if not options['loop']:
+                return
+            time.sleep(options['loop'])
+
+    def sweep(self, batch_size, pause, verbosity):
+        started = time.monotonic()
+        reclaimed = 0
+        for deleted in cart.sweep_expired_items(timezone.now(), batch_size):
+            reclaimed += deleted
+            if verbosity > 1:
+                self.stdout.write(f'Deleted {reclaimed} cart items so far')
+            if pause:
+                time.sleep(pause)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Reclaimed {reclaimed} expired cart items in {elapsed:.1f}s '
+            f'({reclaimed / elapsed if elapsed else reclaimed:.0f} rows/s)'
+        ))
@@ -0,0 +1,139 @@
+# stitch_backend/api/middleware.py
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+from django.utils.text import compress_string
+
+from . import querylog
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+
+COMPRESSION_DEFAULTS = {
+    'MIN_SIZE': 1024,                  # bytes; smaller bodies are sent as-is
+    'ENCODINGS': ['br', 'gzip'],       # server preference when the client accepts several equally
+    'BROTLI_QUALITY': 5,               # 0-11; above ~6 costs far more CPU for little gain on JSON
+    'CONTENT_TYPES': ['application/json', 'text/'],
+}
+
+_accept_encoding_re = _lazy_re_compile(r'\s*([^\s;,]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?')
+
+
+def get_compression_config():
+    return {**COMPRESSION_DEFAULTS, **getattr(settings, 'RESPONSE_COMPRESSION', {})}
+
+
+def negotiate_encoding(accept_encoding, offered):
+    """
+    Picks the content-coding to use from an Accept-Encoding header, honouring
+    q-values (q=0 refuses a coding) and falling back to the order of `offered`
+    on ties. Returns None for identity.
+    """
+    weights = {}
+    for part in accept_encoding.split(','):
+        match = _accept_encoding_re.match(part)
+        if not match:
+            continue
+        coding, q = match.group(1).lower(), match.group(2)
+        try:
+            weights[coding] = float(q) if q is not None else 1.0
+        except ValueError:
+            continue
+    best, best_q = None, 0.0
+    for coding in offered:
+        q = weights.get(coding, weights.get('*', 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses with brotli or gzip, whichever the client prefers,
+    once the body is larger than RESPONSE_COMPRESSION['MIN_SIZE'].
+
+    Like django.middleware.gzip.GZipMiddleware, gzip output is padded with a
+    random number of bytes to blunt BREACH-style attacks. Streaming responses
+    and bodies that are already encoded are passed through untouched.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        config = get_compression_config()
+        self.min_size = config['MIN_SIZE']
+        self.brotli_quality = config['BROTLI_QUALITY']
+        self.content_types = tuple(config['CONTENT_TYPES'])
+        self.encodings = [
+            encoding for encoding in config['ENCODINGS']
+            if encoding == 'gzip' or (encoding == 'br' and brotli is not None)
+        ]
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not self.encodings or response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if not response.get('Content-Type', '').startswith(self.content_types):
+            return response
+
+        # Whether or not this body gets compressed, a cache must key on Accept-Encoding
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < self.min_size:
+            return response
+
+        encoding = negotiate_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''), self.encodings)
+        if encoding is None:
+            return response
+
+        compressed = self.compress(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            # The bytes changed, so a strong ETag no longer describes them
+            response['ETag'] = 'W/' + etag
+        return response
+
+    def compress(self, content, encoding):
+        if encoding == 'br':
+            return brotli.compress(content, quality=self.brotli_quality)
+        return compress_string(content, max_random_bytes=100)
+
+
+class QueryCaptureMiddleware:
+    """
+    Records the SQL each request runs, normalised and timed, to the
+    QUERY_CAPTURE log for `manage.py advise_indexes` (see api/querylog.py).
+    Requests are keyed by method and URL route, e.g. "GET api/orders/<int:order_id>/".
+
+    For development and staging: it is removed from the stack at startup
+    unless QUERY_CAPTURE['ENABLED'] is set, so it costs nothing otherwise.
+    """
+    def __init__(self, get_response):
+        config = querylog.get_config()
+        if not config['ENABLED']:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.path = config['PATH']
+        self.min_ms = config['MIN_MS']
+
+    def __call__(self, request):
+        recorder = querylog.QueryRecorder()
+        started = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        elapsed = (time.perf_counter() - started) * 1000
+        if recorder.statements and recorder.total_ms >= self.min_ms:
+            match = request.resolver_match
+            route = match.route if match is not None else request.path
+            querylog.record(f'{request.method} {route}', response.status_code, elapsed, recorder, self.path)
+        return response
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_products_discount_products_purchase_quantity'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appuser',
+            index=models.Index(fields=['created_at'], name='app_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orders',
+            index=models.Index(fields=['user', 'created_at'], name='orders_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payments',
+            index=models.Index(fields=['created_at'], name='payments_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='products',
+            index=models.Index(fields=['created_at'], name='products_created_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='api.products')),
+            ],
+            options={
+                'verbose_name_plural': 'Product Search Terms',
+                'db_table': 'product_search_terms',
+                'unique_together': {('term', 'product')},
+            },
+        ),
+    ]
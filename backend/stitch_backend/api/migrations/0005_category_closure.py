@@ -0,0 +1,44 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_closure(apps, schema_editor):
+    # Seed the closure table from the existing parent_category pointers
+    Categories = apps.get_model('api', 'Categories')
+    CategoryClosure = apps.get_model('api', 'CategoryClosure')
+    parents = dict(Categories.objects.values_list('category_id', 'parent_category_id'))
+    links = []
+    for category_id in parents:
+        ancestor_id, depth, seen = category_id, 0, set()
+        while ancestor_id is not None and ancestor_id not in seen:
+            seen.add(ancestor_id)
+            links.append(CategoryClosure(ancestor_id=ancestor_id, descendant_id=category_id, depth=depth))
+            ancestor_id, depth = parents.get(ancestor_id), depth + 1
+    CategoryClosure.objects.bulk_create(links, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_product_search_terms'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField(default=0)),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='api.categories')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='api.categories')),
+            ],
+            options={
+                'verbose_name_plural': 'Category Closure',
+                'db_table': 'category_closure',
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+        migrations.RunPython(build_closure, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_category_closure'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRanking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.CharField(max_length=8)),
+                ('score', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('category', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.categories')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rankings', to='api.products')),
+            ],
+            options={
+                'verbose_name_plural': 'Product Rankings',
+                'db_table': 'product_rankings',
+                'indexes': [models.Index(fields=['window', '-score'], name='rankings_window_score_idx'), models.Index(fields=['window', 'category', '-score'], name='rankings_category_score_idx')],
+                'unique_together': {('window', 'product')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductSalesDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('quantity', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='api.products')),
+            ],
+            options={
+                'verbose_name_plural': 'Product Sales Daily',
+                'db_table': 'product_sales_daily',
+                'indexes': [models.Index(fields=['day'], name='sales_daily_day_idx')],
+                'unique_together': {('product', 'day')},
+            },
+        ),
+    ]
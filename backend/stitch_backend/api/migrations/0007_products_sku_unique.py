@@ -0,0 +1,37 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:52
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Trim
+
+
+def clear_blank_skus(apps, schema_editor):
+    # A blank SKU means "none": store NULL, which the unique index allows any number of times
+    Products = apps.get_model('api', 'Products')
+    Products.objects.annotate(trimmed=Trim('sku')).filter(trimmed='').update(sku=None)
+    duplicates = list(
+        Products.objects.exclude(sku__isnull=True).values('sku').annotate(count=Count('pk'))
+        .filter(count__gt=1).order_by('sku').values_list('sku', 'count')[:20]
+    )
+    if duplicates:
+        raise RuntimeError(
+            'products.sku must be unique before this migration can run. Give these products distinct SKUs '
+            '(or clear them) and migrate again: '
+            + ', '.join(f'{sku!r} ({count} products)' for sku, count in duplicates)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_product_rankings'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_blank_skus, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='products',
+            name='sku',
+            field=models.CharField(blank=True, max_length=50, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,107 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:57
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+SIZE_SEPARATORS = re.compile(r'[,;/|\n]+')
+
+
+def split_sizes(apps, schema_editor):
+    # "S, M, L" becomes three variants; the product's stock is spread evenly across them
+    Products = apps.get_model('api', 'Products')
+    ProductVariant = apps.get_model('api', 'ProductVariant')
+    variants = []
+    skus = set()
+    for product in Products.objects.exclude(sizes__isnull=True).exclude(sizes='').iterator():
+        sizes = []
+        for size in SIZE_SEPARATORS.split(product.sizes):
+            size = size.strip().upper()[:20]
+            if size and size not in sizes:
+                sizes.append(size)
+        if not sizes:
+            continue
+        share, extra = divmod(max(product.stock_quantity, 0), len(sizes))
+        for position, size in enumerate(sizes):
+            sku = f"{product.sku}-{''.join(size.split())}"[:50] if product.sku else None
+            if sku in skus:
+                sku = None
+            skus.add(sku)
+            variants.append(ProductVariant(
+                product_id=product.pk,
+                size=size,
+                sku=sku,
+                stock_quantity=share + (1 if position < extra else 0),
+                is_available=product.is_available,
+            ))
+    ProductVariant.objects.bulk_create(variants, batch_size=1000)
+
+
+def join_sizes(apps, schema_editor):
+    Products = apps.get_model('api', 'Products')
+    ProductVariant = apps.get_model('api', 'ProductVariant')
+    sizes = {}
+    for product_id, size in ProductVariant.objects.order_by('product_id', 'variant_id').values_list('product_id', 'size'):
+        sizes.setdefault(product_id, []).append(size)
+    for product_id, product_sizes in sizes.items():
+        Products.objects.filter(pk=product_id).update(sizes=', '.join(product_sizes)[:255])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_products_sku_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductVariant',
+            fields=[
+                ('variant_id', models.AutoField(primary_key=True, serialize=False)),
+                ('size', models.CharField(max_length=20)),
+                ('sku', models.CharField(blank=True, max_length=50, null=True, unique=True)),
+                ('stock_quantity', models.IntegerField(default=0)),
+                ('price_delta', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('is_available', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='variants', to='api.products')),
+            ],
+            options={
+                'verbose_name_plural': 'Product Variants',
+                'db_table': 'product_variants',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='cartitems',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='cartitems',
+            name='variant',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='api.productvariant'),
+        ),
+        migrations.AddField(
+            model_name='orderitems',
+            name='variant',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.productvariant'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='cartitems',
+            unique_together={('cart', 'product', 'variant')},
+        ),
+        migrations.AddIndex(
+            model_name='productvariant',
+            index=models.Index(fields=['size', 'is_available', 'product'], name='variants_size_available_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='productvariant',
+            unique_together={('product', 'size')},
+        ),
+        migrations.RunPython(split_sizes, join_sizes),
+        migrations.RemoveField(
+            model_name='products',
+            name='sizes',
+        ),
+    ]
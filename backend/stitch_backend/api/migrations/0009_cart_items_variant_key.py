@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:03
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_variant_key(apps, schema_editor):
+    CartItems = apps.get_model('api', 'CartItems')
+    CartItems.objects.filter(variant__isnull=False).update(variant_key=F('variant_id'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_product_variants'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='cartitems',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='cartitems',
+            name='variant_key',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_variant_key, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='cartitems',
+            unique_together={('cart', 'product', 'variant_key')},
+        ),
+    ]
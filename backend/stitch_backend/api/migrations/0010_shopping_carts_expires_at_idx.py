@@ -0,0 +1,39 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:04
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+
+
+def start_cart_clocks(apps, schema_editor):
+    # Existing carts with items expire one TTL after their most recently added item
+    ShoppingCarts = apps.get_model('api', 'ShoppingCarts')
+    CartItems = apps.get_model('api', 'CartItems')
+    ttl = getattr(settings, 'CART_TTL', timedelta(days=30))
+    last_added = (
+        CartItems.objects.filter(cart=OuterRef('pk')).order_by().values('cart')
+        .annotate(last=Max('added_at')).values('last')
+    )
+    for cart_id, last in (
+        ShoppingCarts.objects.filter(expires_at__isnull=True)
+        .annotate(last=Subquery(last_added)).exclude(last__isnull=True)
+        .values_list('pk', 'last').iterator()
+    ):
+        ShoppingCarts.objects.filter(pk=cart_id).update(expires_at=last + ttl)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_cart_items_variant_key'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='shoppingcarts',
+            index=models.Index(fields=['expires_at'], name='carts_expires_at_idx'),
+        ),
+        migrations.RunPython(start_cart_clocks, migrations.RunPython.noop),
+    ]
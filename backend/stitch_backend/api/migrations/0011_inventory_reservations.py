@@ -0,0 +1,52 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_shopping_carts_expires_at_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryReservation',
+            fields=[
+                ('reservation_id', models.AutoField(primary_key=True, serialize=False)),
+                ('variant_key', models.PositiveIntegerField(default=0, editable=False)),
+                ('slot', models.PositiveSmallIntegerField()),
+                ('quantity', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('Held', 'Held'), ('Committed', 'Committed'), ('Released', 'Released'), ('Settled', 'Settled')], default='Held', max_length=10)),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reservations', to='api.orders')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='api.products')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='api.appuser')),
+                ('variant', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='api.productvariant')),
+            ],
+            options={
+                'verbose_name_plural': 'Inventory Reservations',
+                'db_table': 'inventory_reservations',
+                'indexes': [models.Index(fields=['status', 'expires_at'], name='reservations_status_exp_idx'), models.Index(fields=['user', 'status', 'product'], name='reservations_user_status_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='InventorySlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('variant_key', models.PositiveIntegerField(default=0, editable=False)),
+                ('slot', models.PositiveSmallIntegerField()),
+                ('quantity', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory_slots', to='api.products')),
+                ('variant', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='api.productvariant')),
+            ],
+            options={
+                'verbose_name_plural': 'Inventory Slots',
+                'db_table': 'inventory_slots',
+                'unique_together': {('product', 'variant_key', 'slot')},
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='orderitems',
+            name='order',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='api.orders'),
+        ),
+    ]
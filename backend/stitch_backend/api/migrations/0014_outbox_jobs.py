@@ -0,0 +1,34 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:18
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_order_items_related_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('topic', models.CharField(max_length=64)),
+                ('payload', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Running', 'Running'), ('Done', 'Done'), ('Failed', 'Failed')], default='Pending', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('run_after', models.DateTimeField()),
+                ('locked_until', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Outbox Jobs',
+                'db_table': 'outbox_jobs',
+                'indexes': [models.Index(fields=['status', 'run_after'], name='outbox_status_run_after_idx'), models.Index(fields=['status', 'finished_at'], name='outbox_status_finished_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_outbox_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('order_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('order_date', models.DateTimeField()),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('order_status', models.CharField(choices=[('Pending', 'Pending'), ('Processing', 'Processing'), ('Delivered', 'Delivered'), ('Cancelled', 'Cancelled'), ('Refunded', 'Refunded')], max_length=20)),
+                ('delivery_date', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField()),
+                ('billing_address', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.address')),
+                ('shipping_address', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.address')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_orders', to='api.appuser')),
+            ],
+            options={
+                'verbose_name_plural': 'Archived Orders',
+                'db_table': 'archived_orders',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderItem',
+            fields=[
+                ('order_item_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('quantity', models.IntegerField()),
+                ('price_at_time_of_order', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('subtotal', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField()),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='api.archivedorder')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.products')),
+                ('variant', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.productvariant')),
+            ],
+            options={
+                'verbose_name_plural': 'Archived Order Items',
+                'db_table': 'archived_order_items',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedPayment',
+            fields=[
+                ('payment_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('payment_method', models.CharField(choices=[('Cash On Delivery', 'Cash On Delivery'), ('GCash', 'GCash')], max_length=50)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('transaction_id', models.CharField(blank=True, max_length=255, null=True)),
+                ('payment_status', models.CharField(choices=[('Pending', 'Pending'), ('Completed', 'Completed'), ('Failed', 'Failed'), ('Refunded', 'Refunded')], max_length=20)),
+                ('paid_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField()),
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='payment', to='api.archivedorder')),
+            ],
+            options={
+                'verbose_name_plural': 'Archived Payments',
+                'db_table': 'archived_payments',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['user', 'created_at'], name='archived_orders_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedpayment',
+            index=models.Index(fields=['created_at'], name='archived_payments_created_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_archive_tables'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='orders',
+            index=models.Index(fields=['user', 'order_date'], name='orders_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payments',
+            index=models.Index(fields=['payment_status', 'paid_at'], name='payments_status_paid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payments',
+            index=models.Index(fields=['transaction_id'], name='payments_transaction_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='products',
+            index=models.Index(fields=['is_available', 'category', 'price'], name='products_avail_cat_price_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:33
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentWebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=255, unique=True)),
+                ('event_type', models.CharField(max_length=64)),
+                ('order_id', models.IntegerField(blank=True, null=True)),
+                ('occurred_at', models.DateTimeField()),
+                ('payload', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('status', models.CharField(choices=[('Received', 'Received'), ('Processed', 'Processed'), ('Ignored', 'Ignored'), ('Failed', 'Failed')], default='Received', max_length=10)),
+                ('detail', models.CharField(blank=True, max_length=255, null=True)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Payment Webhook Events',
+                'db_table': 'payment_webhook_events',
+                'indexes': [models.Index(fields=['status', 'received_at'], name='webhook_status_received_idx'), models.Index(fields=['order_id', 'status', 'occurred_at'], name='webhook_order_occurred_idx')],
+            },
+        ),
+    ]
@@ -1,4 +1,5 @@
 # stitch_backend/products/models.py
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.contrib.auth.models import User # Import Django's User model
 
@@ -28,6 +29,43 @@ class OrderStatus(models.TextChoices):
     CANCELLED = 'Cancelled', 'Cancelled'
     REFUNDED = 'Refunded', 'Refunded'
 
+class JobStatus(models.TextChoices):
+    PENDING = 'Pending', 'Pending'
+    RUNNING = 'Running', 'Running'
+    DONE = 'Done', 'Done'
+    FAILED = 'Failed', 'Failed'
+
+# The order_status changes allowed from each status. Enforced by OrdersSerializer and
+# POST /api/orders/transition/; a status with no entries is final.
+ORDER_TRANSITIONS = {
+    OrderStatus.PENDING: {OrderStatus.PROCESSING, OrderStatus.CANCELLED},
+    OrderStatus.PROCESSING: {OrderStatus.DELIVERED, OrderStatus.CANCELLED},
+    OrderStatus.DELIVERED: {OrderStatus.REFUNDED},
+    OrderStatus.CANCELLED: set(),
+    OrderStatus.REFUNDED: set(),
+}
+
+# The payment_status changes a provider may report from each status. Enforced by
+# `manage.py reconcile_payments` and the webhook processor; admins may still set any status.
+PAYMENT_TRANSITIONS = {
+    PaymentStatus.PENDING: {PaymentStatus.COMPLETED, PaymentStatus.FAILED, PaymentStatus.REFUNDED},
+    PaymentStatus.COMPLETED: {PaymentStatus.REFUNDED},
+    PaymentStatus.FAILED: {PaymentStatus.COMPLETED}, # Paid on a retry
+    PaymentStatus.REFUNDED: set(),
+}
+
+class WebhookEventStatus(models.TextChoices):
+    RECEIVED = 'Received', 'Received'
+    PROCESSED = 'Processed', 'Processed'
+    IGNORED = 'Ignored', 'Ignored'
+    FAILED = 'Failed', 'Failed'
+
+class ReservationStatus(models.TextChoices):
+    HELD = 'Held', 'Held'
+    COMMITTED = 'Committed', 'Committed'
+    RELEASED = 'Released', 'Released'
+    SETTLED = 'Settled', 'Settled'
+
 class AppUser(models.Model):
     # Link to Django's built-in User model
     user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True) # Changed primary_key to user
@@ -48,6 +86,7 @@ class AppUser(models.Model):
         
         db_table = 'app_user' # Adjusted table name for clarity if needed
         verbose_name_plural = 'AppUsers'
+        indexes = [models.Index(fields=['created_at'], name='app_user_created_idx')]
 
     def __str__(self):
         return f"{self.first_name or ""} {self.last_name or ""} ({self.user.username or ""})" # Use user.username or user.email
@@ -69,6 +108,23 @@ class Categories(models.Model):
         return self.name or ""
 
 
+class CategoryClosure(models.Model):
+    # Closure table for the category tree: one row per (ancestor, descendant) pair,
+    # including each category paired with itself at depth 0. Maintained by api/category_tree.py.
+    ancestor = models.ForeignKey(Categories, models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(Categories, models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        
+        db_table = 'category_closure'
+        verbose_name_plural = 'Category Closure'
+        unique_together = (('ancestor', 'descendant'),) # Serves "everything under <ancestor>"
+
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
+
+
 class Address(models.Model):
     address_id = models.AutoField(primary_key=True)
     user = models.ForeignKey(AppUser, models.CASCADE) # Link to AppUser
@@ -101,12 +157,13 @@ class ShoppingCarts(models.Model):
     user = models.OneToOneField(AppUser, models.CASCADE) # One cart per AppUser
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    expires_at = models.DateTimeField(blank=True, null=True)
+    expires_at = models.DateTimeField(blank=True, null=True) # Pushed forward on cart activity (CART_TTL); see sweep_carts
 
     class Meta:
         
         db_table = 'shopping_carts'
         verbose_name_plural = 'Shopping Carts'
+        indexes = [models.Index(fields=['expires_at'], name='carts_expires_at_idx')]
 
     def __str__(self):
         return f"Shopping Cart for {self.user.user.username or ""}" # Access Django User's username
@@ -117,11 +174,10 @@ class Products(models.Model):
     name = models.CharField(unique=True, max_length=255)
     description = models.TextField(blank=True, null=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
-    sku = models.CharField(max_length=50, blank=True, null=True) # Stock Keeping Unit
+    sku = models.CharField(max_length=50, unique=True, blank=True, null=True) # Stock Keeping Unit, the import/export upsert key
     stock_quantity = models.IntegerField(default=0)
     category = models.ForeignKey(Categories, models.DO_NOTHING, blank=True, null=True)
     image_url = models.CharField(max_length=255, blank=True, null=True)
-    sizes = models.CharField(max_length=255, blank=True, null=True)
     is_available = models.BooleanField(default=True)
     purchase_quantity = models.IntegerField(default=0)
     discount = models.DecimalField(max_digits=10, decimal_places=2)
@@ -132,11 +188,42 @@ class Products(models.Model):
         
         db_table = 'products'
         verbose_name_plural = 'Products'
+        indexes = [
+            models.Index(fields=['created_at'], name='products_created_idx'),
+            models.Index(fields=['is_available', 'category', 'price'], name='products_avail_cat_price_idx'), # Catalog filters
+        ]
 
     def __str__(self):
         return self.name or ""
 
 
+class ProductVariant(models.Model):
+    # One row per size of a product, with its own SKU, stock and price adjustment
+    variant_id = models.AutoField(primary_key=True)
+    product = models.ForeignKey(Products, models.CASCADE, related_name='variants')
+    size = models.CharField(max_length=20) # Stored upper-cased, e.g. "M", "XL", "42"
+    sku = models.CharField(max_length=50, unique=True, blank=True, null=True)
+    stock_quantity = models.IntegerField(default=0)
+    price_delta = models.DecimalField(max_digits=10, decimal_places=2, default=0) # Added to the product price
+    is_available = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        
+        db_table = 'product_variants'
+        verbose_name_plural = 'Product Variants'
+        unique_together = (('product', 'size'),)
+        indexes = [models.Index(fields=['size', 'is_available', 'product'], name='variants_size_available_idx')] # Serves "everything in size M"
+
+    def save(self, *args, **kwargs):
+        self.size = (self.size or '').strip().upper()
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.product.name or ""} ({self.size or ""})"
+
+
 class Orders(models.Model):
     order_id = models.AutoField(primary_key=True)
     user = models.ForeignKey(AppUser, models.CASCADE) # Link to AppUser
@@ -157,6 +244,10 @@ class Orders(models.Model):
         
         db_table = 'orders'
         verbose_name_plural = 'Orders'
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='orders_user_created_idx'),
+            models.Index(fields=['user', 'order_date'], name='orders_user_date_idx'), # Order history date filters
+        ]
 
     def __str__(self):
         return f"Order {self.order_id} by {self.user.user.username}"
@@ -185,6 +276,11 @@ class Payments(models.Model):
         
         db_table = 'payments'
         verbose_name_plural = 'Payments'
+        indexes = [
+            models.Index(fields=['created_at'], name='payments_created_idx'),
+            models.Index(fields=['payment_status', 'paid_at'], name='payments_status_paid_idx'), # Status + paid_at filters
+            models.Index(fields=['transaction_id'], name='payments_transaction_idx'), # Gateway reference lookups
+        ]
 
     def __str__(self):
         return f"Payment {self.payment_id or ""} - {self.payment_status or ""} for {self.amount or ""}"
@@ -194,13 +290,21 @@ class CartItems(models.Model):
     cart_item_id = models.AutoField(primary_key=True)
     cart = models.ForeignKey(ShoppingCarts, models.CASCADE)
     product = models.ForeignKey(Products, models.CASCADE)
+    variant = models.ForeignKey(ProductVariant, models.CASCADE, blank=True, null=True)
+    # variant_id, or 0 for no variant. Unique keys treat NULLs as distinct, so this stands in
+    # for `variant` in the unique key that cart upserts (api/cart.py) collide on.
+    variant_key = models.PositiveIntegerField(default=0, editable=False)
     quantity = models.IntegerField(default=1)
     added_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         
         db_table = 'cart_items'
-        unique_together = (('cart', 'product'),)
+        unique_together = (('cart', 'product', 'variant_key'),)
+
+    def save(self, *args, **kwargs):
+        self.variant_key = self.variant_id or 0
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.quantity or "0"} x {self.product.name or "0"} in Cart {self.cart.cart_id or "0"}"
@@ -208,8 +312,9 @@ class CartItems(models.Model):
 
 class OrderItems(models.Model):
     order_item_id = models.AutoField(primary_key=True)
-    order = models.ForeignKey(Orders, models.CASCADE)
+    order = models.ForeignKey(Orders, models.CASCADE, related_name='items')
     product = models.ForeignKey(Products, models.DO_NOTHING)
+    variant = models.ForeignKey(ProductVariant, models.SET_NULL, blank=True, null=True)
     quantity = models.IntegerField()
     price_at_time_of_order = models.DecimalField(max_digits=10, decimal_places=2)
     subtotal = models.DecimalField(max_digits=10, decimal_places=2)
@@ -222,4 +327,269 @@ class OrderItems(models.Model):
         verbose_name_plural = 'Order Items'
 
     def __str__(self):
-        return f"{self.quantity or "0"} x {self.product.name or "0"} for Order {self.order.order_id or "0"}"
\ No newline at end of file
+        return f"{self.quantity or "0"} x {self.product.name or "0"} for Order {self.order.order_id or "0"}"
+
+class ProductSearchTerm(models.Model):
+    # Inverted index for product search, maintained by api/search.py on every product write
+    term = models.CharField(max_length=64)
+    product = models.ForeignKey(Products, models.CASCADE, related_name='search_terms')
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        
+        db_table = 'product_search_terms'
+        verbose_name_plural = 'Product Search Terms'
+        unique_together = (('term', 'product'),) # Leading `term` column serves exact and prefix lookups
+
+    def __str__(self):
+        return f"{self.term} -> {self.product_id} ({self.weight})"
+
+
+class ProductSalesDaily(models.Model):
+    # Units sold per product per day; the source the time-windowed rankings are rebuilt from
+    product = models.ForeignKey(Products, models.CASCADE, related_name='daily_sales')
+    day = models.DateField()
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        
+        db_table = 'product_sales_daily'
+        verbose_name_plural = 'Product Sales Daily'
+        unique_together = (('product', 'day'),)
+        indexes = [models.Index(fields=['day'], name='sales_daily_day_idx')]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} on {self.day}"
+
+
+class ProductRanking(models.Model):
+    # Precomputed best-seller scores per ranking window ('1d', '7d', '30d', 'all'), see api/rankings.py
+    window = models.CharField(max_length=8)
+    product = models.ForeignKey(Products, models.CASCADE, related_name='rankings')
+    category = models.ForeignKey(Categories, models.DO_NOTHING, blank=True, null=True, db_constraint=False, related_name='+') # Copied from the product
+    score = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        
+        db_table = 'product_rankings'
+        verbose_name_plural = 'Product Rankings'
+        unique_together = (('window', 'product'),)
+        indexes = [
+            models.Index(fields=['window', '-score'], name='rankings_window_score_idx'),
+            models.Index(fields=['window', 'category', '-score'], name='rankings_category_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.window}: {self.product_id} ({self.score})"
+
+
+class InventorySlot(models.Model):
+    # One share of a hot product's (or variant's) stock. While a product has slots they hold its
+    # sellable stock and stock_quantity is only a mirror; spreading stock over several rows lets
+    # concurrent reservations lock different rows (see api/inventory.py)
+    product = models.ForeignKey(Products, models.CASCADE, related_name='inventory_slots')
+    variant = models.ForeignKey(ProductVariant, models.CASCADE, blank=True, null=True)
+    variant_key = models.PositiveIntegerField(default=0, editable=False) # variant_id or 0, as on CartItems
+    slot = models.PositiveSmallIntegerField()
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        
+        db_table = 'inventory_slots'
+        verbose_name_plural = 'Inventory Slots'
+        unique_together = (('product', 'variant_key', 'slot'),)
+
+    def save(self, *args, **kwargs):
+        self.variant_key = self.variant_id or 0
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.product_id}/{self.variant_key} slot {self.slot}: {self.quantity}"
+
+
+class InventoryReservation(models.Model):
+    # Ledger of units taken from an inventory slot: held for a short TTL, then committed to an
+    # order or released back to the slot. Committed rows are settled into purchase_quantity
+    # and the rankings by `manage.py reap_reservations`.
+    reservation_id = models.AutoField(primary_key=True)
+    user = models.ForeignKey(AppUser, models.CASCADE, blank=True, null=True, related_name='reservations')
+    product = models.ForeignKey(Products, models.CASCADE, related_name='reservations')
+    variant = models.ForeignKey(ProductVariant, models.CASCADE, blank=True, null=True)
+    variant_key = models.PositiveIntegerField(default=0, editable=False)
+    slot = models.PositiveSmallIntegerField() # InventorySlot.slot the units came from
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(
+        max_length=10,
+        choices=ReservationStatus.choices,
+        default=ReservationStatus.HELD,
+    )
+    order = models.ForeignKey(Orders, models.SET_NULL, blank=True, null=True, related_name='reservations')
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        
+        db_table = 'inventory_reservations'
+        verbose_name_plural = 'Inventory Reservations'
+        indexes = [
+            models.Index(fields=['status', 'expires_at'], name='reservations_status_exp_idx'), # Reaper scans
+            models.Index(fields=['user', 'status', 'product'], name='reservations_user_status_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.variant_key = self.variant_id or 0
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id}/{self.variant_key} ({self.status})"
+
+
+class IdempotencyKey(models.Model):
+    # First response to a POST sent with an Idempotency-Key header, replayed to its retries (see api/idempotency.py)
+    key_hash = models.CharField(max_length=64, unique=True) # sha256 of the endpoint, user and client key
+    fingerprint = models.CharField(max_length=64) # HMAC of the request body; the key may not be reused for another body
+    status_code = models.PositiveSmallIntegerField(blank=True, null=True) # NULL while the first request is in flight
+    response_body = models.JSONField(encoder=DjangoJSONEncoder, blank=True, null=True)
+    locked_until = models.DateTimeField(blank=True, null=True) # An in-flight request older than this is presumed dead
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        
+        db_table = 'idempotency_keys'
+        verbose_name_plural = 'Idempotency Keys'
+        indexes = [models.Index(fields=['expires_at'], name='idempotency_expires_at_idx')]
+
+    def __str__(self):
+        return f"{self.key_hash[:12]} ({self.status_code or 'in flight'})"
+
+
+class OutboxJob(models.Model):
+    # Side effect to run after a write commits, inserted in the write's own transaction so the two
+    # commit or roll back together. Claimed and run by `manage.py run_worker` (see api/outbox.py).
+    topic = models.CharField(max_length=64) # Selects the handler, e.g. "order.placed"
+    payload = models.JSONField(encoder=DjangoJSONEncoder, default=dict)
+    status = models.CharField(
+        max_length=10,
+        choices=JobStatus.choices,
+        default=JobStatus.PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField() # Not claimed before this; pushed back by retries
+    locked_until = models.DateTimeField(blank=True, null=True) # A running job past this is presumed abandoned
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        
+        db_table = 'outbox_jobs'
+        verbose_name_plural = 'Outbox Jobs'
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='outbox_status_run_after_idx'), # Claim scans
+            models.Index(fields=['status', 'finished_at'], name='outbox_status_finished_idx'), # Stats and purging
+        ]
+
+    def __str__(self):
+        return f"{self.topic} #{self.pk} ({self.status})"
+
+
+class PaymentWebhookEvent(models.Model):
+    # Raw payment provider event, stored as received by POST /api/webhooks/gcash/ and applied to
+    # payments and orders later by `manage.py process_webhooks` (see api/webhooks.py)
+    event_id = models.CharField(max_length=255, unique=True) # The provider's id; redeliveries collide here
+    event_type = models.CharField(max_length=64) # e.g. "payment.succeeded"
+    order_id = models.IntegerField(blank=True, null=True) # Merchant reference; not a FK, the event is kept as sent
+    occurred_at = models.DateTimeField() # Provider time; events of one order are applied in this order
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    status = models.CharField(
+        max_length=10,
+        choices=WebhookEventStatus.choices,
+        default=WebhookEventStatus.RECEIVED,
+    )
+    detail = models.CharField(max_length=255, blank=True, null=True) # Why the event was ignored or failed
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+
+        db_table = 'payment_webhook_events'
+        verbose_name_plural = 'Payment Webhook Events'
+        indexes = [
+            models.Index(fields=['status', 'received_at'], name='webhook_status_received_idx'), # Claims and purging
+            models.Index(fields=['order_id', 'status', 'occurred_at'], name='webhook_order_occurred_idx'), # Stale checks
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} {self.event_id} ({self.status})"
+
+
+# Archive tables (see api/archive.py). Closed orders past their retention are moved here with
+# their items and payment by `manage.py archive_orders`, keeping their primary keys, so the
+# hot tables stay small. Same columns as the originals plus archived_at; never written by the API.
+class ArchivedOrder(models.Model):
+    order_id = models.IntegerField(primary_key=True)
+    user = models.ForeignKey(AppUser, models.CASCADE, related_name='archived_orders')
+    order_date = models.DateTimeField()
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    order_status = models.CharField(max_length=20, choices=OrderStatus.choices)
+    shipping_address = models.ForeignKey(Address, models.DO_NOTHING, related_name='+')
+    billing_address = models.ForeignKey(Address, models.DO_NOTHING, related_name='+')
+    delivery_date = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField()
+
+    class Meta:
+
+        db_table = 'archived_orders'
+        verbose_name_plural = 'Archived Orders'
+        indexes = [models.Index(fields=['user', 'created_at'], name='archived_orders_user_idx')]
+
+    def __str__(self):
+        return f"Archived order {self.order_id}"
+
+
+class ArchivedPayment(models.Model):
+    payment_id = models.IntegerField(primary_key=True)
+    order = models.OneToOneField(ArchivedOrder, models.CASCADE, related_name='payment')
+    payment_method = models.CharField(max_length=50, choices=PaymentMethod.choices)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    transaction_id = models.CharField(max_length=255, blank=True, null=True)
+    payment_status = models.CharField(max_length=20, choices=PaymentStatus.choices)
+    paid_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField()
+
+    class Meta:
+
+        db_table = 'archived_payments'
+        verbose_name_plural = 'Archived Payments'
+        indexes = [models.Index(fields=['created_at'], name='archived_payments_created_idx')]
+
+    def __str__(self):
+        return f"Archived payment {self.payment_id} for order {self.order_id}"
+
+
+class ArchivedOrderItem(models.Model):
+    order_item_id = models.IntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, models.CASCADE, related_name='items')
+    product = models.ForeignKey(Products, models.DO_NOTHING, related_name='+')
+    variant = models.ForeignKey(ProductVariant, models.SET_NULL, blank=True, null=True, related_name='+')
+    quantity = models.IntegerField()
+    price_at_time_of_order = models.DecimalField(max_digits=10, decimal_places=2)
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField()
+
+    class Meta:
+
+        db_table = 'archived_order_items'
+        verbose_name_plural = 'Archived Order Items'
+
+    def __str__(self):
+        return f"{self.quantity} x product {self.product_id} for archived order {self.order_id}"
@@ -0,0 +1,211 @@
+# stitch_backend/api/outbox.py
+"""
+Transactional outbox for side effects of writes: confirmation emails,
+analytics and ranking updates.
+
+A write that needs follow-up work calls enqueue() inside its own
+transaction. The OutboxJob row therefore commits or rolls back with the
+order or payment it describes. No job is lost after a commit, and none
+runs for a write that rolled back. The request pays for one INSERT; the
+work itself happens in `manage.py run_worker`.
+
+Workers claim jobs in batches:
+
+    SELECT ... WHERE status = 'Pending' AND run_after <= now
+     ORDER BY run_after FOR UPDATE SKIP LOCKED LIMIT n
+
+They mark the batch Running and commit, then run the handlers outside any
+transaction. Any number of worker processes can share the queue: SKIP
+LOCKED hands each one different rows instead of making them wait on each
+other. A failed job is retried with exponential backoff, and after
+MAX_ATTEMPTS it is parked as Failed. A job whose worker died is picked up
+again once VISIBILITY_TIMEOUT has passed. Handlers should therefore be safe
+to run more than once.
+
+Handlers are registered per topic with @handler('topic') (see api/jobs.py).
+A handler whose only effect is database writes that cannot safely be
+repeated, such as counter increments, registers with
+@handler('topic', atomic=True). It then runs in one transaction with the
+job's own Done update, under a lock on the job row. A crash before the
+commit undoes both, and a job already finished by another worker is not run
+again.
+"""
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from .models import JobStatus, OutboxJob
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BATCH_SIZE': 20,             # jobs claimed per round trip
+    'MAX_ATTEMPTS': 8,            # then the job is parked as Failed
+    'BACKOFF_BASE': 5,            # seconds before the first retry; doubles per attempt
+    'BACKOFF_MAX': 60 * 60,       # seconds; cap on the retry delay
+    'VISIBILITY_TIMEOUT': 5 * 60, # seconds a claimed job may run before another worker may take it over
+    'RETENTION': 7 * 24 * 60 * 60, # seconds finished jobs are kept for stats and auditing
+}
+
+_handlers = {}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'OUTBOX', {})}
+
+
+def handler(topic, atomic=False):
+    """
+    Registers the decorated function as the handler for `topic`. It is called
+    with the job's payload. With atomic=True its writes commit together with
+    the job's Done status, so they are applied exactly once.
+    """
+    def register(func):
+        _handlers[topic] = (func, atomic)
+        return func
+    return register
+
+
+def enqueue(topic, payload=None, delay=None):
+    """
+    Adds a job, in the caller's transaction. Call it inside the atomic block
+    of the write it belongs to.
+    """
+    return OutboxJob.objects.create(
+        topic=topic, payload=payload or {}, run_after=timezone.now() + (delay or timedelta()),
+    )
+
+
+def enqueue_many(jobs):
+    """Adds several (topic, payload) jobs with one INSERT, in the caller's transaction."""
+    now = timezone.now()
+    return OutboxJob.objects.bulk_create([
+        OutboxJob(topic=topic, payload=payload or {}, run_after=now) for topic, payload in jobs
+    ])
+
+
+def claim(batch_size=None, topics=None, now=None):
+    """
+    Claims up to batch_size runnable jobs for this worker and returns them.
+    Rows locked by another worker's claim are skipped, not waited on.
+    """
+    config = get_config()
+    now = now or timezone.now()
+    runnable = (
+        Q(status=JobStatus.PENDING, run_after__lte=now)
+        | Q(status=JobStatus.RUNNING, locked_until__lt=now) # The claiming worker died
+    )
+    with transaction.atomic():
+        jobs = OutboxJob.objects.select_for_update(skip_locked=True).filter(runnable)
+        if topics:
+            jobs = jobs.filter(topic__in=topics)
+        jobs = list(jobs.order_by('run_after', 'pk')[:batch_size or config['BATCH_SIZE']])
+        if jobs:
+            locked_until = now + timedelta(seconds=config['VISIBILITY_TIMEOUT'])
+            OutboxJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                status=JobStatus.RUNNING, locked_until=locked_until, attempts=F('attempts') + 1,
+            )
+            for job in jobs:
+                job.status, job.locked_until, job.attempts = JobStatus.RUNNING, locked_until, job.attempts + 1
+    return jobs
+
+
+def backoff(attempts):
+    """Seconds to wait before retrying a job that has failed `attempts` times: exponential, capped, jittered."""
+    config = get_config()
+    delay = min(config['BACKOFF_BASE'] * 2 ** (attempts - 1), config['BACKOFF_MAX'])
+    return delay * random.uniform(0.8, 1.2)
+
+
+def run(job):
+    """Runs one claimed job and records the outcome. Returns True if it succeeded."""
+    func, atomic = _handlers.get(job.topic, (None, False))
+    now = timezone.now()
+    try:
+        if func is None:
+            raise LookupError(f"No handler registered for topic {job.topic!r}.")
+        if atomic:
+            with transaction.atomic():
+                # Still ours? After VISIBILITY_TIMEOUT another worker may have claimed and finished it
+                if not OutboxJob.objects.select_for_update().filter(
+                    pk=job.pk, status=JobStatus.RUNNING, attempts=job.attempts,
+                ).values_list('pk'):
+                    return True
+                func(job.payload)
+                OutboxJob.objects.filter(pk=job.pk).update(status=JobStatus.DONE, locked_until=None, finished_at=now)
+            return True
+        func(job.payload)
+    except Exception:
+        error = traceback.format_exc(limit=5)
+        if job.attempts >= get_config()['MAX_ATTEMPTS'] or func is None:
+            logger.error("Outbox job %s (%s) failed for good after %s attempts", job.pk, job.topic, job.attempts)
+            changes = {'status': JobStatus.FAILED, 'finished_at': now}
+        else:
+            changes = {'status': JobStatus.PENDING, 'run_after': now + timedelta(seconds=backoff(job.attempts))}
+            logger.warning("Outbox job %s (%s) failed, attempt %s; retrying", job.pk, job.topic, job.attempts)
+        OutboxJob.objects.filter(pk=job.pk).update(locked_until=None, last_error=error, **changes)
+        return False
+    OutboxJob.objects.filter(pk=job.pk).update(status=JobStatus.DONE, locked_until=None, finished_at=now)
+    return True
+
+
+def purge_finished(now=None, batch_size=1000):
+    """Deletes Done jobs older than RETENTION, batch_size per statement. Returns the number deleted."""
+    cutoff = (now or timezone.now()) - timedelta(seconds=get_config()['RETENTION'])
+    purged = 0
+    while True:
+        pks = list(
+            OutboxJob.objects.filter(status=JobStatus.DONE, finished_at__lt=cutoff)
+            .order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not pks:
+            return purged
+        purged += OutboxJob.objects.filter(pk__in=pks).delete()[0]
+
+
+def stats(window=timedelta(hours=1), sample=1000, now=None):
+    """
+    Queue depth and job latency, per topic:
+      pending/running/failed  current counts
+      oldest_pending_age      seconds since the oldest pending job was enqueued
+      done_last_window        jobs finished within `window` (counted up to `sample`)
+      latency_p50/p95/max     seconds from enqueue to finish, over up to `sample` recent jobs
+    """
+    now = now or timezone.now()
+    topics = {}
+
+    def topic(name):
+        return topics.setdefault(name, {
+            'pending': 0, 'running': 0, 'failed': 0, 'oldest_pending_age': None,
+            'done_last_window': 0, 'latency_p50': None, 'latency_p95': None, 'latency_max': None,
+        })
+
+    for row in (
+        OutboxJob.objects.filter(status__in=[JobStatus.PENDING, JobStatus.RUNNING, JobStatus.FAILED])
+        .order_by().values('topic', 'status').annotate(count=Count('pk'), oldest=Min('created_at'))
+    ):
+        entry = topic(row['topic'])
+        entry[row['status'].lower()] = row['count']
+        if row['status'] == JobStatus.PENDING:
+            entry['oldest_pending_age'] = round((now - row['oldest']).total_seconds(), 3)
+
+    durations = {}
+    for name, created_at, finished_at in (
+        OutboxJob.objects.filter(status=JobStatus.DONE, finished_at__gte=now - window)
+        .order_by('-finished_at').values_list('topic', 'created_at', 'finished_at')[:sample]
+    ):
+        durations.setdefault(name, []).append((finished_at - created_at).total_seconds())
+    for name, values in durations.items():
+        values.sort()
+        entry = topic(name)
+        entry['done_last_window'] = len(values)
+        entry['latency_p50'] = round(values[len(values) // 2], 3)
+        entry['latency_p95'] = round(values[min(len(values) - 1, int(len(values) * 0.95))], 3)
+        entry['latency_max'] = round(values[-1], 3)
+    return {'window_seconds': int(window.total_seconds()), 'topics': topics}
@@ -0,0 +1,246 @@
+# stitch_backend/api/pagination.py
+import base64
+import json
+from urllib import parse
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def estimate_count(queryset):
+    """
+    Returns the planner's row estimate for an unfiltered queryset, or None when
+    there isn't a cheap estimate (filtered queryset or unsupported database).
+    """
+    query = queryset.query
+    if query.where or query.distinct or query.group_by is not None:
+        return None
+    table = queryset.model._meta.db_table
+    connection = connections[queryset.db]
+    if connection.vendor == 'mysql':
+        sql = (
+            "SELECT TABLE_ROWS FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s"
+        )
+    elif connection.vendor == 'postgresql':
+        sql = "SELECT reltuples::bigint FROM pg_class WHERE relname = %s"
+    else:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [table])
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that trusts the database's table statistics instead of running
+    COUNT(*) once a table is larger than ESTIMATED_COUNT_THRESHOLD rows.
+    Small tables and filtered querysets still get an exact count.
+    """
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list) if hasattr(self.object_list, 'query') else None
+        if estimate is not None and estimate >= getattr(settings, 'ESTIMATED_COUNT_THRESHOLD', 10000):
+            return estimate
+        return super().count
+
+
+class CustomPagination(PageNumberPagination):
+    django_paginator_class = EstimatedCountPaginator
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.page.paginator.count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'total_pages': self.page.paginator.num_pages,
+            'results': data
+        })
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination keyed on (created_at, pk), newest first by default.
+
+    Unlike OFFSET paging, each page is a single indexed range scan no matter how
+    deep the client has scrolled, and rows inserted meanwhile never shift pages.
+    Views can change the key with `cursor_ordering`, e.g. ('-added_at', '-pk').
+
+    Passing ?page=<n> opts into the classic count/next/previous/total_pages
+    envelope (CustomPagination). Relevance-ranked querysets (annotated with
+    `search_rank` by ProductSearchFilter) are always paged that way, since
+    their order has nothing to do with created_at.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    offset_pagination_class = CustomPagination
+    default_ordering = ('-created_at', '-pk')
+    invalid_cursor_message = 'Invalid cursor'
+    rank_annotation = 'search_rank'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.offset_paginator = None
+        self.ordering = tuple(getattr(view, 'cursor_ordering', self.default_ordering))
+        if self.use_offset_pagination(request, view) or self.rank_annotation in queryset.query.annotations:
+            if not queryset.ordered:
+                queryset = queryset.order_by(*self.ordering)
+            self.offset_paginator = self.offset_pagination_class()
+            return self.offset_paginator.paginate_queryset(queryset, request, view)
+
+        return self.paginate_querysets([queryset], request, view)
+
+    def paginate_querysets(self, querysets, request, view=None):
+        """
+        Pages several querysets as one list ordered by the cursor key, e.g. live
+        and archived orders. Each is read with its own range scan of at most
+        page_size + 1 rows, and the page is cut from the merged rows. The
+        querysets must share the cursor field, and their primary keys must not
+        collide. Cursor paging only.
+        """
+        self.offset_paginator = None
+        self.ordering = tuple(getattr(view, 'cursor_ordering', self.default_ordering))
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+
+        ordering = [self._flip(f) if reverse else f for f in self.ordering]
+        results = []
+        for queryset in querysets:
+            queryset = queryset.order_by(*ordering)
+            if position is not None:
+                queryset = queryset.filter(self._beyond(position, reverse))
+            results.extend(queryset[:self.page_size + 1])
+        if len(querysets) > 1:
+            results.sort(key=self._position, reverse=ordering[0].startswith('-'))
+
+        results = results[:self.page_size + 1]
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        if reverse:
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.page = results
+        # With an empty page the cursor position itself is the only anchor we have
+        self.first_position = self._position(results[0]) if results else position
+        self.last_position = self._position(results[-1]) if results else position
+        return results
+
+    def use_offset_pagination(self, request, view):
+        return self.offset_pagination_class.page_query_param in request.query_params
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+            if page_size > 0:
+                return min(page_size, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return settings.REST_FRAMEWORK.get('PAGE_SIZE') or 20
+
+    def get_paginated_response(self, data):
+        if self.offset_paginator is not None:
+            return self.offset_paginator.get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.has_next or self.last_position is None:
+            return None
+        return self.encode_cursor(self.last_position, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.first_position is None:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.first_position, reverse=True)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'The pagination cursor value.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Number of results to return per page.',
+                'schema': {'type': 'integer'},
+            },
+        ]
+
+    # Cursor helpers
+    def encode_cursor(self, position, reverse):
+        value, pk = position
+        payload = {'v': value.isoformat() if hasattr(value, 'isoformat') else value, 'pk': pk}
+        if reverse:
+            payload['r'] = 1
+        token = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(parse.unquote(token).encode()))
+            value = payload['v']
+            if isinstance(value, str):
+                value = parse_datetime(value) or value
+            return (value, payload['pk']), bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _position(self, obj):
+        field = self.ordering[0].lstrip('-')
+        return getattr(obj, field), obj.pk
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    def _beyond(self, position, reverse):
+        # Rows strictly past `position` in the direction we are reading
+        field = self.ordering[0]
+        descending = field.startswith('-') != reverse
+        name = field.lstrip('-')
+        op = 'lt' if descending else 'gt'
+        value, pk = position
+        return Q(**{f'{name}__{op}': value}) | Q(**{name: value, f'pk__{op}': pk})
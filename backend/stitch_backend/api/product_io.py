@@ -0,0 +1,314 @@
+# stitch_backend/api/product_io.py
+"""
+Streaming product import/export shared by the import_products and
+export_products management commands.
+
+Files are CSV (with a header row) or JSON Lines, one product per row. Both
+directions work in fixed-size batches, so memory use does not grow with the
+size of the file or of the catalog.
+"""
+import csv
+import json
+import re
+import sys
+from contextlib import contextmanager
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, transaction
+
+from . import cache as catalog_cache
+from . import search
+from .models import Categories, Products, ProductVariant
+
+# File columns, in export order. `category` holds the category name and `sizes` the
+# product's variant sizes joined with ", ".
+COLUMNS = [
+    'sku', 'name', 'description', 'price', 'discount', 'stock_quantity',
+    'category', 'image_url', 'sizes', 'is_available',
+]
+REQUIRED_COLUMNS = {'sku', 'name', 'price'}
+
+SIZE_SEPARATORS = re.compile(r'[,;/|]+')
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'f'}
+
+
+class RowError(ValueError):
+    pass
+
+
+def detect_format(path, fmt=None):
+    if fmt:
+        return fmt
+    return 'jsonl' if str(path).endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+@contextmanager
+def open_stream(path, mode):
+    if path == '-':
+        yield sys.stdin if 'r' in mode else sys.stdout
+    else:
+        with open(path, mode, newline='', encoding='utf-8') as stream:
+            yield stream
+
+
+def iter_rows(stream, fmt):
+    """
+    Yields (line_number, row_dict) lazily from a CSV or JSONL stream. A JSONL
+    line that is not a JSON object is yielded as a RowError in place of the
+    row, so it is reported like any other bad row.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        missing = REQUIRED_COLUMNS - set(reader.fieldnames or [])
+        if missing:
+            raise RowError(f"Missing required column(s): {', '.join(sorted(missing))}")
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                yield line_number, RowError(f'not valid JSON: {exc}')
+                continue
+            yield line_number, row if isinstance(row, dict) else RowError('not a JSON object')
+
+
+def _decimal(value, column):
+    try:
+        return Decimal(str(value).strip())
+    except (InvalidOperation, ValueError):
+        raise RowError(f'{column}: {value!r} is not a number')
+
+
+def _int(value, column):
+    try:
+        return int(str(value).strip())
+    except ValueError:
+        raise RowError(f'{column}: {value!r} is not an integer')
+
+
+def _bool(value, column):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise RowError(f'{column}: {value!r} is not a boolean')
+
+
+def _sizes(value):
+    sizes = []
+    for size in SIZE_SEPARATORS.split(str(value or '')):
+        size = size.strip().upper()[:20]
+        if size and size not in sizes:
+            sizes.append(size)
+    return sizes
+
+
+class ProductImporter:
+    """
+    Upserts products by SKU in batches with bulk_create(update_conflicts=True).
+
+    Only the columns present in a row are written to an existing product, so a
+    file with just sku,name,price,stock_quantity leaves descriptions alone.
+    Categories are resolved by name from a map loaded once up front. Sizes
+    listed in a `sizes` cell that the product has no variant for yet are
+    added as new variants with no stock; existing variants are left alone.
+    """
+    def __init__(self, batch_size=1000, create_categories=False, index=True):
+        self.batch_size = batch_size
+        self.create_categories = create_categories
+        self.index = index
+        self.categories = {
+            name.lower(): category_id
+            for category_id, name in Categories.objects.values_list('category_id', 'name')
+        }
+        self.imported = 0
+        self.errors = []
+
+    def category_id(self, name):
+        if not name:
+            return None
+        key = name.strip().lower()
+        if key not in self.categories:
+            if not self.create_categories:
+                raise RowError(f'category: unknown category {name!r}')
+            category, _ = Categories.objects.get_or_create(name=name.strip())
+            self.categories[key] = category.pk
+        return self.categories[key]
+
+    def build(self, row):
+        """Turns a file row into (Products instance, columns it sets)."""
+        row = {key.strip(): value for key, value in row.items() if key and value not in (None, '')}
+        missing = REQUIRED_COLUMNS - set(row)
+        if missing:
+            raise RowError(f"missing {', '.join(sorted(missing))}")
+
+        values = {'sku': str(row['sku']).strip(), 'name': str(row['name']).strip()}
+        if not values['sku']:
+            raise RowError("missing sku")
+        values['price'] = _decimal(row['price'], 'price')
+        if 'discount' in row:
+            values['discount'] = _decimal(row['discount'], 'discount')
+        if 'stock_quantity' in row:
+            values['stock_quantity'] = _int(row['stock_quantity'], 'stock_quantity')
+        if 'is_available' in row:
+            values['is_available'] = _bool(row['is_available'], 'is_available')
+        for column in ('description', 'image_url'):
+            if column in row:
+                values[column] = str(row[column])
+        if 'category' in row:
+            values['category_id'] = self.category_id(str(row['category']))
+
+        product = Products(**{'discount': Decimal('0'), **values})
+        product._import_sizes = _sizes(row.get('sizes'))
+        return product, set(values) - {'sku'}
+
+    def run(self, rows):
+        """Consumes an iterable of (line_number, row) and yields progress after each batch."""
+        batch = {}
+        for line_number, row in rows:
+            try:
+                if isinstance(row, RowError):
+                    raise row
+                product, columns = self.build(row)
+            except RowError as exc:
+                self.errors.append((line_number, str(exc)))
+                continue
+            # A later row for the same SKU in the same batch wins
+            batch[product.sku] = (line_number, product, columns)
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                batch = {}
+                yield self.imported
+        if batch:
+            self.flush(batch)
+            yield self.imported
+        catalog_cache.bump_catalog_version()
+
+    def flush(self, batch):
+        self.drop_name_clashes(batch)
+        entries = list(batch.values())
+        if not entries:
+            return
+        try:
+            with transaction.atomic():
+                self.upsert([product for _, product, _ in entries], self.update_fields(entries))
+            self.imported += len(entries)
+        except IntegrityError:
+            # Something in the batch still clashes (e.g. a name taken since the check); find it row by row
+            for line_number, product, columns in entries:
+                try:
+                    with transaction.atomic():
+                        self.upsert([product], self.update_fields([(line_number, product, columns)]))
+                    self.imported += 1
+                except IntegrityError as exc:
+                    self.errors.append((line_number, str(exc)))
+        saved = list(Products.objects.filter(sku__in=list(batch)).select_related('category'))
+        self.add_variants(saved, batch)
+        if self.index:
+            search.index_products(saved)
+
+    def drop_name_clashes(self, batch):
+        """
+        Reports and removes the rows whose name belongs to a product with
+        another SKU. On MySQL the upsert is ON DUPLICATE KEY UPDATE, which
+        fires on any unique key: such a row would silently overwrite the
+        product that owns the name instead of failing.
+        """
+        owners = {
+            name.lower(): sku
+            for name, sku in Products.objects.filter(
+                name__in=[product.name for _, product, _ in batch.values()]
+            ).values_list('name', 'sku')
+        }
+        for sku, (line_number, product, _) in list(batch.items()):
+            # Two new SKUs with one name in the same batch clash too; the first keeps it
+            owner = owners.setdefault(product.name.lower(), sku)
+            if owner != sku:
+                del batch[sku]
+                owner = f'SKU {owner!r}' if owner else 'a product without a SKU'
+                self.errors.append((line_number, f'name: {product.name!r} already belongs to {owner}'))
+
+    @staticmethod
+    def add_variants(products, batch):
+        variants = [
+            ProductVariant(product=product, size=size)
+            for product in products
+            for size in batch[product.sku][1]._import_sizes
+        ]
+        # (product, size) is unique, so sizes that already exist are skipped by the database
+        ProductVariant.objects.bulk_create(variants, batch_size=1000, ignore_conflicts=True)
+
+    @staticmethod
+    def update_fields(entries):
+        columns = set()
+        for _, _, row_columns in entries:
+            columns |= row_columns
+        return sorted(columns) + ['updated_at']
+
+    @staticmethod
+    def upsert(products, update_fields):
+        # bulk_create does not send post_save, so the search index and catalog cache are handled by run()/flush()
+        Products.objects.bulk_create(
+            products,
+            update_conflicts=True,
+            unique_fields=['sku'],
+            update_fields=[field.replace('category_id', 'category') for field in update_fields],
+        )
+
+
+def export_rows(batch_size=2000):
+    """Yields one dict per product in COLUMNS order, reading the table in primary-key batches."""
+    last_pk = 0
+    queryset = Products.objects.order_by('pk').values(
+        'pk', 'sku', 'name', 'description', 'price', 'discount', 'stock_quantity',
+        'category__name', 'image_url', 'is_available',
+    )
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return
+        sizes = {}
+        variants = (
+            ProductVariant.objects.filter(product_id__in=[values['pk'] for values in batch])
+            .order_by('product_id', 'variant_id').values_list('product_id', 'size')
+        )
+        for product_id, size in variants:
+            sizes.setdefault(product_id, []).append(size)
+        for values in batch:
+            yield {
+                'sku': values['sku'],
+                'name': values['name'],
+                'description': values['description'],
+                'price': str(values['price']),
+                'discount': str(values['discount']),
+                'stock_quantity': values['stock_quantity'],
+                'category': values['category__name'],
+                'image_url': values['image_url'],
+                'sizes': ', '.join(sizes.get(values['pk'], [])),
+                'is_available': values['is_available'],
+            }
+        last_pk = batch[-1]['pk']
+
+
+def write_rows(stream, rows, fmt):
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=COLUMNS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            yield
+    else:
+        for row in rows:
+            stream.write(json.dumps(row, ensure_ascii=False))
+            stream.write('\n')
+            yield
@@ -0,0 +1,236 @@
+# stitch_backend/api/querylog.py
+"""
+Query capture and index advice, for development and staging.
+
+With QUERY_CAPTURE['ENABLED'] set, QueryCaptureMiddleware (api/middleware.py)
+times every SQL statement a request runs. It appends one JSON line per
+request to QUERY_CAPTURE['PATH']:
+
+    {"endpoint": "GET api/orders/", "status": 200, "ms": 12.5, "db_ms": 3.1,
+     "queries": [{"sql": <normalised>, "count": 2, "ms": 3.1, "max_ms": 2.0,
+                  "example": <slowest raw statement>, "params": [...]}]}
+
+Statements are normalised, so the same query from different requests groups
+together: parameters and literals become ?, and IN lists collapse to
+IN (...).
+
+`manage.py advise_indexes` reads the log and ranks statements by total time.
+It runs EXPLAIN on the slowest ones and reports full table scans and sorts
+that no index serves. For each it suggests a composite index: equality
+columns first, then the ORDER BY columns, then one range column. The
+suggestion is read off the SQL text, so check it against the plan before
+adding it.
+"""
+import json
+import re
+import threading
+import time
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+DEFAULTS = {
+    'ENABLED': False,
+    'PATH': 'query_capture.jsonl',  # one JSON line per request
+    'MIN_MS': 0,                    # skip requests whose queries took less in total (milliseconds)
+}
+
+_string_re = re.compile(r"'(?:[^']|'')*'")
+_number_re = re.compile(r'(?<![\w"`.])-?\d+(?:\.\d+)?\b')
+_placeholder_re = re.compile(r'%s')
+_in_list_re = re.compile(r'\bIN \((?:\?, )*\?\)')
+_space_re = re.compile(r'\s+')
+
+_write_lock = threading.Lock()
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'QUERY_CAPTURE', {})}
+
+
+def normalize(sql):
+    """The statement with parameters and literals replaced by ?, IN lists collapsed and whitespace squeezed."""
+    sql = _string_re.sub('?', sql)
+    sql = _placeholder_re.sub('?', sql)
+    sql = _number_re.sub('?', sql)
+    sql = _in_list_re.sub('IN (...)', sql)
+    return _space_re.sub(' ', sql).strip()
+
+
+class QueryRecorder:
+    """A connection.execute_wrapper() that times statements and groups them by normalised SQL."""
+
+    def __init__(self):
+        self.statements = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            ms = (time.perf_counter() - started) * 1000
+            key = normalize(sql)
+            entry = self.statements.get(key)
+            if entry is None:
+                entry = self.statements[key] = {'sql': key, 'count': 0, 'ms': 0.0, 'max_ms': -1.0}
+            entry['count'] += 1
+            entry['ms'] += ms
+            if ms > entry['max_ms']:
+                # Keep the slowest instance to EXPLAIN; executemany() params are a batch, so not reusable
+                entry.update(max_ms=ms, example=sql, params=None if many else params)
+
+    @property
+    def total_ms(self):
+        return sum(entry['ms'] for entry in self.statements.values())
+
+
+def record(endpoint, status_code, ms, recorder, path=None):
+    """Appends one request's statements to the capture log."""
+    line = json.dumps({
+        'endpoint': endpoint,
+        'status': status_code,
+        'ms': round(ms, 3),
+        'db_ms': round(recorder.total_ms, 3),
+        'queries': list(recorder.statements.values()),
+    }, cls=DjangoJSONEncoder, default=str)
+    with _write_lock, open(path or get_config()['PATH'], 'a', encoding='utf-8') as log:
+        log.write(line + '\n')
+
+
+def load(path):
+    """
+    Aggregates a capture log. Returns (endpoints, statements). endpoints maps an
+    endpoint to its request count and total time. statements maps
+    (endpoint, normalised sql) to count, total ms, max ms and the slowest
+    example with its params.
+    """
+    endpoints = defaultdict(lambda: {'requests': 0, 'ms': 0.0, 'db_ms': 0.0, 'queries': 0})
+    statements = {}
+    with open(path, encoding='utf-8') as log:
+        for line in log:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            endpoint = endpoints[entry['endpoint']]
+            endpoint['requests'] += 1
+            endpoint['ms'] += entry['ms']
+            endpoint['db_ms'] += entry['db_ms']
+            for query in entry['queries']:
+                endpoint['queries'] += query['count']
+                key = (entry['endpoint'], query['sql'])
+                seen = statements.get(key)
+                if seen is None:
+                    statements[key] = dict(query)
+                    continue
+                seen['count'] += query['count']
+                seen['ms'] += query['ms']
+                if query['max_ms'] > seen['max_ms']:
+                    seen.update(max_ms=query['max_ms'], example=query['example'], params=query['params'])
+    return dict(endpoints), statements
+
+
+def explain(connection, sql, params):
+    """
+    EXPLAINs a statement without running it. Returns (plan, scans, sorts):
+    the plan as text lines, the tables read by a full scan, and the tables
+    sorted without an index.
+    """
+    vendor = connection.vendor
+    prefix = {'sqlite': 'EXPLAIN QUERY PLAN ', 'mysql': 'EXPLAIN '}.get(vendor, 'EXPLAIN ')
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql, params)
+        columns = [column[0] for column in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    plan, scans, sorts = [], set(), set()
+    if vendor == 'mysql':
+        for row in rows:
+            extra = row.get('Extra') or ''
+            plan.append(f"{row.get('table')}: type={row.get('type')} key={row.get('key')} rows={row.get('rows')} {extra}".strip())
+            if row.get('type') == 'ALL':
+                scans.add(row.get('table'))
+            if 'filesort' in extra:
+                sorts.add(row.get('table'))
+    elif vendor == 'sqlite':
+        for row in rows:
+            detail = row['detail']
+            plan.append(detail)
+            match = re.match(r'SCAN (?:TABLE )?(\w+)', detail)
+            if match and 'INDEX' not in detail:
+                scans.add(match.group(1))
+            if 'TEMP B-TREE FOR ORDER BY' in detail:
+                sorts.add(None)
+    else:
+        for row in rows:
+            line = next(iter(row.values()))
+            plan.append(line)
+            match = re.search(r'Seq Scan on (\w+)', line)
+            if match:
+                scans.add(match.group(1))
+            if re.search(r'\bSort\b', line):
+                sorts.add(None)
+    return plan, scans, sorts
+
+
+def _columns(sql, table, pattern):
+    return [match.group(1) for match in re.finditer(rf'"{re.escape(table)}"\."(\w+)"{pattern}', sql)]
+
+
+def suggest_index(sql, table):
+    """
+    A composite index for `table` read off the statement: equality columns,
+    then ORDER BY columns, then one range column. Returns a list of column
+    names, or None if the statement does not filter or sort on the table.
+    """
+    sql = sql.replace('`', '"')
+    body, _, order_by = sql.rpartition(' ORDER BY ') if ' ORDER BY ' in sql else (sql, '', '')
+    where = body.partition(' WHERE ')[2]
+    order_by = re.split(r'\b(?:LIMIT|OFFSET|FOR UPDATE)\b', order_by)[0]
+
+    # A bare boolean column ("WHERE t.flag AND ...") is an equality test too
+    equality = _columns(where, table, r'(?:\s*(?:=|IN\s*\(|IS NULL)|(?=\s*(?:AND\b|OR\b|\)|$)))')
+    ranges = _columns(where, table, r'\s*(?:<|>|BETWEEN|LIKE)')
+    # Only a sort entirely on this table can be served by its index
+    sorted_on = re.findall(r'"(\w+)"\."(\w+)"', order_by)
+    sort = [column for name, column in sorted_on] if all(name == table for name, _ in sorted_on) else []
+
+    columns = []
+    for column in equality + sort + ranges[:1]:
+        if column not in columns:
+            columns.append(column)
+    return columns or None
+
+
+def existing_indexes(connection, table):
+    """Column lists of the table's indexes, unique constraints and primary key."""
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+    return [
+        constraint['columns'] for constraint in constraints.values()
+        if constraint['columns'] and (constraint['index'] or constraint['unique'] or constraint['primary_key'])
+    ]
+
+
+def is_covered(columns, indexes):
+    return any(index[:len(columns)] == columns for index in indexes)
+
+
+def main_table(sql):
+    """The table in the statement's first FROM clause."""
+    match = re.search(r'\bFROM ["`](\w+)["`]', sql)
+    return match.group(1) if match else None
+
+
+def model_for_table(table):
+    for model in apps.get_models():
+        if model._meta.db_table == table:
+            return model
+    return None
+
+
+def field_names(model, columns):
+    """Model field names for db columns, e.g. user_id -> user, for a models.Index(fields=[...]) hint."""
+    by_column = {field.column: field.name for field in model._meta.concrete_fields}
+    return [by_column.get(column, column) for column in columns]
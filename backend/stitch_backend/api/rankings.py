@@ -0,0 +1,161 @@
+# stitch_backend/api/rankings.py
+"""
+Best-seller rankings served from the small product_rankings table.
+
+Sales are recorded incrementally as orders are placed: the product's
+purchase_quantity, its row in product_sales_daily and its score in every
+ranking window are bumped with upserts. Incremental updates only ever add, so
+sales that age out of a window are dropped by rebuild_rankings(), which the
+rebuild_rankings management command runs (schedule it at least daily).
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from . import cache as catalog_cache
+from .db import upsert
+from .models import ArchivedOrderItem, OrderItems, Products, ProductRanking, ProductSalesDaily
+
+DEFAULT_WINDOWS = {'1d': 1, '7d': 7, '30d': 30, 'all': None}
+
+
+def get_windows():
+    """Maps window name to its length in days (None means all time)."""
+    return getattr(settings, 'PRODUCT_RANKING_WINDOWS', DEFAULT_WINDOWS)
+
+
+def record_sales(lines, update_purchase_quantity=True):
+    """
+    Records sold quantities. lines is an iterable of (product_id, quantity).
+    Runs a constant number of queries however many lines there are.
+    """
+    quantities = Counter()
+    for product_id, quantity in lines:
+        quantities[product_id] += quantity
+    if not quantities:
+        return
+
+    product_ids = list(quantities)
+    if update_purchase_quantity:
+        # No catalog version bump: cached responses read purchase_quantity live (cache.LIVE_FIELDS)
+        Products.objects.filter(pk__in=product_ids).update(
+            purchase_quantity=F('purchase_quantity') + Case(
+                *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+        )
+
+    categories = dict(Products.objects.filter(pk__in=product_ids).values_list('pk', 'category_id'))
+    now = timezone.now()
+    today = timezone.localdate(now)
+
+    upsert(
+        ProductSalesDaily,
+        [{'product_id': product_id, 'day': today, 'quantity': quantity} for product_id, quantity in quantities.items()],
+        unique_fields=['product', 'day'],
+        update_fields=['quantity'],
+        increment_fields=['quantity'],
+    )
+    upsert(
+        ProductRanking,
+        [
+            {
+                'window': window,
+                'product_id': product_id,
+                'category_id': categories.get(product_id),
+                'score': quantity,
+                'updated_at': now,
+            }
+            for window in get_windows()
+            for product_id, quantity in quantities.items()
+        ],
+        unique_fields=['window', 'product'],
+        update_fields=['score', 'category', 'updated_at'],
+        increment_fields=['score'],
+    )
+
+
+def rebuild_rankings(stdout=None):
+    """Recomputes every window from product_sales_daily / purchase_quantity and prunes old daily rows."""
+    now = timezone.now()
+    today = timezone.localdate(now)
+    windows = get_windows()
+
+    for window, days in windows.items():
+        if days is None:
+            scores = (
+                Products.objects.filter(purchase_quantity__gt=0)
+                .values_list('pk', 'category_id', 'purchase_quantity')
+            )
+        else:
+            scores = (
+                ProductSalesDaily.objects.filter(day__gt=today - timedelta(days=days))
+                .values('product_id')
+                .annotate(score=Sum('quantity'))
+                .values_list('product_id', 'product__category_id', 'score')
+            )
+        rows = [
+            ProductRanking(window=window, product_id=product_id, category_id=category_id, score=score, updated_at=now)
+            for product_id, category_id, score in scores
+        ]
+        with transaction.atomic():
+            ProductRanking.objects.filter(window=window).delete()
+            ProductRanking.objects.bulk_create(rows, batch_size=1000)
+        if stdout is not None:
+            stdout.write(f'Window {window}: {len(rows)} ranked products')
+
+    longest = max((days for days in windows.values() if days is not None), default=0)
+    pruned, _ = ProductSalesDaily.objects.filter(day__lte=today - timedelta(days=longest)).delete()
+    return pruned
+
+
+def backfill_from_order_items():
+    """
+    One-off recount of purchase_quantity and the daily sales rows from the whole
+    order_items history, archived items included, for databases that had orders
+    before rankings existed. Follow it with rebuild_rankings().
+    """
+    def totals(model):
+        return Coalesce(Subquery(
+            model.objects.filter(product=OuterRef('pk')).values('product').annotate(total=Sum('quantity')).values('total')
+        ), 0)
+
+    with transaction.atomic():
+        Products.objects.update(purchase_quantity=totals(OrderItems) + totals(ArchivedOrderItem))
+        ProductSalesDaily.objects.all().delete()
+        daily = Counter()
+        for model in (OrderItems, ArchivedOrderItem):
+            rows = (
+                model.objects.annotate(day=TruncDate('created_at'))
+                .values('product_id', 'day')
+                .annotate(quantity=Sum('quantity'))
+                .order_by()
+            )
+            for row in rows.iterator():
+                daily[row['product_id'], row['day']] += row['quantity']
+        ProductSalesDaily.objects.bulk_create(
+            (ProductSalesDaily(product_id=product_id, day=day, quantity=quantity) for (product_id, day), quantity in daily.items()),
+            batch_size=1000,
+        )
+        transaction.on_commit(catalog_cache.bump_catalog_version)
+
+
+def top_products(window, category_id=None, limit=10):
+    """
+    Top-N rankings for a window, read best first straight off the
+    (window, [category,] score) index. The products come with their category
+    and variants loaded, as ProductsSerializer reads both.
+    """
+    rankings = ProductRanking.objects.filter(window=window, score__gt=0)
+    if category_id is not None:
+        rankings = rankings.filter(category_id=category_id)
+    return (
+        rankings.select_related('product__category').prefetch_related('product__variants')
+        .order_by('-score', 'product_id')[:limit]
+    )
@@ -0,0 +1,269 @@
+# stitch_backend/api/reconciliation.py
+"""
+Reconciles payments against GCash settlement reports, for the
+reconcile_payments management command.
+
+The settlement file is a CSV with a header row and one transaction per
+line. Columns are matched by name under the aliases in COLUMN_ALIASES,
+ignoring case and treating spaces as underscores; other columns are
+ignored. transaction_id, amount and status are required.
+
+The file is read as a stream in batches of batch_size rows. Each batch
+looks its transaction ids up with one `transaction_id IN (...)` query on
+payments_transaction_idx, locking the payments it finds. The rows that
+settle a payment are applied with one bulk_update, in the same transaction
+as their outbox jobs. Every row that does not match cleanly goes to the
+discrepancy report as it is found. Memory therefore stays bounded whatever
+the size of the file. For the same reason, a transaction id repeated in the
+file is only caught when both rows fall in the same batch.
+
+Status changes follow PAYMENT_TRANSITIONS. A settlement never moves a
+payment backwards (e.g. Completed to Failed); such rows are reported as
+conflicts instead. A row whose amount differs from the payment's is
+reported and not applied.
+"""
+import csv
+from datetime import datetime, time
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from . import outbox
+from .models import PAYMENT_TRANSITIONS, ArchivedPayment, Payments, PaymentStatus
+
+# Accepted header names for each column, lower-cased with spaces as underscores
+COLUMN_ALIASES = {
+    'transaction_id': ('transaction_id', 'reference', 'reference_no', 'reference_number', 'txn_id'),
+    'amount': ('amount', 'gross_amount', 'transaction_amount'),
+    'status': ('status', 'transaction_status', 'settlement_status'),
+    'settled_at': ('settled_at', 'settlement_date', 'transaction_date', 'paid_at', 'date'),
+}
+REQUIRED_COLUMNS = {'transaction_id', 'amount', 'status'}
+
+# Provider status -> payment status; statuses not listed (e.g. PENDING) are skipped
+SETTLEMENT_STATUSES = {
+    'success': PaymentStatus.COMPLETED,
+    'successful': PaymentStatus.COMPLETED,
+    'settled': PaymentStatus.COMPLETED,
+    'completed': PaymentStatus.COMPLETED,
+    'paid': PaymentStatus.COMPLETED,
+    'failed': PaymentStatus.FAILED,
+    'declined': PaymentStatus.FAILED,
+    'expired': PaymentStatus.FAILED,
+    'refunded': PaymentStatus.REFUNDED,
+    'reversed': PaymentStatus.REFUNDED,
+}
+
+REPORT_COLUMNS = [
+    'line', 'transaction_id', 'issue', 'detail', 'payment_id', 'order_id',
+    'file_amount', 'payment_amount', 'file_status', 'payment_status',
+]
+
+
+class RowError(ValueError):
+    pass
+
+
+def iter_rows(stream):
+    """Yields (line_number, row) lazily, with row keys mapped to the canonical column names."""
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if header is None:
+        raise RowError('The file is empty.')
+    positions = {}
+    for position, name in enumerate(header):
+        name = '_'.join(name.lower().split())
+        for column, aliases in COLUMN_ALIASES.items():
+            if name in aliases and column not in positions:
+                positions[column] = position
+    missing = REQUIRED_COLUMNS - set(positions)
+    if missing:
+        raise RowError(f"Missing required column(s): {', '.join(sorted(missing))}")
+    for values in reader:
+        if not any(values):
+            continue
+        yield reader.line_num, {
+            column: values[position].strip() if position < len(values) else ''
+            for column, position in positions.items()
+        }
+
+
+def _amount(value):
+    try:
+        return Decimal(value.replace(',', ''))
+    except (InvalidOperation, ValueError):
+        raise RowError(f'amount: {value!r} is not a number')
+
+
+def _settled_at(value):
+    if not value:
+        return None
+    value = value.replace('/', '-')
+    try:
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            moment = datetime.combine(day, time.min) if day is not None else None
+    except ValueError:
+        moment = None
+    if moment is None:
+        raise RowError(f'settled_at: {value!r} is not a date')
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+class PaymentReconciler:
+    """
+    Matches settlement rows to payments batch by batch and applies them.
+    `report` is called with a dict of REPORT_COLUMNS for every discrepancy.
+    """
+    def __init__(self, report, batch_size=2000, dry_run=False):
+        self.report = report
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.counts = dict.fromkeys(['rows', 'matched', 'updated', 'unchanged', 'skipped', 'discrepancies'], 0)
+
+    def run(self, rows):
+        """Consumes an iterable of (line_number, row) and yields the rows read after each batch."""
+        batch = []
+        for line_number, row in rows:
+            self.counts['rows'] += 1
+            batch.append((line_number, row))
+            if len(batch) >= self.batch_size:
+                self.reconcile(batch)
+                batch = []
+                yield self.counts['rows']
+        if batch:
+            self.reconcile(batch)
+            yield self.counts['rows']
+
+    def discrepancy(self, line_number, transaction_id, issue, detail, payment=None, amount=None, status=None):
+        self.counts['discrepancies'] += 1
+        self.report({
+            'line': line_number,
+            'transaction_id': transaction_id,
+            'issue': issue,
+            'detail': detail,
+            'payment_id': payment.pk if payment else None,
+            'order_id': payment.order_id if payment else None,
+            'file_amount': amount,
+            'payment_amount': payment.amount if payment else None,
+            'file_status': status,
+            'payment_status': payment.payment_status if payment else None,
+        })
+
+    def parse(self, batch):
+        """Validated (line, transaction_id, amount, status, settled_at) rows; the first row wins per id."""
+        parsed = {}
+        for line_number, row in batch:
+            transaction_id = row['transaction_id']
+            try:
+                if not transaction_id:
+                    raise RowError('transaction_id is empty')
+                amount = _amount(row['amount'])
+                settled_at = _settled_at(row.get('settled_at'))
+            except RowError as exc:
+                self.discrepancy(line_number, transaction_id, 'invalid_row', str(exc))
+                continue
+            status = SETTLEMENT_STATUSES.get(row['status'].lower())
+            if status is None:
+                self.counts['skipped'] += 1
+                continue
+            if transaction_id in parsed:
+                self.discrepancy(
+                    line_number, transaction_id, 'duplicate', f'Also on line {parsed[transaction_id][0]}; ignored.',
+                    amount=amount, status=status,
+                )
+                continue
+            parsed[transaction_id] = (line_number, transaction_id, amount, status, settled_at)
+        return parsed
+
+    def reconcile(self, batch):
+        parsed = self.parse(batch)
+        if not parsed:
+            return
+        # The payments stay locked until their update commits, so a concurrent change (e.g. a
+        # refund applied by process_webhooks) cannot be overwritten with a stale status
+        with transaction.atomic():
+            payments = {
+                payment.transaction_id: payment
+                for payment in self.lookup(list(parsed)).only(
+                    'payment_id', 'order_id', 'transaction_id', 'amount', 'payment_status', 'paid_at',
+                )
+            }
+            unmatched = [transaction_id for transaction_id in parsed if transaction_id not in payments]
+            archived = set()
+            if unmatched:
+                archived = set(
+                    ArchivedPayment.objects.filter(transaction_id__in=unmatched).values_list('transaction_id', flat=True)
+                )
+
+            now = timezone.now()
+            changed = []
+            for transaction_id, (line_number, _, amount, status, settled_at) in parsed.items():
+                payment = payments.get(transaction_id)
+                if payment is None:
+                    if transaction_id in archived:
+                        self.counts['unchanged'] += 1 # Closed and archived; the archive is read-only
+                    else:
+                        self.discrepancy(line_number, transaction_id, 'not_found', 'No payment has this transaction id.',
+                                         amount=amount, status=status)
+                    continue
+                self.counts['matched'] += 1
+                if amount != payment.amount:
+                    self.discrepancy(line_number, transaction_id, 'amount_mismatch',
+                                     f'Settled {amount}, payment is for {payment.amount}; not applied.',
+                                     payment, amount, status)
+                    continue
+                if payment.payment_status == status:
+                    if status == PaymentStatus.COMPLETED and payment.paid_at is None:
+                        payment.paid_at = settled_at or now
+                        payment._previous_payment_status = None
+                        changed.append(payment)
+                    else:
+                        self.counts['unchanged'] += 1
+                    continue
+                if status not in PAYMENT_TRANSITIONS[payment.payment_status]:
+                    self.discrepancy(line_number, transaction_id, 'status_conflict',
+                                     f'Settled as {status}, payment is {payment.payment_status}; not applied.',
+                                     payment, amount, status)
+                    continue
+                payment._previous_payment_status = payment.payment_status
+                payment.payment_status = status
+                if status == PaymentStatus.COMPLETED:
+                    payment.paid_at = settled_at or payment.paid_at or now
+                changed.append(payment)
+
+            if changed and not self.dry_run:
+                self.apply(changed, now)
+            self.counts['updated'] += len(changed)
+
+    def lookup(self, transaction_ids):
+        payments = Payments.objects.filter(transaction_id__in=transaction_ids)
+        # A dry run writes nothing, so it need not block other writers
+        return payments if self.dry_run else payments.select_for_update().order_by('pk')
+
+    @staticmethod
+    def apply(payments, now):
+        """Writes the settled payments; call it in the transaction that locked them."""
+        for payment in payments:
+            payment.updated_at = now
+        Payments.objects.bulk_update(payments, ['payment_status', 'paid_at', 'updated_at'])
+        # bulk_update sends no post_save, so queue what the payment signal would have
+        outbox.enqueue_many([
+            ('payment.status_changed', {
+                'payment_id': payment.pk,
+                'order_id': payment.order_id,
+                'payment_status': payment.payment_status,
+                'previous_status': payment._previous_payment_status,
+            })
+            for payment in payments if payment._previous_payment_status is not None
+        ])
+
+
+def open_report(stream):
+    """A report callback writing discrepancy rows as CSV to `stream`."""
+    writer = csv.DictWriter(stream, fieldnames=REPORT_COLUMNS)
+    writer.writeheader()
+    return writer.writerow
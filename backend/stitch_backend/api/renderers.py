@@ -0,0 +1,56 @@
+# stitch_backend/api/renderers.py
+"""
+JSON renderer and parser backed by orjson.
+
+orjson serializes datetimes, dates, UUIDs and dataclasses natively in C. Any
+other value DRF knows how to encode (Decimal, lazy translation strings,
+querysets, ...) goes through DRF's own encoder as the `default` hook, so
+the output matches JSONRenderer's. Without orjson installed both classes
+behave exactly like DRF's stdlib-json versions.
+"""
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+_fallback_encoder = JSONEncoder()
+
+
+def _default(value):
+    return _fallback_encoder.default(value)
+
+
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        options = orjson.OPT_NON_STR_KEYS
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            options |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=_default, option=options)
+
+
+class ORJSONParser(JSONParser):
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            body = stream.read()
+            if encoding.lower().replace('-', '') != 'utf8':
+                body = body.decode(encoding).encode('utf-8')
+            return orjson.loads(body)
+        except (ValueError, UnicodeError) as exc:
+            raise ParseError(f'JSON parse error - {exc}')
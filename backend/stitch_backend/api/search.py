@@ -0,0 +1,169 @@
+# stitch_backend/api/search.py
+"""
+Relevance-ranked product search over an inverted index (ProductSearchTerm).
+
+Each product is broken into lower-cased terms from its name, SKU, category name
+and description, weighted by where they came from. A query is answered by one
+grouped query over the index: exact term hits score highest, prefix hits
+(search-as-you-type) next, and one-edit typo variants last.
+"""
+import re
+import string
+import unicodedata
+
+from django.db import connections, router, transaction
+from django.db.models import Case, F, IntegerField, Q, Sum, When
+
+from .models import Products, ProductSearchTerm
+
+FIELD_WEIGHTS = {
+    'name': 8,
+    'sku': 8,
+    'category': 4,
+    'description': 1,
+}
+
+# Score multipliers per kind of match
+EXACT, PREFIX, FUZZY = 4, 2, 1
+
+MIN_PREFIX_LENGTH = 2
+MIN_FUZZY_LENGTH = 4
+MAX_FUZZY_LENGTH = 12   # a 12-character term has ~900 one-edit variants; a 64-character one ~4,700
+MAX_FUZZY_TERMS = 2000  # variants per query, across all its tokens
+MAX_QUERY_TOKENS = 8    # tokens after the first 8 are ignored, so a long query cannot build a huge statement
+MAX_TERM_LENGTH = 64
+MAX_WEIGHT = 32767
+
+STOP_WORDS = {'a', 'an', 'and', 'for', 'in', 'of', 'on', 'or', 'per', 'the', 'to', 'with'}
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+ALPHABET = string.ascii_lowercase + string.digits
+
+
+def tokenize(text):
+    if not text:
+        return []
+    text = unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode().lower()
+    return [
+        token[:MAX_TERM_LENGTH] for token in TOKEN_RE.findall(text)
+        if len(token) > 1 and token not in STOP_WORDS
+    ]
+
+
+def product_terms(product):
+    """Returns {term: weight} for a product. Reads product.category, so select_related it."""
+    sources = {
+        'name': product.name,
+        'sku': product.sku,
+        'category': product.category.name if product.category_id else None,
+        'description': product.description,
+    }
+    terms = {}
+    for field, text in sources.items():
+        for term in tokenize(text):
+            terms[term] = min(terms.get(term, 0) + FIELD_WEIGHTS[field], MAX_WEIGHT)
+    if product.sku:
+        # Also index the SKU as typed, e.g. "SST-001" is findable as "sst001"
+        sku = ''.join(tokenize(product.sku))
+        if sku:
+            terms[sku] = min(terms.get(sku, 0) + FIELD_WEIGHTS['sku'], MAX_WEIGHT)
+    return terms
+
+
+def index_products(products):
+    """(Re)builds the index rows for the given products in one delete and one batched insert."""
+    products = list(products)
+    if not products:
+        return 0
+    rows = [
+        (term, product.pk, weight)
+        for product in products
+        for term, weight in product_terms(product).items()
+    ]
+    connection = connections[router.db_for_write(ProductSearchTerm)]
+    quote = connection.ops.quote_name
+    # Plain executemany: bulk_create's per-row model instances cost more than the insert itself at
+    # import/reindex volumes, and MySQLdb rewrites executemany into multi-row INSERTs anyway
+    sql = (
+        f"INSERT INTO {quote(ProductSearchTerm._meta.db_table)} "
+        f"({quote('term')}, {quote('product_id')}, {quote('weight')}) VALUES (%s, %s, %s)"
+    )
+    with transaction.atomic(using=connection.alias):
+        ProductSearchTerm.objects.filter(product_id__in=[p.pk for p in products]).delete()
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), 1000):
+                cursor.executemany(sql, rows[start:start + 1000])
+    return len(rows)
+
+
+def edits1(term):
+    """All strings one delete, transpose, replace or insert away from term."""
+    splits = [(term[:i], term[i:]) for i in range(len(term) + 1)]
+    deletes = [left + right[1:] for left, right in splits if right]
+    transposes = [left + right[1] + right[0] + right[2:] for left, right in splits if len(right) > 1]
+    replaces = [left + c + right[1:] for left, right in splits if right for c in ALPHABET]
+    inserts = [left + c + right for left, right in splits for c in ALPHABET]
+    return set(deletes + transposes + replaces + inserts) - {term}
+
+
+def rank_products(query, limit=500):
+    """
+    Returns [(product_id, score), ...] best first for a free-text query.
+    The whole ranking is a single GROUP BY over the term index. Only the
+    first MAX_QUERY_TOKENS distinct tokens count, and typo variants stop at
+    MAX_FUZZY_TERMS, so the statement stays small whatever the query.
+    """
+    tokens = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TOKENS]
+    if not tokens:
+        return []
+
+    exact = set(tokens)
+    prefixes = [t for t in tokens if len(t) >= MIN_PREFIX_LENGTH]
+    fuzzy = set()
+    for token in tokens:
+        # SKUs and sizes are codes, where a one-character difference is a different product
+        if MIN_FUZZY_LENGTH <= len(token) <= MAX_FUZZY_LENGTH and not any(c.isdigit() for c in token):
+            variants = edits1(token) - exact
+            if len(fuzzy) + len(variants) > MAX_FUZZY_TERMS:
+                continue
+            fuzzy |= variants
+
+    prefix_q = Q()
+    for prefix in prefixes:
+        # istartswith compiles to a plain LIKE 'abc%' on MySQL, which is an index range scan
+        prefix_q |= Q(term__istartswith=prefix)
+
+    match = Q(term__in=exact)
+    whens = [When(term__in=exact, then=F('weight') * EXACT)]
+    if prefixes:
+        match |= prefix_q
+        whens.append(When(prefix_q, then=F('weight') * PREFIX))
+    if fuzzy:
+        match |= Q(term__in=fuzzy)
+
+    ranked = (
+        ProductSearchTerm.objects.filter(match)
+        .values('product_id')
+        # A matched term that is neither exact nor a prefix hit is a typo variant, so the
+        # (large) fuzzy set appears once in the statement, in the WHERE clause only
+        .annotate(score=Sum(Case(*whens, default=F('weight') * FUZZY, output_field=IntegerField())))
+        .order_by('-score', 'product_id')[:limit]
+    )
+    return [(row['product_id'], row['score']) for row in ranked]
+
+
+def reindex_all(batch_size=1000, stdout=None):
+    """Rebuilds the whole index in primary-key batches. Returns (products, terms)."""
+    products = terms = 0
+    last_pk = 0
+    queryset = Products.objects.select_related('category').order_by('pk')
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            break
+        terms += index_products(batch)
+        products += len(batch)
+        last_pk = batch[-1].pk
+        if stdout is not None:
+            stdout.write(f'Indexed {products} products ({terms} terms)')
+    return products, terms
@@ -1,14 +1,172 @@
 # stitch_backend/products/serializers.py
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from django.utils import timezone
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from .models import (
-    AppUser, Categories, Address, ShoppingCarts, Products,
-    Orders, Payments, CartItems, OrderItems,
-    UserRole, AddressType, PaymentMethod, PaymentStatus, OrderStatus
+    AppUser, Categories, Address, ShoppingCarts, Products, ProductVariant,
+    Orders, Payments, CartItems, OrderItems, InventoryReservation,
+    ArchivedOrder, ArchivedOrderItem, ArchivedPayment,
+    UserRole, AddressType, PaymentMethod, PaymentStatus, OrderStatus, ORDER_TRANSITIONS
 )
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
-class AppUserSerializer(serializers.ModelSerializer):
+from . import category_tree
+
+
+class DynamicFieldsMixin:
+    """
+    Sparse fieldsets for read requests: ?fields=a,b keeps only those fields and
+    ?omit=a,b drops them. When serializing a list, a serializer with
+    Meta.list_fields renders just those unless ?fields= or ?full=1 is given.
+
+    Related data can be embedded on request: ?embed=x,y adds the fields
+    Meta.embeddable maps x and y to, e.g. {'items': 'items'}. Fields named in
+    Meta.embed_only are rendered only when embedded (or asked for by
+    ?fields=), on every request method.
+
+    Only the top-level serializer is trimmed; nested serializers render whole.
+    Unknown field names are ignored.
+    """
+    fields_query_param = 'fields'
+    omit_query_param = 'omit'
+    full_query_param = 'full'
+    embed_query_param = 'embed'
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        kwargs['context'] = {**kwargs.get('context', {}), 'listing': True}
+        return super().many_init(*args, **kwargs)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Declared nested serializers are built without a context, so this only trims the root
+        context = kwargs.get('context') or {}
+        request = context.get('request')
+        if request is None or request.method not in SAFE_METHODS:
+            keep = self.default_field_names(self.fields)
+        else:
+            keep = self.selected_field_names(request, context.get('listing', False), self.fields)
+        if keep is not None:
+            for name in list(self.fields):
+                if name not in keep:
+                    self.fields.pop(name)
+
+    @classmethod
+    def selected_field_names(cls, request, listing, available):
+        """Returns the field names to render, or None for all of `available`."""
+        params = getattr(request, 'query_params', request.GET)
+
+        def names(param):
+            return {name.strip() for name in params.get(param, '').split(',') if name.strip()}
+
+        meta = getattr(cls, 'Meta', None)
+        available = set(available)
+        requested, omitted = names(cls.fields_query_param), names(cls.omit_query_param)
+        embeddable = getattr(meta, 'embeddable', {})
+        embedded = {embeddable[name] for name in names(cls.embed_query_param) if name in embeddable} & available
+        list_fields = getattr(meta, 'list_fields', None)
+        if requested:
+            keep = requested & available
+        elif listing and list_fields and params.get(cls.full_query_param) not in ('1', 'true'):
+            keep = set(list_fields) & available
+        else:
+            keep = set(available)
+        embed_only = set(getattr(meta, 'embed_only', ()))
+        keep -= embed_only - requested - embedded
+        keep |= embedded
+        keep -= omitted
+        # None would read as "the defaults" to setup_eager_loading, which skips embed-only relations
+        return None if keep == available and not keep & embed_only else keep
+
+    @classmethod
+    def default_field_names(cls, available):
+        """The field names rendered when nothing is asked for: all but Meta.embed_only. None for all."""
+        available = set(available)
+        keep = available - set(getattr(getattr(cls, 'Meta', None), 'embed_only', ()))
+        return None if keep == available else keep
+
+
+class EagerLoadingMixin:
+    """
+    Serializers declare the relations their fields read in Meta.select_related and
+    Meta.prefetch_related. Views apply them via setup_eager_loading(), so a page of
+    any size serializes in a constant number of queries.
+
+    Given the subset of fields actually being rendered, setup_eager_loading() also
+    drops the joins/prefetches nothing reads and narrows the SELECT with only().
+    Fields whose source isn't a model field or relation name list what they read
+    in Meta.field_dependencies, e.g. {'sizes': ('variants',)}. Relations read
+    only by Meta.embed_only fields (see DynamicFieldsMixin) are loaded only
+    when those fields are among field_names.
+    """
+    @classmethod
+    def setup_eager_loading(cls, queryset, field_names=None, extra_columns=()):
+        meta = getattr(cls, 'Meta', None)
+        select_related = getattr(meta, 'select_related', ())
+        prefetch_related = getattr(meta, 'prefetch_related', ())
+        embed_only = getattr(meta, 'embed_only', ())
+        if field_names is None and embed_only:
+            skipped = cls.field_roots(embed_only) or set()
+            prefetch_related = [
+                path for path in prefetch_related
+                if getattr(path, 'prefetch_through', path).split('__')[0] not in skipped
+            ]
+        only = None
+        if field_names is not None:
+            roots = cls.field_roots(field_names)
+            if roots is not None:
+                only = cls.model_columns(queryset.model, roots | set(extra_columns))
+            if only is not None:
+                select_related = [path for path in select_related if path.split('__')[0] in roots]
+                prefetch_related = [
+                    path for path in prefetch_related
+                    if getattr(path, 'prefetch_through', path).split('__')[0] in roots
+                ]
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        if only:
+            queryset = queryset.only(*only)
+        return queryset
+
+    @classmethod
+    def field_roots(cls, field_names):
+        """The model attributes the given serializer fields read, or None if that can't be told."""
+        fields = cls().get_fields() # Unbound and untrimmed; source is only set on bind unless given explicitly
+        dependencies = getattr(getattr(cls, 'Meta', None), 'field_dependencies', {})
+        roots = set()
+        for name in field_names:
+            if name in dependencies:
+                roots.update(dependencies[name])
+                continue
+            source = fields[name].source or name
+            if source == '*':
+                return None
+            root = source.split('.')[0]
+            if root.startswith('get_') and root.endswith('_display'): # e.g. get_order_status_display
+                root = root[len('get_'):-len('_display')]
+            roots.add(root)
+        return roots
+
+    @staticmethod
+    def model_columns(model, roots):
+        columns = []
+        for root in roots:
+            try:
+                field = model._meta.get_field(root)
+            except FieldDoesNotExist:
+                return None
+            if field.concrete or field.one_to_one:
+                columns.append(field.name)
+        return columns
+
+
+class AppUserSerializer(DynamicFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     # The 'user' field will represent the Django User's ID
     user_id = serializers.PrimaryKeyRelatedField(queryset=User.objects.all(), source='user', required=True)
     username = serializers.CharField(source='user.username', read_only=True)
@@ -19,6 +177,7 @@ class AppUserSerializer(serializers.ModelSerializer):
         model = AppUser
         # Include 'user_id', 'username', 'email' for clarity
         fields = ["user_id", "username", "email", "first_name", "middle_name", "last_name", "phone", "role", "created_at", "updated_at"]
+        select_related = ('user',)
         read_only_fields = ["created_at", "updated_at"] # These are auto_now_add/auto_now
 
     # We don't need a create method here if AppUser is created after User
@@ -69,22 +228,30 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 
-class CategoriesSerializer(serializers.ModelSerializer):
+class CategoriesSerializer(DynamicFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     parent_category_name = serializers.CharField(source='parent_category.name', read_only=True)
 
     class Meta:
         model = Categories
         fields = '__all__'
+        select_related = ('parent_category',)
 
-class AddressSerializer(serializers.ModelSerializer):
+    def validate_parent_category(self, value):
+        # Moving a category under itself or one of its subcategories would create a cycle
+        if self.instance and value and category_tree.is_descendant(value.pk, self.instance.pk):
+            raise serializers.ValidationError("A category cannot be moved under itself or one of its subcategories.")
+        return value
+
+class AddressSerializer(DynamicFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     # user_email = serializers.CharField(source='user.user.email', read_only=True) # Access Django User's email
     user_username = serializers.CharField(source='user.user.username', read_only=True) # Access Django User's username
 
     class Meta:
         model = Address
         fields = '__all__'
+        select_related = ('user__user',)
 
-class ShoppingCartsSerializer(serializers.ModelSerializer):
+class ShoppingCartsSerializer(DynamicFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     # user_email = serializers.CharField(source='user.user.email', read_only=True) # Access Django User's email
     # user_username = serializers.CharField(source='user.user.username', read_only=True)
 
@@ -92,14 +259,88 @@ class ShoppingCartsSerializer(serializers.ModelSerializer):
         model = ShoppingCarts
         fields = ["cart_id"]
 
-class ProductsSerializer(serializers.ModelSerializer):
+def validate_variant_product(attrs, instance=None):
+    """Cart and order items may name a variant, but only one of their own product."""
+    product = attrs.get('product', getattr(instance, 'product', None))
+    variant = attrs.get('variant', getattr(instance, 'variant', None))
+    if variant is not None and product is not None and variant.product_id != product.pk:
+        raise serializers.ValidationError({'variant': "This variant belongs to a different product."})
+    return attrs
+
+class ProductVariantSerializer(DynamicFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
+    # The product comes from the URL (see ProductVariantListCreate), never from the body
+    product = serializers.PrimaryKeyRelatedField(read_only=True)
+
+    class Meta:
+        model = ProductVariant
+        fields = '__all__'
+        validators = [] # (product, size) uniqueness is checked in validate(), since product isn't in the body
+
+    def validate_size(self, value):
+        value = value.strip().upper()
+        if not value:
+            raise serializers.ValidationError("Size may not be blank.")
+        return value
+
+    def validate_sku(self, value):
+        return (value or '').strip() or None
+
+    def validate(self, attrs):
+        product_id = self.instance.product_id if self.instance else self.context.get('product_id')
+        size = attrs.get('size')
+        if size and product_id:
+            clashes = ProductVariant.objects.filter(product_id=product_id, size=size)
+            if self.instance:
+                clashes = clashes.exclude(pk=self.instance.pk)
+            if clashes.exists():
+                raise serializers.ValidationError({'size': "This product already has a variant in that size."})
+        return attrs
+
+class ProductsSerializer(DynamicFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
+    variants = ProductVariantSerializer(many=True, read_only=True)
+    sizes = serializers.SerializerMethodField() # Kept for clients of the old free-text column
 
     class Meta:
         model = Products
         fields = '__all__'
+        # Product cards: no description, variants, counters or timestamps
+        list_fields = [
+            'product_id', 'name', 'sku', 'price', 'discount', 'stock_quantity', 'is_available',
+            'image_url', 'category', 'category_name', 'sizes',
+        ]
+        select_related = ('category',)
+        prefetch_related = ('variants',)
+        field_dependencies = {'sizes': ('variants',)}
+
+    def validate_sku(self, value):
+        # SKUs are unique when present; a blank one means none, like a product created without it
+        return (value or '').strip() or None
+
+    def get_sizes(self, obj):
+        return ', '.join(variant.size for variant in obj.variants.all() if variant.is_available) or None
+
+class ProductBulkUpdateItemSerializer(serializers.Serializer):
+    """
+    One row of PATCH /api/products/bulk/: a product_id or sku plus the fields to change.
+    """
+    UPDATABLE_FIELDS = ('price', 'discount', 'stock_quantity', 'is_available')
 
-class PaymentsSerializer(serializers.ModelSerializer):
+    product_id = serializers.IntegerField(required=False)
+    sku = serializers.CharField(max_length=50, required=False)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+    discount = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, max_value=100, required=False)
+    stock_quantity = serializers.IntegerField(min_value=0, required=False)
+    is_available = serializers.BooleanField(required=False)
+
+    def validate(self, attrs):
+        if ('product_id' in attrs) == ('sku' in attrs):
+            raise serializers.ValidationError("Identify the product with exactly one of product_id or sku.")
+        if not any(field in attrs for field in self.UPDATABLE_FIELDS):
+            raise serializers.ValidationError(f"Nothing to update; send at least one of: {', '.join(self.UPDATABLE_FIELDS)}.")
+        return attrs
+
+class PaymentsSerializer(DynamicFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     order_id_display = serializers.IntegerField(source='order.order_id', read_only=True)
     payment_method_display = serializers.CharField(source='get_payment_method_display', read_only=True)
     payment_status_display = serializers.CharField(source='get_payment_status_display', read_only=True)
@@ -107,39 +348,243 @@ class PaymentsSerializer(serializers.ModelSerializer):
     class Meta:
         model = Payments
         fields = '__all__'
+        select_related = ('order',)
+
+class OrderLineSerializer(serializers.ModelSerializer):
+    # An order item as embedded in an order (?embed=items); reads only what OrdersSerializer prefetches
+    product_name = serializers.CharField(source='product.name', read_only=True)
+    product_image_url = serializers.CharField(source='product.image_url', read_only=True)
+    variant_size = serializers.CharField(source='variant.size', read_only=True, default=None)
+
+    class Meta:
+        model = OrderItems
+        fields = [
+            'order_item_id', 'product', 'product_name', 'product_image_url', 'variant', 'variant_size',
+            'quantity', 'price_at_time_of_order', 'subtotal',
+        ]
+
 
-class OrdersSerializer(serializers.ModelSerializer):
+class OrdersSerializer(DynamicFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     # user_email = serializers.CharField(source='user.user.email', read_only=True) # Access Django User's email
     user_username = serializers.CharField(source='user.user.username', read_only=True)
     shipping_address_display = serializers.CharField(source='shipping_address.__str__', read_only=True)
     billing_address_display = serializers.CharField(source='billing_address.__str__', read_only=True)
     order_status_display = serializers.CharField(source='get_order_status_display', read_only=True)
     payment_details = PaymentsSerializer(source='payment', read_only=True)
+    payment_status = serializers.CharField(source='payment.payment_status', read_only=True, default=None)
+    items = OrderLineSerializer(many=True, read_only=True)
 
     class Meta:
         model = Orders
         fields = '__all__'
+        # Order history rows: status and totals, no addresses or nested payment
+        list_fields = [
+            'order_id', 'order_date', 'total_amount', 'order_status', 'order_status_display',
+            'delivery_date', 'payment_status',
+        ]
+        # ?embed=items,payment renders the order's lines and payment inline
+        embeddable = {'items': 'items', 'payment': 'payment_details'}
+        embed_only = ('items',)
+        select_related = ('user__user', 'shipping_address', 'billing_address', 'payment')
+        prefetch_related = (
+            Prefetch(
+                'items',
+                queryset=OrderItems.objects.select_related('product', 'variant').only(
+                    'order', 'product', 'variant', 'quantity', 'price_at_time_of_order', 'subtotal',
+                    'product__name', 'product__image_url', 'variant__size',
+                ).order_by('pk'),
+            ),
+        )
+
+    def validate_order_status(self, value):
+        # New orders may start in any status; existing ones move only along ORDER_TRANSITIONS
+        current = self.instance.order_status if self.instance is not None else None
+        if current is not None and value != current and value not in ORDER_TRANSITIONS.get(current, ()):
+            raise serializers.ValidationError(f"An order cannot go from {current} to {value}.")
+        return value
+
+    def validate(self, attrs):
+        instance = self.instance
+        if (
+            instance is not None and attrs.get('order_status') == OrderStatus.DELIVERED
+            and instance.order_status != OrderStatus.DELIVERED
+            and not attrs.get('delivery_date') and not instance.delivery_date
+        ):
+            attrs['delivery_date'] = timezone.now()
+        return attrs
+
+    def update(self, instance, validated_data):
+        # Write only the columns that were sent, not the whole row
+        for name, value in validated_data.items():
+            setattr(instance, name, value)
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        return instance
+
+
+# Archived orders and payments (api/archive.py) render like live ones, plus archived_at.
+# Only the model and what to prefetch differ.
+class ArchivedPaymentsSerializer(PaymentsSerializer):
+    class Meta(PaymentsSerializer.Meta):
+        model = ArchivedPayment
+
+
+class ArchivedOrdersSerializer(OrdersSerializer):
+    class Meta(OrdersSerializer.Meta):
+        model = ArchivedOrder
+        list_fields = [*OrdersSerializer.Meta.list_fields, 'archived_at']
+        prefetch_related = (
+            Prefetch(
+                'items',
+                queryset=ArchivedOrderItem.objects.select_related('product', 'variant').only(
+                    'order', 'product', 'variant', 'quantity', 'price_at_time_of_order', 'subtotal',
+                    'product__name', 'product__image_url', 'variant__size',
+                ).order_by('pk'),
+            ),
+        )
 
 
-class CartItemsSerializer(serializers.ModelSerializer):
+class CartItemsSerializer(DynamicFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     # Make 'cart' not required for input, as it's set by the view's perform_create
     cart = serializers.PrimaryKeyRelatedField(queryset=ShoppingCarts.objects.all(), required=False)
     cart_id_display = serializers.IntegerField(source='cart.cart_id', read_only=True)
     product_name = serializers.CharField(source='product.name', read_only=True)
     product_price = serializers.DecimalField(source='product.price', max_digits=10, decimal_places=2, read_only=True)
+    variant_size = serializers.CharField(source='variant.size', read_only=True, default=None)
 
     class Meta:
         model = CartItems
-        fields = '__all__'
+        exclude = ['variant_key']
+        select_related = ('cart', 'product', 'variant')
+
+    def validate(self, attrs):
+        attrs = validate_variant_product(attrs, self.instance)
+        # A sized product's stock is kept on its variants, so a line must name one (as in api/cart.py)
+        product = attrs.get('product', getattr(self.instance, 'product', None))
+        variant = attrs.get('variant', getattr(self.instance, 'variant', None))
+        if variant is None and product is not None and product.variants.exists():
+            raise serializers.ValidationError({'variant': "Choose a size: a variant is required for this product."})
+        return attrs
+
+
+class CartOperationSerializer(serializers.Serializer):
+    """
+    One operation of POST /api/cart/items/batch/:
+        {"op": "set", "product_id": 3, "variant_id": 7, "quantity": 2}  quantity 0 removes the line
+        {"op": "increment", "product_id": 3, "quantity": -1}            a line that drops to 0 or below is removed
+        {"op": "remove", "product_id": 3}
+    """
+    OPS = ('set', 'increment', 'remove')
+
+    op = serializers.ChoiceField(choices=OPS)
+    product_id = serializers.IntegerField(min_value=1)
+    variant_id = serializers.IntegerField(min_value=1, required=False, allow_null=True)
+    quantity = serializers.IntegerField(required=False)
+
+    def validate(self, attrs):
+        quantity = attrs.get('quantity')
+        if attrs['op'] == 'set' and (quantity is None or quantity < 0):
+            raise serializers.ValidationError({'quantity': "set needs a quantity of 0 or more."})
+        if attrs['op'] == 'increment' and not quantity:
+            raise serializers.ValidationError({'quantity': "increment needs a non-zero quantity."})
+        return attrs
 
 
-class OrderItemsSerializer(serializers.ModelSerializer):
+class CheckoutSerializer(serializers.Serializer):
+    shipping_address_id = serializers.IntegerField()
+    billing_address_id = serializers.IntegerField(required=False) # Defaults to the shipping address
+    payment_method = serializers.ChoiceField(choices=PaymentMethod.choices, default=PaymentMethod.CASH_ON_DELIVERY)
+
+    def validate(self, attrs):
+        # Both addresses must belong to the user checking out; one query for the pair
+        app_user = self.context['app_user']
+        attrs.setdefault('billing_address_id', attrs['shipping_address_id'])
+        wanted = {attrs['shipping_address_id'], attrs['billing_address_id']}
+        addresses = {address.pk: address for address in Address.objects.filter(user=app_user, pk__in=wanted)}
+        missing = wanted - set(addresses)
+        if missing:
+            raise serializers.ValidationError({'detail': f"Unknown address id(s): {', '.join(map(str, sorted(missing)))}."})
+        attrs['shipping_address'] = addresses[attrs['shipping_address_id']]
+        attrs['billing_address'] = addresses[attrs['billing_address_id']]
+        return attrs
+
+
+class CartLineSerializer(serializers.Serializer):
+    cart_item_id = serializers.IntegerField()
+    product_id = serializers.IntegerField()
+    variant_id = serializers.IntegerField(allow_null=True)
+    name = serializers.CharField()
+    image_url = serializers.CharField(allow_null=True)
+    size = serializers.CharField(allow_null=True)
+    quantity = serializers.IntegerField()
+    list_price = serializers.DecimalField(max_digits=12, decimal_places=2)
+    discount = serializers.DecimalField(max_digits=10, decimal_places=2) # Percent off list_price
+    unit_price = serializers.DecimalField(max_digits=12, decimal_places=2)
+    line_total = serializers.DecimalField(max_digits=12, decimal_places=2)
+    on_sale = serializers.BooleanField() # False when the product or its variant is no longer sold
+    available = serializers.BooleanField() # False when unavailable or short of stock for this quantity
+    stock_quantity = serializers.IntegerField()
+
+
+class CartSummarySerializer(serializers.Serializer):
+    """Read-only shape of api.cart.cart_summary()."""
+    cart_id = serializers.IntegerField(allow_null=True)
+    items = CartLineSerializer(many=True)
+    line_count = serializers.IntegerField()
+    item_count = serializers.IntegerField()
+    subtotal = serializers.DecimalField(max_digits=12, decimal_places=2)
+    discount_total = serializers.DecimalField(max_digits=12, decimal_places=2)
+    total = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
+class OrderItemsSerializer(DynamicFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     order_id_display = serializers.IntegerField(source='order.order_id', read_only=True)
     product_name = serializers.CharField(source='product.name', read_only=True)
+    variant_size = serializers.CharField(source='variant.size', read_only=True, default=None)
 
     class Meta:
         model = OrderItems
         fields = '__all__'
+        select_related = ('order', 'product', 'variant')
+
+    def validate(self, attrs):
+        return validate_variant_product(attrs, self.instance)
+
+class OrderTransitionSerializer(serializers.Serializer):
+    """Body of POST /api/orders/transition/: {"order_ids": [1, 2, 3], "order_status": "Delivered"}"""
+    order_ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+    order_status = serializers.ChoiceField(choices=OrderStatus.choices)
+
+    def validate_order_ids(self, value):
+        limit = getattr(settings, 'ORDER_TRANSITION_MAX_ORDERS', 1000)
+        if len(value) > limit:
+            raise serializers.ValidationError(f"At most {limit} orders per request.")
+        return list(dict.fromkeys(value))
+
+    def validate_order_status(self, value):
+        if not any(value in targets for targets in ORDER_TRANSITIONS.values()):
+            raise serializers.ValidationError(f"No order can be moved to {value}.")
+        return value
+
+
+class InventoryReservationSerializer(DynamicFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
+    class Meta:
+        model = InventoryReservation
+        exclude = ['variant_key', 'slot']
+        read_only_fields = ['user', 'product', 'variant', 'quantity', 'status', 'order', 'expires_at']
+
+
+class ReservationRequestSerializer(serializers.Serializer):
+    """Body of POST /api/reservations/: {"product_id": 3, "variant_id": 7, "quantity": 1}"""
+    product_id = serializers.IntegerField(min_value=1)
+    variant_id = serializers.IntegerField(min_value=1, required=False, allow_null=True)
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+    def validate_quantity(self, value):
+        limit = getattr(settings, 'INVENTORY_RESERVATION_MAX_QUANTITY', 10)
+        if value > limit:
+            raise serializers.ValidationError(f"At most {limit} units per reservation.")
+        return value
+
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     """
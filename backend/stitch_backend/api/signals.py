@@ -0,0 +1,105 @@
+# stitch_backend/api/signals.py
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete
+from django.dispatch import receiver
+
+from . import cache as catalog_cache
+from . import category_tree
+from . import outbox
+from . import rankings
+from . import search
+from .models import Categories, OrderItems, Orders, Payments, PaymentStatus, Products, ProductVariant
+
+
+# Any product, variant or category write (API, admin, seed, shell) invalidates the catalog cache.
+# The bump waits for the commit so a reader can't re-cache pre-commit data under the new version.
+@receiver([post_save, post_delete], sender=Products)
+@receiver([post_save, post_delete], sender=ProductVariant)
+@receiver([post_save, post_delete], sender=Categories)
+def invalidate_catalog_cache(sender, **kwargs):
+    transaction.on_commit(catalog_cache.bump_catalog_version)
+
+
+# Keep the product search index in step with product writes. Index rows are written in the
+# same transaction as the product; deletes are handled by the ProductSearchTerm FK cascade.
+@receiver(post_save, sender=Products)
+def index_product(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.index_products([instance])
+
+
+@receiver(post_save, sender=Categories)
+def reindex_category_products(sender, instance, created, raw=False, **kwargs):
+    # Products are indexed under their category name, so a rename touches all of them
+    if created or raw:
+        return
+    search.index_products(Products.objects.filter(category=instance).select_related('category'))
+
+
+# Category closure table maintenance (see api/category_tree.py)
+@receiver(pre_save, sender=Categories)
+def remember_category_parent(sender, instance, raw=False, **kwargs):
+    instance._previous_parent_id = None
+    if instance.pk and not raw:
+        instance._previous_parent_id = (
+            Categories.objects.filter(pk=instance.pk).values_list('parent_category_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Categories)
+def update_category_closure(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        category_tree.insert_node(instance.pk, instance.parent_category_id)
+    elif instance.parent_category_id != getattr(instance, '_previous_parent_id', None):
+        category_tree.move_subtree(instance.pk, instance.parent_category_id)
+
+
+@receiver(pre_delete, sender=Categories)
+def reparent_subcategories(sender, instance, **kwargs):
+    # parent_category is DO_NOTHING, so hand the children to the deleted category's parent
+    # before its closure rows cascade away
+    for child in Categories.objects.filter(parent_category=instance):
+        child.parent_category_id = instance.parent_category_id
+        child.save(update_fields=['parent_category', 'updated_at'])
+
+
+# Order items added one by one through the API count towards purchase_quantity and the rankings
+@receiver(post_save, sender=OrderItems)
+def record_order_item_sale(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        rankings.record_sales([(instance.product_id, instance.quantity)])
+
+
+# Side effects of orders and payments go through the outbox (api/outbox.py, api/jobs.py). The job
+# row is written by the same transaction as the save, so callers must wrap the save in an atomic
+# block for the two to commit together.
+@receiver(post_save, sender=Orders)
+def enqueue_order_placed(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        outbox.enqueue('order.placed', {'order_id': instance.pk})
+
+
+@receiver(pre_save, sender=Payments)
+def remember_payment_status(sender, instance, raw=False, **kwargs):
+    instance._previous_payment_status = None
+    if instance.pk and not raw:
+        instance._previous_payment_status = (
+            Payments.objects.filter(pk=instance.pk).values_list('payment_status', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Payments)
+def enqueue_payment_status_changed(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = PaymentStatus.PENDING if created else getattr(instance, '_previous_payment_status', None)
+    if instance.payment_status != previous:
+        outbox.enqueue('payment.status_changed', {
+            'payment_id': instance.pk,
+            'order_id': instance.order_id,
+            'payment_status': instance.payment_status,
+            'previous_status': previous,
+        })
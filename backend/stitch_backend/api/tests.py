@@ -1,3 +1,1299 @@
-from django.test import TestCase
+import base64
+import gzip
+import importlib
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipIf
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from . import cache as catalog_cache
+from . import cart as cart_pricing
+from . import archive, category_tree, inventory, outbox, product_io, querylog, rankings, reconciliation, search, webhooks
+from .models import (
+    Address, AppUser, ArchivedOrder, ArchivedOrderItem, ArchivedPayment, CartItems, Categories, CategoryClosure,
+    IdempotencyKey, InventoryReservation, InventorySlot, JobStatus, OrderItems, Orders, OrderStatus, OutboxJob,
+    Payments, PaymentStatus, PaymentWebhookEvent, Products, ProductSalesDaily, ProductVariant, ReservationStatus,
+    ShoppingCarts, WebhookEventStatus,
+)
+from .middleware import CompressionMiddleware, brotli, negotiate_encoding
+from .renderers import ORJSONRenderer
+from .serializers import ProductsSerializer
+
+
+class BuyerTestCase(TestCase):
+    """A buyer with an AppUser profile and an address, for tests that place orders."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', email='buyer@example.com', password='pw12345!')
+        cls.app_user = AppUser.objects.create(user=cls.user, first_name='Buyer')
+        cls.address = Address.objects.create(
+            user=cls.app_user, street_name='1 Main St', barangay='Poblacion', city_municipality='Manila',
+            province='Metro Manila', postal_code='1000', country='Philippines',
+        )
+
+    @classmethod
+    def create_order(cls, total_amount=Decimal('10.00'), **fields):
+        return Orders.objects.create(
+            user=cls.app_user, total_amount=total_amount, shipping_address=cls.address, billing_address=cls.address,
+            **fields,
+        )
+
+    @staticmethod
+    def create_payment(order, **fields):
+        return Payments.objects.create(order=order, payment_method='GCash', amount=order.total_amount, **fields)
+
+
+class CatalogCacheTests(BuyerTestCase):
+    """Cached catalog responses serve stock and sales counters live; only sell-outs invalidate the cache."""
+
+    def setUp(self):
+        cache.clear()
+        self.product = Products.objects.create(name='Shirt', price=Decimal('10.00'), discount=0, stock_quantity=5)
+
+    def test_a_catalog_write_invalidates_cached_responses(self):
+        client = APIClient()
+        url = f'/api/products/{self.product.pk}/'
+        client.get(url)
+        version = catalog_cache.get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Oxford Shirt'
+            self.product.save()
+        self.assertGreater(catalog_cache.get_catalog_version(), version)
+        self.assertEqual(client.get(url).json()['name'], 'Oxford Shirt')
+
+    def test_one_caller_rebuilds_a_cold_key_while_the_others_wait(self):
+        calls = []
+
+        def build():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'built': len(calls)}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(catalog_cache.get_or_build('catalog:test', build)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'built': 1}] * 5)
+
+    @override_settings(CATALOG_CACHE={'WAIT_TIMEOUT': 0.05})
+    def test_a_waiter_builds_itself_once_the_rebuild_takes_too_long(self):
+        cache.add('catalog:test:lock', 1) # Held by a rebuild that never finishes
+        self.assertEqual(catalog_cache.get_or_build('catalog:test', lambda: 'fallback'), 'fallback')
+        self.assertIsNone(cache.get('catalog:test')) # Only the lock holder stores its result
+
+    def test_purchase_quantity_is_fresh_on_a_cache_hit(self):
+        client = APIClient()
+        url = f'/api/products/{self.product.pk}/'
+        self.assertEqual(client.get(url).json()['purchase_quantity'], 0)
+        rankings.record_sales([(self.product.pk, 3)])
+        Products.objects.filter(pk=self.product.pk).update(name='Renamed') # Not seen: still cached
+        data = client.get(url).json()
+        self.assertEqual((data['name'], data['purchase_quantity']), ('Shirt', 3))
+
+    def test_stock_is_fresh_on_a_cache_hit(self):
+        variant = ProductVariant.objects.create(product=self.product, size='M', stock_quantity=4)
+        client = APIClient()
+        url = f'/api/products/{self.product.pk}/'
+        client.get(url)
+        version = catalog_cache.get_catalog_version()
+        Products.objects.filter(pk=self.product.pk).update(stock_quantity=1)
+        ProductVariant.objects.filter(pk=variant.pk).update(stock_quantity=0)
+        data = client.get(url).json()
+        self.assertEqual((data['stock_quantity'], data['variants'][0]['stock_quantity']), (1, 0))
+        self.assertEqual(catalog_cache.get_catalog_version(), version)
+
+    def test_selling_out_a_size_drops_it_from_the_size_filter(self):
+        medium = ProductVariant.objects.create(product=self.product, size='M', stock_quantity=2)
+        ProductVariant.objects.create(product=self.product, size='L', stock_quantity=9)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        cart = ShoppingCarts.objects.create(user=self.app_user)
+
+        def by_size(size):
+            return [product['product_id'] for product in client.get(f'/api/products/?size={size}').json()['results']]
+
+        def checkout(quantity):
+            CartItems.objects.create(cart=cart, product=self.product, variant=medium, quantity=quantity)
+            with self.captureOnCommitCallbacks(execute=True):
+                response = client.post('/api/checkout/', {'shipping_address_id': self.address.pk}, format='json')
+            self.assertEqual(response.status_code, 201)
+
+        self.assertEqual(by_size('M'), [self.product.pk])
+        version = catalog_cache.get_catalog_version()
+        checkout(1) # Still in stock: the cache is kept
+        self.assertEqual(catalog_cache.get_catalog_version(), version)
+        checkout(1) # Sold out
+        self.assertEqual(by_size('M'), [])
+        self.assertEqual(by_size('L'), [self.product.pk])
+
+    def test_exact_stock_filters_are_not_cached(self):
+        client = APIClient()
+        self.assertEqual(len(client.get('/api/products/?stock_quantity_gte=3').json()['results']), 1)
+        Products.objects.filter(pk=self.product.pk).update(stock_quantity=2) # A sale; the version is unchanged
+        self.assertEqual(client.get('/api/products/?stock_quantity_gte=3').json()['results'], [])
+
+
+class BestSellerTests(TestCase):
+    """/api/products/top/ serves a ranking page in a fixed number of queries, sizes included."""
+
+    def test_best_sellers_with_sizes(self):
+        products = [
+            Products.objects.create(name=f'Tee {n}', price=Decimal('10.00'), discount=0) for n in range(12)
+        ]
+        ProductVariant.objects.bulk_create([
+            ProductVariant(product=product, size=size, stock_quantity=3) for product in products for size in ('S', 'M')
+        ])
+        rankings.record_sales([(product.pk, n + 1) for n, product in enumerate(products)])
+        with CaptureQueriesContext(connection) as queries:
+            response = APIClient().get('/api/products/top/?window=7d&limit=100')
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([result['name'] for result in results[:2]], ['Tee 11', 'Tee 10'])
+        self.assertEqual(results[0]['sizes'], 'S, M') # Read from the variants
+        self.assertLessEqual(len(queries), 2)
+
+
+class CategoryTreeTests(TestCase):
+    """The closure table follows category moves, so ?category_subtree= stays one indexed lookup."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.women = Categories.objects.create(name='Women')
+        cls.men = Categories.objects.create(name='Men')
+        cls.tops = Categories.objects.create(name='Tops', parent_category=cls.women)
+        cls.shirts = Categories.objects.create(name='Shirts', parent_category=cls.tops)
+        cls.shirt = Products.objects.create(name='Oxford Shirt', price=Decimal('10.00'), discount=0, category=cls.shirts)
+
+    def ancestors(self, category):
+        return dict(
+            CategoryClosure.objects.filter(descendant=category).values_list('ancestor__name', 'depth')
+        )
+
+    def in_subtree(self, category):
+        cache.clear()
+        response = APIClient().get(f'/api/products/?category_subtree={category.pk}')
+        return [product['product_id'] for product in response.json()['results']]
+
+    def test_moving_a_subtree_rewrites_its_ancestors(self):
+        self.assertEqual(self.ancestors(self.shirts), {'Shirts': 0, 'Tops': 1, 'Women': 2})
+        self.tops.parent_category = self.men
+        self.tops.save()
+        self.assertEqual(self.ancestors(self.shirts), {'Shirts': 0, 'Tops': 1, 'Men': 2})
+        self.assertEqual(self.ancestors(self.tops), {'Tops': 0, 'Men': 1})
+        self.assertEqual(self.in_subtree(self.men), [self.shirt.pk])
+        self.assertEqual(self.in_subtree(self.women), [])
+
+        # Back to the top level: only the subtree's own links remain
+        self.tops.parent_category = None
+        self.tops.save()
+        self.assertEqual(self.ancestors(self.shirts), {'Shirts': 0, 'Tops': 1})
+
+    def test_a_category_cannot_move_under_its_own_subtree(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('staff', is_staff=True))
+        response = client.patch(f'/api/categories/{self.women.pk}/', {'parent_category': self.shirts.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+        with self.assertRaises(ValueError):
+            category_tree.move_subtree(self.women.pk, self.shirts.pk)
+        self.assertEqual(self.ancestors(self.shirts), {'Shirts': 0, 'Tops': 1, 'Women': 2})
+
+
+class SparseFieldsTests(TestCase):
+    """?fields=, ?omit= and ?full= pick the rendered fields, and the SELECT reads only what they need."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Categories.objects.create(name='Tops')
+        for n in range(3):
+            product = Products.objects.create(
+                name=f'Tee {n}', description='Soft cotton', price=Decimal('10.00'), discount=0, category=category,
+            )
+            ProductVariant.objects.create(product=product, size='M', stock_quantity=1)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, query):
+        with CaptureQueriesContext(connection) as queries:
+            response = APIClient().get(f'/api/products/{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results'], [query['sql'] for query in queries]
+
+    def test_listings_render_the_card_fields_unless_asked_for_more(self):
+        results, _ = self.get('')
+        self.assertEqual(set(results[0]), set(ProductsSerializer.Meta.list_fields))
+        results, _ = self.get('?full=1')
+        self.assertIn('description', results[0])
+        self.assertEqual(results[0]['variants'][0]['size'], 'M')
+
+    def test_fields_narrows_the_select_and_skips_unused_relations(self):
+        results, sql = self.get('?fields=product_id,name')
+        self.assertEqual(set(results[0]), {'product_id', 'name'})
+        self.assertEqual(len(sql), 1)
+        self.assertNotIn('"products"."description"', sql[0])
+        self.assertNotIn('JOIN', sql[0])
+
+    def test_omit_drops_fields_and_what_they_read(self):
+        results, sql = self.get('?omit=sizes,category_name')
+        self.assertNotIn('sizes', results[0])
+        self.assertNotIn('category_name', results[0])
+        self.assertIn('price', results[0])
+        self.assertFalse(any('product_variants' in query for query in sql)) # No prefetch once sizes is gone
+        self.assertNotIn('"products"."description"', sql[0])
+
+
+class ProductFacetTests(TestCase):
+    """/api/products/facets/ rolls category, price and availability counts up from one GROUP BY."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tops = Categories.objects.create(name='Tops')
+        cls.bags = Categories.objects.create(name='Bags')
+        for name, price, category, available in [
+            ('Tee', '8.00', cls.tops, True),
+            ('Shirt', '20.00', cls.tops, True),
+            ('Blouse', '24.99', cls.tops, False),
+            ('Tote', '60.00', cls.bags, True),
+            ('Clutch', '150.00', cls.bags, True),
+            ('Scarf', '25.00', None, True),
+        ]:
+            Products.objects.create(name=name, price=Decimal(price), discount=0, category=category, is_available=available)
+
+    def setUp(self):
+        cache.clear()
+
+    def facets(self, query=''):
+        with CaptureQueriesContext(connection) as queries:
+            response = APIClient().get(f'/api/products/facets/{query}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 1)
+        return response.json()
+
+    def test_counts_roll_up(self):
+        facets = self.facets()
+        self.assertEqual(facets['total'], 6)
+        self.assertEqual(
+            [(category['name'], category['count']) for category in facets['categories']],
+            [('Tops', 3), ('Bags', 2), (None, 1)],
+        )
+        self.assertEqual(
+            [(bucket['min'], bucket['max'], bucket['count']) for bucket in facets['price_ranges']],
+            [('0', '10', 1), ('10', '25', 2), ('25', '50', 1), ('50', '100', 1), ('100', None, 1)],
+        )
+        self.assertEqual(facets['availability'], {'available': 5, 'unavailable': 1})
+
+    def test_counts_follow_the_listing_filters(self):
+        facets = self.facets(f'?category_id={self.tops.pk}&is_available=true')
+        self.assertEqual(facets['total'], 2)
+        self.assertEqual(facets['categories'], [{'category_id': self.tops.pk, 'name': 'Tops', 'count': 2}])
+        self.assertEqual([bucket['count'] for bucket in facets['price_ranges']], [1, 1, 0, 0, 0])
+
+
+class KeysetPaginationTests(TestCase):
+    """Listings page by a (created_at, pk) cursor both ways; ?page= switches to numbered pages."""
+
+    @classmethod
+    def setUpTestData(cls):
+        products = [Products.objects.create(name=f'Tee {n}', price=Decimal('10.00'), discount=0) for n in range(7)]
+        # Four products share a timestamp, so the pk must break the tie
+        tied = timezone.now()
+        Products.objects.filter(pk__in=[product.pk for product in products[2:6]]).update(created_at=tied)
+        cls.newest_first = list(Products.objects.order_by('-created_at', '-pk').values_list('pk', flat=True))
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def page(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        return [product['product_id'] for product in body['results']], body
+
+    def test_next_and_previous_cursors_walk_every_row_once(self):
+        pages, url = [], '/api/products/?page_size=3'
+        while url:
+            ids, body = self.page(url)
+            pages.append(ids)
+            url = body['next']
+        self.assertEqual(pages, [self.newest_first[0:3], self.newest_first[3:6], self.newest_first[6:]])
+
+        url, back = body['previous'], []
+        while url:
+            ids, body = self.page(url)
+            back.insert(0, ids)
+            url = body['previous']
+        self.assertEqual(back, pages[:-1])
+
+    def test_a_cursor_is_opaque_and_checked(self):
+        _, body = self.page('/api/products/?page_size=3')
+        cursor = parse_qs(urlparse(body['next']).query)['cursor'][0]
+        payload = json.loads(base64.urlsafe_b64decode(cursor))
+        self.assertEqual(payload['pk'], self.newest_first[2])
+        self.assertEqual(self.client.get('/api/products/?cursor=not-a-cursor').status_code, 404)
+
+    def test_page_numbers_fall_back_to_offset_paging(self):
+        ids, body = self.page('/api/products/?page=2&page_size=3')
+        self.assertEqual(ids, self.newest_first[3:6])
+        self.assertEqual((body['count'], body['total_pages']), (7, 3))
+        self.assertIn('page=3', body['next'])
+
+
+class ProductBulkUpdateTests(TestCase):
+    """PATCH /api/products/bulk/ applies every row in one transaction, or none of them."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.shirt = Products.objects.create(sku='SH-1', name='Shirt', price=Decimal('10.00'), discount=0, stock_quantity=5)
+        cls.scarf = Products.objects.create(sku='SC-1', name='Scarf', price=Decimal('6.00'), discount=0, stock_quantity=2)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('staff', is_staff=True))
+
+    def bulk(self, items):
+        return self.client.patch('/api/products/bulk/', items, format='json')
+
+    def test_rows_by_id_and_sku_are_applied_together(self):
+        version = catalog_cache.get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.bulk([
+                {'product_id': self.shirt.pk, 'price': '12.50', 'discount': '10'},
+                {'sku': 'SC-1', 'stock_quantity': 0, 'is_available': False},
+            ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['updated'], 2)
+        self.assertEqual(
+            list(Products.objects.order_by('pk').values_list('price', 'discount', 'stock_quantity', 'is_available')),
+            [(Decimal('12.50'), Decimal('10.00'), 5, True), (Decimal('6.00'), Decimal('0.00'), 0, False)],
+        )
+        self.assertGreater(catalog_cache.get_catalog_version(), version)
+
+    def test_one_bad_row_means_nothing_is_written(self):
+        response = self.bulk([
+            {'product_id': self.shirt.pk, 'price': '12.50'},
+            {'sku': 'NOPE', 'price': '1.00'},
+            {'sku': 'SC-1'},
+            {'sku': 'SH-1', 'stock_quantity': 1},
+        ])
+        self.assertEqual(response.status_code, 400)
+        body = response.json()
+        self.assertEqual(body['updated'], 0)
+        self.assertEqual(
+            [result['status'] for result in body['results']], ['not_applied', 'not_found', 'invalid', 'invalid'],
+        )
+        self.assertEqual(Products.objects.get(pk=self.shirt.pk).price, Decimal('10.00'))
+
+
+class ProductImportTests(TestCase):
+    """import_products upserts by SKU and turns bad rows into per-line errors."""
+
+    def run_import(self, text, fmt):
+        importer = product_io.ProductImporter(batch_size=10, index=False)
+        list(importer.run(product_io.iter_rows(StringIO(text), fmt)))
+        return importer
+
+    def test_a_name_owned_by_another_sku_is_an_error_not_an_overwrite(self):
+        Products.objects.create(sku='A-1', name='Shirt', price=Decimal('10.00'), discount=0, stock_quantity=5)
+        importer = self.run_import(
+            'sku,name,price,stock_quantity\n'
+            'B-1,Shirt,99.00,0\n'
+            'A-1,Shirt,12.00,7\n'
+            'C-1,Scarf,5.00,1\n'
+            'D-1,Scarf,6.00,1\n',
+            'csv',
+        )
+        self.assertEqual(importer.imported, 2)
+        self.assertEqual([line for line, _ in importer.errors], [2, 5])
+        self.assertIn("already belongs to SKU 'A-1'", importer.errors[0][1])
+        self.assertEqual(
+            list(Products.objects.order_by('sku').values_list('sku', 'name', 'price', 'stock_quantity')),
+            [('A-1', 'Shirt', Decimal('12.00'), 7), ('C-1', 'Scarf', Decimal('5.00'), 1)],
+        )
+
+    def test_bad_jsonl_lines_are_row_errors(self):
+        importer = self.run_import(
+            '{"sku": "A-1", "name": "Shirt", "price": "10.00"}\n'
+            '{"sku": "B-1", "name": \n'
+            '[1]\n'
+            '\n'
+            '{"sku": "C-1", "name": "Scarf", "price": "5.00"}\n',
+            'jsonl',
+        )
+        self.assertEqual(importer.imported, 2)
+        self.assertEqual([line for line, _ in importer.errors], [2, 3])
+        self.assertEqual(importer.errors[1][1], 'not a JSON object')
+
+    def test_a_blank_sku_means_none(self):
+        importer = self.run_import('sku,name,price\n  ,Shirt,10.00\n', 'csv')
+        self.assertEqual(importer.errors, [(2, 'missing sku')])
+
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('staff', is_staff=True))
+        for name in ('Shirt', 'Scarf'):
+            response = client.post('/api/products/', {'name': name, 'price': '10.00', 'discount': '0', 'sku': ' '}, format='json')
+            self.assertEqual(response.status_code, 201)
+            self.assertIsNone(response.json()['sku'])
+
+    def test_the_unique_sku_migration_clears_blank_skus_first(self):
+        migration = importlib.import_module('api.migrations.0007_products_sku_unique')
+        blank = Products.objects.create(sku='  ', name='Shirt', price=Decimal('10.00'), discount=0)
+        migration.clear_blank_skus(django_apps, None)
+        blank.refresh_from_db()
+        self.assertIsNone(blank.sku)
+
+
+class ResponseEncodingTests(TestCase):
+    """CompressionMiddleware negotiates br/gzip above MIN_SIZE; ORJSONRenderer matches DRF's bytes."""
+
+    def respond(self, body, accept_encoding, etag=None, **config):
+        def get_response(request):
+            response = HttpResponse(body, content_type='application/json')
+            if etag:
+                response['ETag'] = etag
+            return response
+
+        with self.settings(RESPONSE_COMPRESSION={'MIN_SIZE': 200, **config}):
+            middleware = CompressionMiddleware(get_response)
+        return middleware(RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding))
+
+    def test_negotiation_honours_q_values_then_server_preference(self):
+        offered = ['br', 'gzip']
+        self.assertEqual(negotiate_encoding('gzip, br', offered), 'br')
+        self.assertEqual(negotiate_encoding('gzip;q=1.0, br;q=0.5', offered), 'gzip')
+        self.assertEqual(negotiate_encoding('br;q=0, *', offered), 'gzip')
+        self.assertEqual(negotiate_encoding('identity', offered), None)
+        self.assertEqual(negotiate_encoding('', offered), None)
+
+    def test_bodies_under_the_threshold_are_sent_as_is(self):
+        response = self.respond(b'{"ok":true}', 'gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, b'{"ok":true}')
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_large_bodies_are_compressed_and_etags_weakened(self):
+        body = json.dumps([{'name': f'Tee {n}', 'price': '10.00'} for n in range(50)]).encode()
+
+        response = self.respond(body, 'gzip', etag='"v1"')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), body)
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+        self.assertEqual(response['ETag'], 'W/"v1"')
+        self.assertEqual(self.respond(body, 'gzip', etag='W/"v1"')['ETag'], 'W/"v1"')
+        self.assertFalse(self.respond(body, 'identity').has_header('Content-Encoding'))
+
+    @skipIf(brotli is None, 'Brotli is not installed')
+    def test_brotli_is_preferred_when_both_are_accepted(self):
+        body = json.dumps([{'name': f'Tee {n}', 'price': '10.00'} for n in range(50)]).encode()
+        response = self.respond(body, 'gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), body)
+        self.assertEqual(self.respond(body, 'gzip, br', ENCODINGS=['gzip'])['Content-Encoding'], 'gzip')
+
+    def test_orjson_renderer_matches_drf_byte_for_byte(self):
+        data = {
+            'name': 'Café tee', 'price': Decimal('19.90'), 'sizes': ['S', 'M'], 'stock': 3,
+            'on_sale': False, 'image_url': None, 'ratio': 0.5, 'nested': {'1': {'a': []}},
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        indented = ORJSONRenderer().render(data, renderer_context={'indent': 2})
+        self.assertIn(b'\n  "name"', indented)
+        self.assertEqual(json.loads(indented), json.loads(JSONRenderer().render(data)))
+        self.assertEqual(ORJSONRenderer().render(None), JSONRenderer().render(None))
+
+
+class OrderEmbeddingTests(BuyerTestCase):
+    """?embed=items,payment on /api/orders/ must not cost a query per order or per item."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        products = [
+            Products.objects.create(name=f'Shirt {n}', price=Decimal('10.00'), discount=0, image_url=f'/img/{n}.png')
+            for n in range(3)
+        ]
+        variant = ProductVariant.objects.create(product=products[0], size='M', stock_quantity=5)
+        for n in range(50):
+            order = cls.create_order(Decimal('30.00'))
+            OrderItems.objects.bulk_create([
+                OrderItems(
+                    order=order, product=product, variant=variant if product == products[0] else None,
+                    quantity=1, price_at_time_of_order=Decimal('10.00'), subtotal=Decimal('10.00'),
+                )
+                for product in products
+            ])
+            cls.create_payment(order)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), len(queries)
+
+    def test_order_history_page_with_items_and_payment(self):
+        body, queries = self.get('/api/orders/?embed=items,payment&page_size=50')
+        self.assertLessEqual(queries, 4)
+        self.assertEqual(len(body['results']), 50)
+        order = body['results'][0]
+        self.assertEqual(len(order['items']), 3)
+        self.assertEqual(order['payment_details']['payment_method'], 'GCash')
+        self.assertEqual(
+            {item['product_name'] for item in order['items']}, {'Shirt 0', 'Shirt 1', 'Shirt 2'},
+        )
+        self.assertEqual(order['items'][0]['product_image_url'], '/img/0.png')
+        self.assertEqual(order['items'][0]['variant_size'], 'M')
+
+    def test_items_are_not_rendered_or_loaded_unless_embedded(self):
+        body, embedded_queries = self.get('/api/orders/?embed=items&page_size=50')
+        body, queries = self.get('/api/orders/?page_size=50')
+        self.assertNotIn('items', body['results'][0])
+        self.assertEqual(queries, embedded_queries - 1)
+
+    def test_order_detail_with_items(self):
+        order_id = Orders.objects.values_list('pk', flat=True).first()
+        body, queries = self.get(f'/api/orders/{order_id}/?embed=items')
+        self.assertLessEqual(queries, 4)
+        self.assertEqual(len(body['items']), 3)
+        self.assertIn('payment_details', body)
+
+
+class CartItemTests(BuyerTestCase):
+    """The legacy /api/cartitems/ endpoint refuses a second line for the same product and size."""
+
+    def setUp(self):
+        self.product = Products.objects.create(name='Apron', price=Decimal('8.00'), discount=0, stock_quantity=10)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_repeating_a_cart_line_is_a_bad_request(self):
+        line = {'product': self.product.pk, 'quantity': 1}
+        self.assertEqual(self.client.post('/api/cartitems/', line, format='json').status_code, 201)
+        response = self.client.post('/api/cartitems/', line, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('already in the cart', response.json()['detail'])
+        self.assertEqual(CartItems.objects.get().quantity, 1)
+
+
+class CartSummaryTests(BuyerTestCase):
+    """/api/cart/summary/ prices every line and the totals in the database."""
+
+    def setUp(self):
+        self.shirt = Products.objects.create(name='Shirt', price=Decimal('10.00'), discount=10, stock_quantity=5)
+        dress = Products.objects.create(name='Dress', price=Decimal('30.00'), discount=0)
+        self.large = ProductVariant.objects.create(product=dress, size='L', stock_quantity=1, price_delta=Decimal('5.00'))
+        cart = ShoppingCarts.objects.create(user=self.app_user)
+        CartItems.objects.create(cart=cart, product=self.shirt, quantity=2)
+        CartItems.objects.create(cart=cart, product=dress, variant=self.large, quantity=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_lines_and_totals(self):
+        summary = self.client.get('/api/cart/summary/').json()
+        self.assertEqual(
+            [(line['name'], line['size'], line['unit_price'], line['line_total']) for line in summary['items']],
+            [('Shirt', None, '9.00', '18.00'), ('Dress', 'L', '35.00', '35.00')],
+        )
+        self.assertEqual(
+            {key: summary[key] for key in ('line_count', 'item_count', 'subtotal', 'discount_total', 'total')},
+            {'line_count': 2, 'item_count': 3, 'subtotal': '55.00', 'discount_total': '2.00', 'total': '53.00'},
+        )
+
+    def test_lines_report_whether_they_are_on_sale_and_in_stock(self):
+        ProductVariant.objects.filter(pk=self.large.pk).update(is_available=False)
+        Products.objects.filter(pk=self.shirt.pk).update(stock_quantity=1)
+        items = self.client.get('/api/cart/summary/').json()['items']
+        self.assertEqual(
+            [(line['on_sale'], line['available'], line['stock_quantity']) for line in items],
+            [(True, False, 1), (False, False, 1)],
+        )
+
+
+class CartBatchTests(BuyerTestCase):
+    """POST /api/cart/items/batch/ folds operations per line and writes them with upserts, all or nothing."""
+
+    def setUp(self):
+        self.shirt = Products.objects.create(name='Shirt', price=Decimal('10.00'), discount=0, stock_quantity=9)
+        self.hat = Products.objects.create(name='Hat', price=Decimal('5.00'), discount=0, stock_quantity=9)
+        self.dress = Products.objects.create(name='Dress', price=Decimal('30.00'), discount=0)
+        self.large = ProductVariant.objects.create(product=self.dress, size='L', stock_quantity=3)
+        self.cart = ShoppingCarts.objects.create(user=self.app_user)
+        CartItems.objects.create(cart=self.cart, product=self.shirt, quantity=2)
+        CartItems.objects.create(cart=self.cart, product=self.dress, variant=self.large, quantity=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def lines(self):
+        return {(item.product_id, item.variant_id): item.quantity for item in CartItems.objects.filter(cart=self.cart)}
+
+    def test_operations_on_a_line_fold_in_request_order(self):
+        self.assertEqual(
+            cart_pricing.fold_operations([
+                {'op': 'increment', 'product_id': 1, 'quantity': 1},
+                {'op': 'increment', 'product_id': 1, 'quantity': 2},
+                {'op': 'increment', 'product_id': 2, 'quantity': 4},
+                {'op': 'set', 'product_id': 2, 'quantity': 5},
+                {'op': 'increment', 'product_id': 2, 'quantity': 1},
+                {'op': 'remove', 'product_id': 3, 'variant_id': 7},
+                {'op': 'increment', 'product_id': 3, 'variant_id': 7, 'quantity': 2},
+            ]),
+            {(1, None): ('increment', 3), (2, None): ('set', 6), (3, 7): ('set', 2)},
+        )
+
+    def test_batch_upserts_existing_lines_and_drops_emptied_ones(self):
+        response = self.client.post('/api/cart/items/batch/', [
+            {'op': 'increment', 'product_id': self.shirt.pk, 'quantity': 3},
+            {'op': 'increment', 'product_id': self.dress.pk, 'variant_id': self.large.pk, 'quantity': -1},
+            {'op': 'set', 'product_id': self.hat.pk, 'quantity': 2},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.lines(), {(self.shirt.pk, None): 5, (self.hat.pk, None): 2})
+        self.assertEqual((response.json()['line_count'], response.json()['total']), (2, '60.00'))
+
+    def test_one_invalid_operation_applies_nothing(self):
+        before = self.lines()
+        response = self.client.post('/api/cart/items/batch/', {'operations': [
+            {'op': 'increment', 'product_id': self.shirt.pk, 'quantity': 1},
+            {'op': 'increment', 'product_id': self.dress.pk, 'quantity': 1},
+            {'op': 'set', 'product_id': self.hat.pk},
+            {'op': 'set', 'product_id': 999, 'quantity': 1},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.json()['errors']], [1, 2, 3])
+        self.assertEqual(self.lines(), before)
+
+
+@override_settings(CART_TTL=timedelta(days=7))
+class CartExpiryTests(BuyerTestCase):
+    """Cart activity slides expires_at forward; sweep_carts empties carts left idle past it."""
+
+    def setUp(self):
+        self.product = Products.objects.create(name='Sock', price=Decimal('2.00'), discount=0, stock_quantity=9)
+        self.cart = ShoppingCarts.objects.create(user=self.app_user)
+        other = AppUser.objects.create(user=User.objects.create_user('idle'), first_name='Idle')
+        self.idle_cart = ShoppingCarts.objects.create(user=other, expires_at=timezone.now() - timedelta(days=1))
+        for n in range(3):
+            variant = ProductVariant.objects.create(product=self.product, size=f'S{n}', stock_quantity=1)
+            CartItems.objects.create(cart=self.idle_cart, product=self.product, variant=variant, quantity=1)
+
+    def test_activity_pushes_the_expiry_forward_at_most_once_per_granularity(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        variant = ProductVariant.objects.filter(product=self.product).first()
+        batch = [{'op': 'increment', 'product_id': self.product.pk, 'variant_id': variant.pk, 'quantity': 1}]
+        self.assertEqual(client.post('/api/cart/items/batch/', batch, format='json').status_code, 200)
+        self.cart.refresh_from_db()
+        self.assertAlmostEqual(self.cart.expires_at, timezone.now() + timedelta(days=7), delta=timedelta(minutes=1))
+
+        expires_at = self.cart.expires_at
+        with mock.patch.object(timezone, 'now', return_value=timezone.now() + timedelta(minutes=1)):
+            cart_pricing.touch_cart(self.cart.pk)
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.expires_at, expires_at)
+
+    def test_sweep_deletes_expired_items_in_batches_and_resets_the_clock(self):
+        CartItems.objects.create(cart=self.cart, product=self.product, quantity=1)
+        cart_pricing.touch_cart(self.cart.pk)
+
+        self.assertEqual(list(cart_pricing.sweep_expired_items(batch_size=2)), [2, 1])
+        self.assertFalse(CartItems.objects.filter(cart=self.idle_cart).exists())
+        self.assertEqual(CartItems.objects.filter(cart=self.cart).count(), 1)
+        self.idle_cart.refresh_from_db()
+        self.assertIsNone(self.idle_cart.expires_at)
+
+    def test_sweep_carts_command_reports_what_it_reclaimed(self):
+        out = StringIO()
+        call_command('sweep_carts', batch_size=2, stdout=out)
+        self.assertIn('Reclaimed 3 expired cart items', out.getvalue())
+        self.assertFalse(CartItems.objects.exists())
+
+
+class CheckoutTests(BuyerTestCase):
+    """Checkout checks stock under row locks and decrements it, or writes nothing."""
+
+    def setUp(self):
+        self.shirt = Products.objects.create(name='Shirt', price=Decimal('10.00'), discount=0, stock_quantity=5)
+        self.dress = Products.objects.create(name='Dress', price=Decimal('30.00'), discount=0, stock_quantity=0)
+        self.medium = ProductVariant.objects.create(product=self.dress, size='M', stock_quantity=2)
+        self.cart = ShoppingCarts.objects.create(user=self.app_user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def checkout(self):
+        return self.client.post('/api/checkout/', {'shipping_address_id': self.address.pk}, format='json')
+
+    def test_checkout_decrements_product_and_variant_stock(self):
+        CartItems.objects.create(cart=self.cart, product=self.shirt, quantity=3)
+        CartItems.objects.create(cart=self.cart, product=self.dress, variant=self.medium, quantity=2)
+        response = self.checkout()
+        self.assertEqual(response.status_code, 201)
+
+        self.shirt.refresh_from_db()
+        self.dress.refresh_from_db()
+        self.medium.refresh_from_db()
+        self.assertEqual((self.shirt.stock_quantity, self.shirt.purchase_quantity), (2, 3))
+        # A variant line's stock is tracked on the variant; the product only counts the sale
+        self.assertEqual((self.dress.stock_quantity, self.dress.purchase_quantity), (0, 2))
+        self.assertEqual(self.medium.stock_quantity, 0)
+        self.assertEqual(Orders.objects.get().total_amount, Decimal('90.00'))
+        self.assertFalse(CartItems.objects.exists())
+
+    def test_short_stock_is_a_conflict_and_writes_nothing(self):
+        CartItems.objects.create(cart=self.cart, product=self.shirt, quantity=3)
+        line = CartItems.objects.create(cart=self.cart, product=self.dress, variant=self.medium, quantity=3)
+        response = self.checkout()
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['items'], [{
+            'cart_item_id': line.pk, 'product_id': self.dress.pk, 'variant_id': self.medium.pk,
+            'requested': 3, 'available': 2,
+        }])
+        self.assertFalse(Orders.objects.exists())
+        self.assertEqual(Products.objects.get(pk=self.shirt.pk).stock_quantity, 5)
+        self.assertEqual(ProductVariant.objects.get(pk=self.medium.pk).stock_quantity, 2)
+        self.assertEqual(CartItems.objects.count(), 2)
+
+    def test_a_sized_product_needs_a_size(self):
+        Products.objects.filter(pk=self.dress.pk).update(stock_quantity=50) # A stale pre-variant total
+        response = self.client.post('/api/cartitems/', {'product': self.dress.pk, 'quantity': 1}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('variant', response.json())
+        # A line written around the API is refused at checkout instead of selling the product-level stock
+        line = CartItems.objects.create(cart=self.cart, product=self.dress, quantity=3)
+        response = self.checkout()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([item['cart_item_id'] for item in response.json()['items']], [line.pk])
+        self.assertFalse(Orders.objects.exists())
+        self.assertEqual(Products.objects.get(pk=self.dress.pk).stock_quantity, 50)
+
+
+class IdempotencyTests(BuyerTestCase):
+    """A checkout retried with the same Idempotency-Key places one order."""
+
+    def setUp(self):
+        product = Products.objects.create(name='Shirt', price=Decimal('10.00'), discount=0, stock_quantity=5)
+        CartItems.objects.create(cart=ShoppingCarts.objects.create(user=self.app_user), product=product, quantity=2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def checkout(self, key, payment_method='GCash'):
+        return self.client.post(
+            '/api/checkout/', {'shipping_address_id': self.address.pk, 'payment_method': payment_method},
+            format='json', HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_a_retry_replays_the_first_response(self):
+        first = self.checkout('key-1')
+        self.assertEqual(first.status_code, 201)
+        retry = self.checkout('key-1')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(Orders.objects.count(), 1)
+        # Another key is another request: the cart is empty now
+        self.assertEqual(self.checkout('key-2').status_code, 400)
+
+    def test_a_key_reused_with_another_body_is_refused(self):
+        self.assertEqual(self.checkout('key-1').status_code, 201)
+        response = self.checkout('key-1', payment_method='Cash On Delivery')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Orders.objects.count(), 1)
+
+    def test_a_server_error_releases_the_key(self):
+        self.client.raise_request_exception = False
+        with mock.patch('api.checkout.place_order', side_effect=RuntimeError('database went away')):
+            self.assertEqual(self.checkout('key-1').status_code, 500)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        # The retry runs for real instead of replaying the error
+        response = self.checkout('key-1')
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertEqual(Orders.objects.count(), 1)
+
+
+@override_settings(INVENTORY_RESERVATION_MAX_QUANTITY=5)
+class InventoryReservationTests(BuyerTestCase):
+    """Units move between slots and reservations without being lost, doubled or taken below zero."""
+
+    def setUp(self):
+        self.product = Products.objects.create(name='Flash Tote', price=Decimal('15.00'), discount=0, stock_quantity=40)
+        inventory.enable_slots(self.product.pk, slots=4)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def hold(self, quantity):
+        return self.client.post('/api/reservations/', {'product_id': self.product.pk, 'quantity': quantity}, format='json')
+
+    def in_slots(self):
+        return InventorySlot.objects.filter(product=self.product).aggregate(total=Sum('quantity'))['total']
+
+    def units(self, status):
+        return InventoryReservation.objects.filter(status=status).aggregate(total=Sum('quantity'))['total'] or 0
+
+    def test_repeated_holds_cannot_exceed_the_per_user_limit(self):
+        self.assertEqual(self.hold(3).status_code, 201)
+        response = self.hold(3)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['held'], 3)
+        self.assertEqual(self.hold(2).status_code, 201)
+        self.assertEqual(self.in_slots(), 35)
+        # Released holds no longer count against the limit
+        inventory.release(InventoryReservation.objects.values_list('pk', flat=True))
+        self.assertEqual(self.hold(5).status_code, 201)
+
+    def test_reserve_claim_and_release_account_for_every_unit(self):
+        [first] = inventory.reserve(self.product.pk, quantity=4, user=self.app_user)
+        [second] = inventory.reserve(self.product.pk, quantity=3, user=self.app_user)
+        self.assertEqual(self.in_slots(), 33)
+
+        # Checkout needs 5: the older hold is used whole, one unit of the newer one goes back
+        committed = inventory.claim(self.app_user, self.product.pk, None, 5)
+        self.assertEqual(set(committed), {first.pk, second.pk})
+        self.assertEqual((self.units(ReservationStatus.COMMITTED), self.units(ReservationStatus.HELD)), (5, 0))
+        self.assertEqual(self.in_slots(), 35)
+
+        # Releasing twice returns the units once
+        [later] = inventory.reserve(self.product.pk, quantity=2, user=self.app_user)
+        self.assertEqual(inventory.release([later.pk]), 2)
+        self.assertEqual(inventory.release([later.pk]), 0)
+        self.assertEqual(self.in_slots(), 35)
+        [fresh] = inventory.claim(self.app_user, self.product.pk, None, 1)
+        self.assertEqual(InventoryReservation.objects.get(pk=fresh).status, ReservationStatus.COMMITTED)
+        self.assertEqual(self.in_slots(), 34)
+
+    def test_slots_never_go_below_zero(self):
+        inventory.reserve(self.product.pk, quantity=30, user=self.app_user)
+        with self.assertRaises(inventory.InsufficientStock) as raised:
+            inventory.reserve(self.product.pk, quantity=11, user=self.app_user)
+        self.assertEqual(raised.exception.available, 10)
+        self.assertEqual(self.in_slots(), 10)
+        # The last units come from several slots when no single slot holds them all
+        inventory.reserve(self.product.pk, quantity=10, user=self.app_user)
+        self.assertFalse(InventorySlot.objects.filter(quantity__lt=0).exists())
+        self.assertEqual(self.in_slots(), 0)
+
+    def test_expired_holds_return_to_the_slots(self):
+        inventory.reserve(self.product.pk, quantity=4, user=self.app_user, now=timezone.now() - timedelta(hours=1))
+        self.assertEqual(self.in_slots(), 36)
+        self.assertEqual(list(inventory.release_expired()), [(1, 4)])
+        self.assertEqual(self.in_slots(), 40)
+        self.assertEqual(self.units(ReservationStatus.RELEASED), 4)
+
+
+class OrderTransitionTests(BuyerTestCase):
+    """POST /api/orders/transition/ moves the orders that may move and reports the rest."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('staff', password='pw12345!', is_staff=True))
+
+    def transition(self, order_ids, order_status):
+        return self.client.post(
+            '/api/orders/transition/', {'order_ids': order_ids, 'order_status': order_status}, format='json',
+        )
+
+    def test_eligible_orders_move_and_the_rest_are_skipped(self):
+        processing = self.create_order(order_status=OrderStatus.PROCESSING)
+        pending = self.create_order(order_status=OrderStatus.PENDING)
+        delivered = self.create_order(order_status=OrderStatus.DELIVERED)
+        response = self.transition([processing.pk, pending.pk, delivered.pk, 999999, processing.pk], OrderStatus.DELIVERED)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'order_status': 'Delivered',
+            'updated': [processing.pk],
+            'skipped': [
+                {'order_id': pending.pk, 'detail': 'An order cannot go from Pending to Delivered.'},
+                {'order_id': delivered.pk, 'detail': 'Already Delivered.'},
+                {'order_id': 999999, 'detail': 'No such order.'},
+            ],
+        })
+        self.assertEqual(
+            dict(Orders.objects.values_list('pk', 'order_status')),
+            {processing.pk: 'Delivered', pending.pk: 'Pending', delivered.pk: 'Delivered'},
+        )
+
+    def test_delivering_stamps_delivery_date_unless_set(self):
+        promised = timezone.now() - timedelta(days=2)
+        stamped = self.create_order(order_status=OrderStatus.PROCESSING)
+        kept = self.create_order(order_status=OrderStatus.PROCESSING, delivery_date=promised)
+        before = timezone.now()
+        self.assertEqual(self.transition([stamped.pk, kept.pk], OrderStatus.DELIVERED).json()['skipped'], [])
+        stamped.refresh_from_db()
+        kept.refresh_from_db()
+        self.assertGreaterEqual(stamped.delivery_date, before)
+        self.assertEqual(kept.delivery_date, promised)
+        # Other targets leave delivery_date alone
+        cancelled = self.create_order(order_status=OrderStatus.PENDING)
+        self.transition([cancelled.pk], OrderStatus.CANCELLED)
+        self.assertIsNone(Orders.objects.get(pk=cancelled.pk).delivery_date)
+
+    def test_admins_only(self):
+        self.client.force_authenticate(self.user)
+        order = self.create_order()
+        self.assertEqual(self.transition([order.pk], OrderStatus.CANCELLED).status_code, 403)
+        self.assertEqual(Orders.objects.get(pk=order.pk).order_status, OrderStatus.PENDING)
+
+
+@override_settings(OUTBOX={'MAX_ATTEMPTS': 3})
+class OutboxTests(BuyerTestCase):
+    """Order side effects are queued with the order and run by the worker, with retries."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.product = Products.objects.create(
+            name='Thimble', price=Decimal('2.00'), discount=0, stock_quantity=20, image_url='/img/t.png',
+        )
+
+    def drain(self):
+        while jobs := outbox.claim():
+            for job in jobs:
+                outbox.run(job)
+
+    def test_checkout_queues_jobs_that_the_worker_runs(self):
+        cart = ShoppingCarts.objects.create(user=self.app_user)
+        CartItems.objects.create(cart=cart, product=self.product, quantity=3)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post('/api/checkout/', {'shipping_address_id': self.address.pk}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            sorted(OutboxJob.objects.values_list('topic', flat=True)),
+            ['inventory.check_stock', 'order.placed', 'rankings.record_sales'],
+        )
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.drain()
+        self.assertFalse(OutboxJob.objects.exclude(status=JobStatus.DONE).exists())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['buyer@example.com'])
+        self.assertIn('3 x Thimble', mail.outbox[0].body)
+        self.assertEqual(outbox.stats()['topics']['order.placed']['done_last_window'], 1)
+
+    def test_failing_job_backs_off_then_fails(self):
+        calls = []
+
+        @outbox.handler('test.flaky')
+        def flaky(payload):
+            calls.append(payload)
+            raise RuntimeError('unavailable')
+        self.addCleanup(outbox._handlers.pop, 'test.flaky')
+
+        job = outbox.enqueue('test.flaky', {'n': 1})
+        for attempt in range(1, 4):
+            claimed = outbox.claim(now=timezone.now() + timedelta(days=1))
+            self.assertEqual([j.pk for j in claimed], [job.pk])
+            with self.assertLogs('api.outbox', 'WARNING'):
+                self.assertFalse(outbox.run(claimed[0]))
+            job.refresh_from_db()
+            self.assertEqual(job.attempts, attempt)
+            if attempt < 3:
+                self.assertEqual(job.status, JobStatus.PENDING)
+                self.assertGreater(job.run_after, timezone.now())
+                self.assertEqual(outbox.claim(), [])
+        self.assertEqual(job.status, JobStatus.FAILED)
+        self.assertIn('unavailable', job.last_error)
+        self.assertEqual(len(calls), 3)
+
+    def test_sales_are_recorded_once_when_a_job_is_taken_over(self):
+        outbox.enqueue('rankings.record_sales', {'lines': [[self.product.pk, 2]]})
+        [stalled] = outbox.claim()
+        # The first worker stalls past VISIBILITY_TIMEOUT and a second one takes the job over
+        [taken_over] = outbox.claim(now=timezone.now() + timedelta(hours=1))
+        self.assertTrue(outbox.run(taken_over))
+        self.assertTrue(outbox.run(stalled))
+        self.assertEqual(ProductSalesDaily.objects.get(product=self.product).quantity, 2)
+        self.assertEqual(OutboxJob.objects.get().status, JobStatus.DONE)
+
+
+class OrderArchiveTests(BuyerTestCase):
+    """archive_orders moves closed orders out; ?include_archived=1 pages through both tables as one list."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        product = Products.objects.create(name='Shirt', price=Decimal('10.00'), discount=0, image_url='/img/s.png')
+        statuses = [OrderStatus.DELIVERED, OrderStatus.PENDING, OrderStatus.CANCELLED]
+        start = timezone.now() - timedelta(days=800)
+        for n in range(30):
+            order = cls.create_order(order_status=statuses[n % 3])
+            OrderItems.objects.create(
+                order=order, product=product, quantity=1, price_at_time_of_order=Decimal('10.00'), subtotal=Decimal('10.00'),
+            )
+            cls.create_payment(order)
+            # Interleave created_at so live and archived orders alternate in the merged list
+            Orders.objects.filter(pk=order.pk).update(
+                created_at=start + timedelta(days=n), updated_at=start + timedelta(days=n if n < 24 else 790),
+            )
+        cls.all_ids = list(Orders.objects.order_by('-created_at', '-pk').values_list('pk', flat=True))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def archive(self):
+        return [sum(counts) for counts in zip(*archive.archive_orders(timezone.now() - timedelta(days=365), batch_size=4))]
+
+    def test_only_old_closed_orders_are_moved(self):
+        self.assertEqual(self.archive(), [16, 16, 16])
+        self.assertEqual(ArchivedOrder.objects.count(), 16)
+        self.assertFalse(ArchivedOrder.objects.exclude(order_status__in=archive.ARCHIVABLE_STATUSES).exists())
+        self.assertEqual(Orders.objects.count(), 14)
+        self.assertFalse(OrderItems.objects.filter(order_id__in=ArchivedOrder.objects.values('pk')).exists())
+        archived = ArchivedOrder.objects.order_by('pk').first()
+        self.assertEqual(ArchivedOrderItem.objects.get(order=archived).subtotal, Decimal('10.00'))
+        self.assertEqual(ArchivedPayment.objects.get(order=archived).payment_method, 'GCash')
+        self.assertEqual(self.archive(), [])
+
+    def test_include_archived_pages_through_both_tables(self):
+        self.archive()
+        response = self.client.get('/api/orders/?page_size=7')
+        self.assertEqual(len(response.json()['results']), 7)
+
+        seen, url = [], '/api/orders/?include_archived=1&page_size=7'
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                body = self.client.get(url).json()
+            self.assertEqual(len(queries), 2) # One range scan per table
+            seen += [order['order_id'] for order in body['results']]
+            url = body['next']
+        self.assertEqual(seen, self.all_ids)
+
+        body = self.client.get('/api/orders/?include_archived=1&order_status=Cancelled&embed=items').json()
+        self.assertEqual(len(body['results']), 10)
+        self.assertTrue(all(len(order['items']) == 1 for order in body['results']))
+        self.assertEqual(sum('archived_at' in order for order in body['results']), 8)
+
+    def test_archived_order_detail_is_read_only(self):
+        self.archive()
+        order_id = ArchivedOrder.objects.values_list('pk', flat=True).first()
+        self.assertEqual(self.client.get(f'/api/orders/{order_id}/').status_code, 404)
+        body = self.client.get(f'/api/orders/{order_id}/?include_archived=1&embed=items').json()
+        self.assertEqual(body['order_id'], order_id)
+        self.assertEqual(len(body['items']), 1)
+        self.assertEqual(body['payment_details']['payment_method'], 'GCash')
+        response = self.client.patch(f'/api/orders/{order_id}/?include_archived=1', {'order_status': 'Refunded'}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+
+class ProductSearchTests(TestCase):
+    """?search= ranks exact term hits over prefix hits over one-typo hits, with a bounded statement."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.exact = Products.objects.create(name='Linen Shirt', price=Decimal('10.00'), discount=0)
+        cls.prefix = Products.objects.create(name='Shirtwaist Dress', price=Decimal('10.00'), discount=0)
+        cls.typo = Products.objects.create(name='Pleated Skirt', price=Decimal('10.00'), discount=0)
+        Products.objects.create(name='Wool Scarf', price=Decimal('10.00'), discount=0)
+
+    def test_exact_hits_rank_above_prefix_and_typo_hits(self):
+        ranked = search.rank_products('shirt')
+        self.assertEqual([product_id for product_id, _ in ranked], [self.exact.pk, self.prefix.pk, self.typo.pk])
+        scores = [score for _, score in ranked]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_a_long_query_builds_a_bounded_statement(self):
+        # Three fuzzable 12-letter words, a 64-letter one and 300 more that only count as exact terms
+        query = ' '.join(['shirt', 'abcdefghijkl', 'mnopqrstuvwx', 'stuvwxyzabcd', 'y' * 64, *(f'word{n}' for n in range(300))])
+        with CaptureQueriesContext(connection) as queries:
+            ranked = search.rank_products(query)
+        self.assertEqual(ranked[0][0], self.exact.pk)
+        self.assertEqual(len(queries), 1)
+        self.assertLess(len(queries[0]['sql']), 60_000)
+
+
+class QueryCaptureTests(TestCase):
+    """QueryCaptureMiddleware logs normalised SQL per route; advise_indexes reads it back."""
+
+    def test_normalize_groups_statements_by_shape(self):
+        self.assertEqual(
+            querylog.normalize('SELECT "t"."a" FROM "t" WHERE "t"."b" = %s AND "t"."c" IN (%s, %s, %s)  LIMIT 21'),
+            'SELECT "t"."a" FROM "t" WHERE "t"."b" = ? AND "t"."c" IN (...) LIMIT ?',
+        )
+
+    def test_suggested_index_puts_equality_before_sort_and_range(self):
+        sql, _ = (
+            Orders.objects.filter(user_id=1, order_status='Pending', order_date__gte=timezone.now())
+            .order_by('-created_at').query.sql_with_params()
+        )
+        self.assertEqual(querylog.suggest_index(sql, 'orders'), ['order_status', 'user_id', 'created_at', 'order_date'])
+        sql, _ = Products.objects.filter(is_available=True, category_id=3, price__lte=10).query.sql_with_params()
+        self.assertEqual(querylog.suggest_index(sql, 'products'), ['category_id', 'is_available', 'price'])
+
+    def test_requests_are_captured_per_route(self):
+        admin = User.objects.create_superuser('admin', password='pw12345!')
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'capture.jsonl')
+            with self.settings(QUERY_CAPTURE={'ENABLED': True, 'PATH': path}):
+                client = APIClient()
+                client.force_authenticate(admin)
+                self.assertEqual(client.get('/api/payments/?payment_status=Completed').status_code, 200)
+                self.assertEqual(client.get('/api/orders/1/').status_code, 404)
+            endpoints, statements = querylog.load(path)
+            self.assertEqual(set(endpoints), {'GET api/payments/', 'GET api/orders/<int:order_id>/'})
+            self.assertTrue(any('"payments"."payment_status" = ?' in sql for _, sql in statements))
+
+            out = StringIO()
+            call_command('advise_indexes', log=path, json=True, stdout=out)
+            self.assertIsInstance(json.loads(out.getvalue()), list)
+
+
+class ReconciliationTests(BuyerTestCase):
+    """reconcile_payments settles matching payments in batches and reports the rows it cannot apply."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for n, status in enumerate([PaymentStatus.PENDING] * 4 + [PaymentStatus.COMPLETED, PaymentStatus.REFUNDED]):
+            cls.create_payment(cls.create_order(), transaction_id=f'GC{n}', payment_status=status)
+        OutboxJob.objects.all().delete()
+
+    def reconcile(self, dry_run=False):
+        settlement = StringIO(
+            'Reference No,Gross Amount,Status,Transaction Date\n'
+            'GC0,10.00,SUCCESS,2026-10-01 09:30:00\n'
+            'GC1,"1,000.00",SUCCESS,2026-10-01\n'
+            'GC2,10.00,FAILED,\n'
+            'GC3,10.00,PENDING,\n'
+            'GC4,10.00,SUCCESS,2026-10-01\n'
+            'GC5,10.00,SUCCESS,2026-10-01\n'
+            'GC0,10.00,SUCCESS,2026-10-02\n'
+            'GX9,10.00,SUCCESS,2026-10-01\n'
+            'GC2,10.00,FAILED,2026-13-45\n'
+        )
+        report = []
+        reconciler = reconciliation.PaymentReconciler(report.append, batch_size=4, dry_run=dry_run)
+        batches = list(reconciler.run(reconciliation.iter_rows(settlement)))
+        self.assertEqual(batches, [4, 8, 9])
+        return reconciler.counts, {(row['transaction_id'], row['issue']) for row in report}
+
+    def test_settles_matches_and_reports_the_rest(self):
+        counts, issues = self.reconcile()
+        self.assertEqual(issues, {
+            ('GC1', 'amount_mismatch'), ('GC5', 'status_conflict'), ('GX9', 'not_found'), ('GC2', 'invalid_row'),
+        })
+        # GC4 was already Completed; only its missing paid_at is filled, without a job
+        self.assertEqual((counts['rows'], counts['updated'], counts['skipped']), (9, 3, 1))
+        statuses = dict(Payments.objects.values_list('transaction_id', 'payment_status'))
+        self.assertEqual(statuses, {
+            'GC0': PaymentStatus.COMPLETED, 'GC1': PaymentStatus.PENDING, 'GC2': PaymentStatus.FAILED,
+            'GC3': PaymentStatus.PENDING, 'GC4': PaymentStatus.COMPLETED, 'GC5': PaymentStatus.REFUNDED,
+        })
+        self.assertEqual(Payments.objects.get(transaction_id='GC0').paid_at.day, 1)
+        self.assertIsNotNone(Payments.objects.get(transaction_id='GC4').paid_at)
+        # The second GC0 row fell in a later batch and found the payment already settled
+        self.assertEqual(counts['unchanged'], 1)
+        self.assertEqual(
+            sorted(job.payload['payment_status'] for job in OutboxJob.objects.filter(topic='payment.status_changed')),
+            [PaymentStatus.COMPLETED, PaymentStatus.FAILED],
+        )
+
+    def test_dry_run_changes_nothing(self):
+        counts, issues = self.reconcile(dry_run=True)
+        self.assertIn(('GX9', 'not_found'), issues)
+        self.assertEqual(Payments.objects.filter(payment_status=PaymentStatus.PENDING).count(), 4)
+        self.assertFalse(OutboxJob.objects.exists())
+
+    def test_command_writes_the_report(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'settlement.csv')
+            with open(path, 'w') as settlement:
+                settlement.write('transaction_id,amount,status\nGC0,10.00,SUCCESS\nGC0,10.00,SUCCESS\n')
+            out = StringIO()
+            call_command('reconcile_payments', path, stdout=out)
+            with open(path + '.discrepancies.csv') as report:
+                rows = report.read().splitlines()
+        self.assertIn('Reconciled 2 rows', out.getvalue())
+        self.assertEqual(len(rows), 2)
+        self.assertIn('duplicate', rows[1])
+        self.assertEqual(Payments.objects.get(transaction_id='GC0').payment_status, PaymentStatus.COMPLETED)
+
+
+@override_settings(GCASH_WEBHOOK={'SECRET': 'test-secret'})
+class GCashWebhookTests(BuyerTestCase):
+    """Signed events are stored once and applied later, per order in occurred_at order."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.orders = [cls.create_order() for _ in range(2)]
+        for order in cls.orders:
+            cls.create_payment(order)
+        OutboxJob.objects.all().delete()
+
+    def send(self, event_id, event_type, order, occurred_at, secret='test-secret', **extra):
+        body = json.dumps({
+            'id': event_id, 'type': event_type, 'order_id': order.pk,
+            'occurred_at': occurred_at, 'amount': '10.00', **extra,
+        }).encode()
+        return APIClient().post(
+            '/api/webhooks/gcash/', body, content_type='application/json',
+            HTTP_X_GCASH_SIGNATURE=webhooks.sign(body, secret),
+        )
+
+    def test_signature_is_checked_and_redeliveries_are_stored_once(self):
+        order = self.orders[0]
+        self.assertEqual(self.send('evt_1', 'payment.succeeded', order, '2026-10-18T09:00:00Z', secret='wrong').status_code, 401)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.send('evt_1', 'payment.succeeded', order, '2026-10-18T09:00:00Z').status_code, 200)
+        self.assertEqual(self.send('evt_1', 'payment.succeeded', order, '2026-10-18T09:00:00Z').status_code, 200)
+        self.assertEqual(self.send('evt_2', 'payment.succeeded', order, 'yesterday').status_code, 400)
+        self.assertEqual(PaymentWebhookEvent.objects.count(), 1)
+        # Nothing is applied until the processor runs
+        self.assertEqual(Payments.objects.get(order=order).payment_status, PaymentStatus.PENDING)
+        with override_settings(GCASH_WEBHOOK={}):
+            self.assertEqual(self.send('evt_3', 'payment.succeeded', order, '2026-10-18T09:00:00Z').status_code, 503)
+
+    def test_events_are_applied_in_order_per_order(self):
+        first, second = self.orders
+        # Delivered out of order: the refund arrives before the payment it undoes
+        self.send('evt_1', 'payment.refunded', first, '2026-10-18T10:00:00Z')
+        self.send('evt_2', 'payment.succeeded', first, '2026-10-18T09:00:00Z', transaction_id='GC1')
+        self.send('evt_3', 'payment.succeeded', second, '2026-10-18T09:00:00Z', amount='99.00')
+        self.assertEqual(webhooks.process_batch(), {WebhookEventStatus.PROCESSED: 2, WebhookEventStatus.FAILED: 1})
+
+        payment = Payments.objects.select_related('order').get(order=first)
+        self.assertEqual((payment.payment_status, payment.transaction_id), (PaymentStatus.REFUNDED, 'GC1'))
+        self.assertEqual(payment.order.order_status, OrderStatus.CANCELLED)
+        self.assertEqual(Payments.objects.get(order=second).payment_status, PaymentStatus.PENDING)
+        self.assertEqual(
+            list(OutboxJob.objects.values_list('payload', flat=True)),
+            [{'payment_id': payment.pk, 'order_id': first.pk, 'payment_status': 'Refunded', 'previous_status': 'Pending'}],
+        )
+
+        # A straggler older than an event already applied to the order is ignored
+        self.send('evt_4', 'payment.failed', first, '2026-10-18T09:30:00Z')
+        self.send('evt_5', 'payment.succeeded', second, '2026-10-18T09:30:00Z')
+        self.assertEqual(webhooks.process_batch(), {WebhookEventStatus.PROCESSED: 1, WebhookEventStatus.IGNORED: 1})
+        self.assertEqual(PaymentWebhookEvent.objects.get(event_id='evt_4').detail, 'Superseded by a later event for the order.')
+        self.assertEqual(Orders.objects.get(pk=second.pk).order_status, OrderStatus.PROCESSING)
+        self.assertEqual(webhooks.process_batch(), {})
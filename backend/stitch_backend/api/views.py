@@ -1,13 +1,15 @@
 # stitch_backend/api/views.py
+import json
+
 from django.shortcuts import render
 from django.contrib.auth.models import User
 from rest_framework import generics, status
-from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser, SAFE_METHODS
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.filters import SearchFilter
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.views import APIView
-from rest_framework.pagination import PageNumberPagination
 
 # Import Simple JWT views
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
@@ -15,25 +17,46 @@ from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework_simplejwt.tokens import RefreshToken
 
 from django.contrib.auth import logout as django_logout
+from django.db import IntegrityError, transaction
+from django.db.models import Q, Value, prefetch_related_objects
+from django.db.models.functions import Coalesce
+from django.http import Http404
+from django.utils import timezone
 
 from django.conf import settings
 SIMPLE_JWT = settings.SIMPLE_JWT
 
+from . import cache as catalog_cache
+from . import cart as cart_pricing
+from . import category_tree
+from . import checkout
+from . import idempotency
+from . import inventory
+from . import outbox
+from . import rankings
+from . import webhooks
+from .pagination import KeysetPagination
+
 # Import all serializers and models from your app
 from .serializers import (
     UserSerializer, AppUserSerializer, CategoriesSerializer, AddressSerializer,
-    ShoppingCartsSerializer, ProductsSerializer, OrdersSerializer,
-    PaymentsSerializer, CartItemsSerializer, OrderItemsSerializer,
+    ShoppingCartsSerializer, ProductsSerializer, OrdersSerializer, ProductBulkUpdateItemSerializer,
+    PaymentsSerializer, CartItemsSerializer, OrderItemsSerializer, ProductVariantSerializer,
+    CartSummarySerializer, CartOperationSerializer, CheckoutSerializer,
+    InventoryReservationSerializer, ReservationRequestSerializer, OrderTransitionSerializer,
+    ArchivedOrdersSerializer, ArchivedPaymentsSerializer,
     # Import your custom token serializer here
     CustomTokenObtainPairSerializer # <--- Ensure this is imported
 )
 from .models import (
-    AppUser, Categories, Address, ShoppingCarts, Products,
-    Orders, Payments, CartItems, OrderItems
+    AppUser, Categories, Address, ShoppingCarts, Products, ProductVariant,
+    Orders, Payments, CartItems, OrderItems, InventoryReservation, ReservationStatus,
+    OrderStatus, ORDER_TRANSITIONS, ArchivedOrder, ArchivedPayment
 )
 from .filters import (
-    AppUserFilter, CategoryFilter, ProductFilter, OrderFilter,
-    CartItemFilter, AddressFilter, PaymentFilter, OrderItemFilter
+    AppUserFilter, CategoryFilter, ProductFilter, OrderFilter, ArchivedOrderFilter,
+    CartItemFilter, AddressFilter, PaymentFilter, ArchivedPaymentFilter, OrderItemFilter,
+    ProductVariantFilter, ProductSearchFilter, product_facets
 )
 
 
@@ -53,22 +76,179 @@ class IsOwnerOrAdmin(IsAuthenticated):
             return obj.order.user.user == request.user
         return False
 
-class CustomPagination(PageNumberPagination):
-    page_size_query_param = 'page_size'
-    max_page_size = 100
+class EagerLoadingViewMixin:
+    """
+    Applies the serializer's declared select_related/prefetch_related (see
+    EagerLoadingMixin) to every queryset the view serializes, list or detail.
+    Hooked into filter_queryset so views can keep overriding get_queryset.
 
-    def get_paginated_response(self, data):
-        return Response({
-            'count': self.page.paginator.count,
-            'next': self.get_next_link(),
-            'previous': self.get_previous_link(),
-            'total_pages': self.page.paginator.num_pages,
-            'results': data
-        })
+    On GETs the queryset is also narrowed to the fields being rendered
+    (?fields=, ?omit=, ?embed=, Meta.list_fields; see DynamicFieldsMixin).
+    """
+    def filter_queryset(self, queryset):
+        return self.eager_load(super().filter_queryset(queryset), self.get_serializer_class())
+
+    def eager_load(self, queryset, serializer_class):
+        if hasattr(serializer_class, 'setup_eager_loading'):
+            field_names = None
+            if self.request.method in SAFE_METHODS and hasattr(serializer_class, 'selected_field_names'):
+                field_names = serializer_class.selected_field_names(
+                    self.request, self.is_listing(), serializer_class().get_fields(),
+                )
+            queryset = serializer_class.setup_eager_loading(
+                queryset, field_names, extra_columns=self.pagination_columns(),
+            )
+        return queryset
+
+    def is_listing(self):
+        return (self.lookup_url_kwarg or self.lookup_field) not in self.kwargs
+
+    def pagination_columns(self):
+        # KeysetPagination reads the cursor field off the first and last rows
+        ordering = getattr(self, 'cursor_ordering', KeysetPagination.default_ordering)
+        return [field.lstrip('-') for field in ordering if field.lstrip('-') != 'pk']
+
+class ArchiveMixin:
+    """
+    ?include_archived=1 on a GET adds the rows `manage.py archive_orders`
+    moved to the archive tables (see api/archive.py). Lists merge live and
+    archived rows into one cursor-paged list, reading each table with its own
+    range scan. Detail lookups fall back to the archive. Without the
+    parameter, and on writes, only live rows exist.
+
+    Views set archived_serializer_class and archived_filterset_class, and
+    implement get_archived_queryset().
+    """
+    archive_query_param = 'include_archived'
+    archived_serializer_class = None
+    archived_filterset_class = None
+
+    def include_archived(self):
+        return (
+            self.request.method in SAFE_METHODS
+            and self.request.query_params.get(self.archive_query_param) in ('1', 'true')
+        )
+
+    def filter_archived_queryset(self, queryset):
+        if self.archived_filterset_class is not None:
+            queryset = self.archived_filterset_class(self.request.query_params, queryset=queryset, request=self.request).qs
+        return self.eager_load(queryset, self.archived_serializer_class)
+
+    def list(self, request, *args, **kwargs):
+        if not self.include_archived():
+            return super().list(request, *args, **kwargs)
+        if self.paginator is None or self.paginator.use_offset_pagination(request, self):
+            return Response(
+                {"detail": f"{self.archive_query_param} pages by cursor only; drop ?page=."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        page = self.paginator.paginate_querysets([
+            self.filter_queryset(self.get_queryset()),
+            self.filter_archived_queryset(self.get_archived_queryset()),
+        ], request, view=self)
+        # Each kind renders with its own serializer, then goes back into page order
+        archived_model = self.archived_serializer_class.Meta.model
+        rendered = {
+            False: iter(self.get_serializer([obj for obj in page if not isinstance(obj, archived_model)], many=True).data),
+            True: iter(self.archived_serializer_class(
+                [obj for obj in page if isinstance(obj, archived_model)], many=True, context=self.get_serializer_context(),
+            ).data),
+        }
+        return self.get_paginated_response([next(rendered[isinstance(obj, archived_model)]) for obj in page])
+
+    def get_object(self):
+        try:
+            return super().get_object()
+        except Http404:
+            if not self.include_archived():
+                raise
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        obj = generics.get_object_or_404(
+            self.filter_archived_queryset(self.get_archived_queryset()),
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]},
+        )
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    def get_serializer(self, *args, **kwargs):
+        if args and isinstance(args[0], self.archived_serializer_class.Meta.model):
+            kwargs.setdefault('context', self.get_serializer_context())
+            return self.archived_serializer_class(*args, **kwargs)
+        return super().get_serializer(*args, **kwargs)
+
+class CatalogCacheMixin:
+    """
+    Serves list/retrieve through the versioned catalog cache (see api/cache.py).
+    Responses are keyed on the path and query parameters, so only use this on
+    views whose output does not depend on the requesting user. Stock levels
+    and sales counters are refreshed on every hit (catalog_cache.refresh_live_fields);
+    requests that filter on exact stock levels are not cached at all.
+    """
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if catalog_cache.depends_on_stock(request):
+            return handler(request, *args, **kwargs)
+        key = catalog_cache.request_key(request, type(self).__name__)
+        data = catalog_cache.get_or_build(key, lambda: handler(request, *args, **kwargs).data)
+        return Response(catalog_cache.refresh_live_fields(data))
+
+
+class IdempotencyMixin:
+    """
+    Honours an Idempotency-Key header on POST (see api/idempotency.py). The
+    first response is stored and replayed to retries of the same request. A
+    retry that arrives while the first is still running waits for it instead
+    of running the write again. Without the header the view behaves as before.
+    """
+    def post(self, request, *args, **kwargs):
+        key = request.headers.get(idempotency.HEADER)
+        if key is None:
+            return super().post(request, *args, **kwargs)
+        if not key.strip() or len(key) > idempotency.MAX_KEY_LENGTH:
+            return Response(
+                {"detail": f"{idempotency.HEADER} must be 1-{idempotency.MAX_KEY_LENGTH} characters."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            record, finished = idempotency.begin(
+                idempotency.scope(request), key, idempotency.fingerprint(request.data),
+            )
+        except idempotency.KeyReused:
+            return Response(
+                {"detail": f"This {idempotency.HEADER} was already used with a different request body."},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        except idempotency.InFlight:
+            return Response(
+                {"detail": f"A request with this {idempotency.HEADER} is still being processed. Retry shortly."},
+                status=status.HTTP_409_CONFLICT,
+            )
+        if finished:
+            return Response(record.response_body, status=record.status_code, headers={'Idempotent-Replayed': 'true'})
+
+        try:
+            try:
+                response = super().post(request, *args, **kwargs)
+            except Exception as exc:
+                # Turn handled API errors (validation and the like) into responses here, so they are stored too
+                response = self.handle_exception(exc)
+        except BaseException:
+            idempotency.abandon(record)
+            raise
+        if response.status_code >= 500:
+            idempotency.abandon(record)
+        else:
+            idempotency.finish(record, response.status_code, response.data)
+        return response
 
 
 # Auth Views
-class CreateUserView(generics.CreateAPIView):
+class CreateUserView(IdempotencyMixin, generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [AllowAny]
@@ -103,7 +283,7 @@ class UserDetailView(APIView):
 
         try:
             app_user = user.appuser
-            address = Address.objects.filter(user=app_user)
+            address = AddressSerializer.setup_eager_loading(Address.objects.filter(user=app_user))
             user_address = AddressSerializer(address, many=True).data
             
             cart = ShoppingCarts.objects.filter(user=app_user).first()
@@ -151,16 +331,16 @@ token_obtain_pair = CustomTokenObtainPairView.as_view()
 
 
 # AppUser Views
-class AppUserListCreate(generics.ListCreateAPIView):
+class AppUserListCreate(EagerLoadingViewMixin, generics.ListCreateAPIView):
     queryset = AppUser.objects.all()
     serializer_class = AppUserSerializer
     permission_classes = [IsAdminUser]
     filter_backends = [DjangoFilterBackend, SearchFilter]
-    # filterset_class = AppUserFilter # Removed filterset_class as it's not defined in the provided views.py
+    filterset_class = AppUserFilter
     search_fields = ['user__username', 'user__email', 'first_name', 'last_name', 'phone']
 
 
-class AppUserRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
+class AppUserRetrieveUpdateDestroy(EagerLoadingViewMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = AppUser.objects.all()
     serializer_class = AppUserSerializer
     lookup_field = 'user'
@@ -168,11 +348,11 @@ class AppUserRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
 
 
 # Categories Views
-class CategoryListCreate(generics.ListCreateAPIView):
+class CategoryListCreate(CatalogCacheMixin, EagerLoadingViewMixin, generics.ListCreateAPIView):
     queryset = Categories.objects.all()
     serializer_class = CategoriesSerializer
     filter_backends = [DjangoFilterBackend, SearchFilter]
-    # filterset_class = CategoryFilter # Removed filterset_class
+    filterset_class = CategoryFilter
     search_fields = ['name', 'description']
 
     def get_permissions(self):
@@ -180,7 +360,7 @@ class CategoryListCreate(generics.ListCreateAPIView):
             return [IsAdminUser()]
         return [AllowAny()]
 
-class CategoryRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
+class CategoryRetrieveUpdateDestroy(CatalogCacheMixin, EagerLoadingViewMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Categories.objects.all()
     serializer_class = CategoriesSerializer
     lookup_field = 'category_id'
@@ -189,13 +369,25 @@ class CategoryRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
             return [IsAdminUser()]
         return [AllowAny()]
 
+class CategoryTreeView(CatalogCacheMixin, APIView):
+    """
+    Returns the whole category tree, nested through `children`, built from a single query.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        return self.cached_response(self.get_tree, request, *args, **kwargs)
+
+    def get_tree(self, request, *args, **kwargs):
+        return Response(category_tree.build_tree(), status=status.HTTP_200_OK)
+
 
 # Address Views
-class AddressListCreate(generics.ListCreateAPIView):
+class AddressListCreate(EagerLoadingViewMixin, generics.ListCreateAPIView):
     serializer_class = AddressSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, SearchFilter]
-    # filterset_class = AddressFilter # Removed filterset_class
+    filterset_class = AddressFilter
     search_fields = ['street_name', 'barangay', 'city_municipality', 'province', 'postal_code']
 
     def get_queryset(self):
@@ -208,7 +400,7 @@ class AddressListCreate(generics.ListCreateAPIView):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user.appuser)
 
-class AddressRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
+class AddressRetrieveUpdateDestroy(EagerLoadingViewMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Address.objects.all()
     serializer_class = AddressSerializer
     lookup_field = 'address_id'
@@ -216,7 +408,7 @@ class AddressRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
 
 
 # ShoppingCart Views
-class ShoppingCartListCreate(generics.ListCreateAPIView):
+class ShoppingCartListCreate(EagerLoadingViewMixin, generics.ListCreateAPIView):
     serializer_class = ShoppingCartsSerializer
     permission_classes = [IsAuthenticated]
 
@@ -236,7 +428,7 @@ class ShoppingCartListCreate(generics.ListCreateAPIView):
         except AppUser.DoesNotExist:
             raise generics.ValidationError("AppUser profile not found for this user.")
 
-class ShoppingCartRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
+class ShoppingCartRetrieveUpdateDestroy(EagerLoadingViewMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = ShoppingCarts.objects.all()
     serializer_class = ShoppingCartsSerializer
     lookup_field = 'cart_id'
@@ -244,19 +436,131 @@ class ShoppingCartRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
 
 
 # Product Views
-class ProductListCreate(generics.ListCreateAPIView):
+class ProductListCreate(CatalogCacheMixin, EagerLoadingViewMixin, generics.ListCreateAPIView):
     queryset = Products.objects.all()
     serializer_class = ProductsSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter]
-    # filterset_class = ProductFilter # Removed filterset_class
-    search_fields = ['name', 'description', 'sku', 'category__name']
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter]
+    filterset_class = ProductFilter
+    search_fields = ['name', 'description', 'sku', 'category__name'] # Indexed by api/search.py
 
     def get_permissions(self):
         if self.request.method == 'POST':
             return [IsAdminUser()]
         return [AllowAny()]
 
-class ProductRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
+class ProductFacetsView(CatalogCacheMixin, generics.GenericAPIView):
+    """
+    Per-category counts, price-range histogram and availability counts for the
+    products matching the current filters/search (same parameters as /api/products/).
+    """
+    queryset = Products.objects.all()
+    permission_classes = [AllowAny]
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter]
+    filterset_class = ProductFilter
+    search_fields = ['name', 'description', 'sku', 'category__name']
+
+    def get(self, request, *args, **kwargs):
+        return self.cached_response(self.get_facets, request, *args, **kwargs)
+
+    def get_facets(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(product_facets(queryset), status=status.HTTP_200_OK)
+
+class ProductTopView(APIView):
+    """
+    Best sellers for a ranking window (?window=7d, see PRODUCT_RANKING_WINDOWS),
+    optionally within one category (?category=<id>), best first.
+    Served from the precomputed product_rankings table.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        window = request.query_params.get('window', '7d')
+        if window not in rankings.get_windows():
+            return Response(
+                {"detail": f"Unknown window '{window}'. Choose one of: {', '.join(rankings.get_windows())}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            category_id = int(request.query_params['category']) if request.query_params.get('category') else None
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 100)
+        except ValueError:
+            return Response({"detail": "category and limit must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+
+        top = list(rankings.top_products(window, category_id=category_id, limit=limit))
+        products = ProductsSerializer([ranking.product for ranking in top], many=True, context={'request': request}).data
+        results = [{**product, 'score': ranking.score} for product, ranking in zip(products, top)]
+        return Response({'window': window, 'results': results}, status=status.HTTP_200_OK)
+
+class ProductBulkUpdateView(APIView):
+    """
+    Admin-only batch change of price, discount, stock_quantity and is_available.
+
+    Takes a list of {"product_id"|"sku": ..., <fields>} rows. Every row is
+    validated first; if any row is invalid or unknown nothing is written and
+    the per-row results say why. Otherwise all rows are applied in one
+    transaction with bulk_update and the catalog cache is invalidated once.
+    """
+    permission_classes = [IsAdminUser]
+
+    def patch(self, request, *args, **kwargs):
+        items = request.data if isinstance(request.data, list) else request.data.get('items')
+        max_items = getattr(settings, 'PRODUCT_BULK_UPDATE_MAX_ITEMS', 1000)
+        if not isinstance(items, list) or not items:
+            return Response({"detail": "Send a non-empty list of product updates."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > max_items:
+            return Response({"detail": f"At most {max_items} products per request."}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = [ProductBulkUpdateItemSerializer(data=item) for item in items]
+        results = [{'index': index, 'status': 'pending'} for index in range(len(rows))]
+        for row, result in zip(rows, results):
+            if not row.is_valid():
+                result.update(status='invalid', errors=row.errors)
+
+        with transaction.atomic():
+            valid = [(row.validated_data, result) for row, result in zip(rows, results) if result['status'] == 'pending']
+            ids = [data['product_id'] for data, _ in valid if 'product_id' in data]
+            skus = [data['sku'] for data, _ in valid if 'sku' in data]
+            products = list(Products.objects.select_for_update().filter(Q(pk__in=ids) | Q(sku__in=skus)).order_by('pk'))
+            by_id = {product.pk: product for product in products}
+            by_sku = {product.sku: product for product in products if product.sku}
+
+            touched, fields, seen = [], set(), set()
+            now = timezone.now()
+            for data, result in valid:
+                product = by_id.get(data['product_id']) if 'product_id' in data else by_sku.get(data['sku'])
+                if product is None:
+                    result.update(status='not_found', errors={'detail': 'No product with that product_id/sku.'})
+                    continue
+                if product.pk in seen:
+                    result.update(status='invalid', errors={'detail': 'Product appears more than once in this request.'})
+                    continue
+                seen.add(product.pk)
+                changes = {field: data[field] for field in ProductBulkUpdateItemSerializer.UPDATABLE_FIELDS if field in data}
+                for field, value in changes.items():
+                    setattr(product, field, value)
+                product.updated_at = now
+                fields |= set(changes)
+                touched.append(product)
+                result.update(
+                    status='updated', product_id=product.pk, sku=product.sku,
+                    changes=ProductBulkUpdateItemSerializer(changes).data,
+                )
+
+            if any(result['status'] != 'updated' for result in results):
+                for result in results:
+                    if result['status'] == 'updated':
+                        result['status'] = 'not_applied'
+                        result.pop('changes')
+                return Response({'updated': 0, 'results': results}, status=status.HTTP_400_BAD_REQUEST)
+
+            # bulk_update sends no post_save, so invalidate the catalog cache here, once
+            Products.objects.bulk_update(touched, sorted(fields) + ['updated_at'], batch_size=500)
+            transaction.on_commit(catalog_cache.bump_catalog_version)
+
+        return Response({'updated': len(touched), 'results': results}, status=status.HTTP_200_OK)
+
+class ProductRetrieveUpdateDestroy(CatalogCacheMixin, EagerLoadingViewMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Products.objects.all()
     serializer_class = ProductsSerializer
     lookup_field = 'product_id'
@@ -266,12 +570,145 @@ class ProductRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
         return [AllowAny()]
 
 
+# ProductVariant Views
+class ProductVariantListCreate(CatalogCacheMixin, EagerLoadingViewMixin, generics.ListCreateAPIView):
+    """
+    Sizes of one product, each with its own SKU, stock and price adjustment.
+    """
+    serializer_class = ProductVariantSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = ProductVariantFilter
+
+    def get_queryset(self):
+        return ProductVariant.objects.filter(product_id=self.kwargs['product_id'])
+
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), 'product_id': self.kwargs['product_id']}
+
+    def get_permissions(self):
+        if self.request.method == 'POST':
+            return [IsAdminUser()]
+        return [AllowAny()]
+
+    def perform_create(self, serializer):
+        product = generics.get_object_or_404(Products, pk=self.kwargs['product_id'])
+        serializer.save(product=product)
+
+class ProductVariantRetrieveUpdateDestroy(CatalogCacheMixin, EagerLoadingViewMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = ProductVariant.objects.all()
+    serializer_class = ProductVariantSerializer
+    lookup_field = 'variant_id'
+
+    def get_permissions(self):
+        if self.request.method in ['PUT', 'PATCH', 'DELETE']:
+            return [IsAdminUser()]
+        return [AllowAny()]
+
+
+# Inventory reservations
+class ReservationListCreate(EagerLoadingViewMixin, generics.ListAPIView):
+    """
+    GET lists the current user's live holds. POST holds units of a product
+    that sells from inventory slots (see api/inventory.py) for
+    INVENTORY_RESERVATION_TTL; checkout turns the hold into the sale.
+    """
+    serializer_class = InventoryReservationSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return InventoryReservation.objects.filter(
+            user__user=self.request.user, status=ReservationStatus.HELD, expires_at__gt=timezone.now(),
+        )
+
+    def post(self, request, *args, **kwargs):
+        try:
+            app_user = request.user.appuser
+        except AppUser.DoesNotExist:
+            return Response({"detail": "AppUser profile not found for this user."}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = ReservationRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        product_id, variant_id = serializer.validated_data['product_id'], serializer.validated_data.get('variant_id')
+        if variant_id is None:
+            on_sale = Products.objects.filter(pk=product_id, is_available=True).exists()
+        else:
+            on_sale = ProductVariant.objects.filter(
+                pk=variant_id, product_id=product_id, is_available=True, product__is_available=True,
+            ).exists()
+        if not on_sale:
+            return Response({"detail": "This product is not available."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            reservations = inventory.reserve(
+                product_id, variant_id, serializer.validated_data['quantity'], user=app_user,
+                max_held=inventory.get_max_held(),
+            )
+        except inventory.HoldLimitExceeded as exc:
+            return Response({"detail": str(exc), "held": exc.held}, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        except inventory.InsufficientStock as exc:
+            return Response({"detail": str(exc), "available": exc.available}, status=status.HTTP_409_CONFLICT)
+        return Response(
+            InventoryReservationSerializer(reservations, many=True, context={'request': request}).data,
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class ReservationRelease(APIView):
+    """Gives a held reservation back before it expires."""
+    permission_classes = [IsAuthenticated]
+
+    def delete(self, request, reservation_id, *args, **kwargs):
+        if not InventoryReservation.objects.filter(pk=reservation_id, user__user=request.user).exists():
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+        inventory.release([reservation_id])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+# Checkout
+class CheckoutView(IdempotencyMixin, generics.CreateAPIView):
+    """
+    Converts the current user's cart into an order, its items and a pending
+    payment in one transaction (see api/checkout.py). Prices come from the
+    database, not the client; stock is checked and decremented under row locks,
+    or claimed from inventory slots for hot products.
+    """
+    serializer_class = CheckoutSerializer
+    permission_classes = [IsAuthenticated]
+
+    # create(), not post(): IdempotencyMixin.post must run first and hand over to it
+    def create(self, request, *args, **kwargs):
+        try:
+            app_user = request.user.appuser
+        except AppUser.DoesNotExist:
+            return Response({"detail": "AppUser profile not found for this user."}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = CheckoutSerializer(data=request.data, context={'request': request, 'app_user': app_user})
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        try:
+            order, order_items = checkout.place_order(
+                app_user, data['shipping_address'], data['billing_address'], data['payment_method'],
+            )
+        except checkout.CheckoutError as exc:
+            body = {"detail": exc.detail}
+            if exc.lines:
+                body['items'] = exc.lines
+            return Response(body, status=status.HTTP_409_CONFLICT if exc.conflict else status.HTTP_400_BAD_REQUEST)
+        # product_name/variant_size would otherwise cost a query per item
+        prefetch_related_objects(order_items, 'product', 'variant')
+        return Response({
+            **OrdersSerializer(order, context={'request': request}).data,
+            'items': OrderItemsSerializer(order_items, many=True, context={'request': request}).data,
+        }, status=status.HTTP_201_CREATED)
+
+
 # Order Views
-class OrderListCreate(generics.ListCreateAPIView):
+class OrderListCreate(ArchiveMixin, IdempotencyMixin, EagerLoadingViewMixin, generics.ListCreateAPIView):
     serializer_class = OrdersSerializer
+    archived_serializer_class = ArchivedOrdersSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
-    # filterset_class = OrderFilter # Removed filterset_class
+    filterset_class = OrderFilter
+    archived_filterset_class = ArchivedOrderFilter
 
     def get_queryset(self):
         try:
@@ -280,43 +717,157 @@ class OrderListCreate(generics.ListCreateAPIView):
         except AppUser.DoesNotExist:
             return Orders.objects.none()
 
+    def get_archived_queryset(self):
+        try:
+            app_user = self.request.user.appuser
+            return ArchivedOrder.objects.filter(user=app_user)
+        except AppUser.DoesNotExist:
+            return ArchivedOrder.objects.none()
+
     def perform_create(self, serializer):
         try:
             app_user = self.request.user.appuser
-            serializer.save(user=app_user)
+            # Atomic so the order.placed outbox job commits with the order
+            with transaction.atomic():
+                serializer.save(user=app_user)
         except AppUser.DoesNotExist:
             raise generics.ValidationError("AppUser profile not found for this user.")
 
-class OrderRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
+class OrderRetrieveUpdateDestroy(ArchiveMixin, EagerLoadingViewMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Orders.objects.all()
     serializer_class = OrdersSerializer
+    archived_serializer_class = ArchivedOrdersSerializer
     lookup_field = 'order_id'
     permission_classes = [IsOwnerOrAdmin]
 
+    def get_archived_queryset(self):
+        return ArchivedOrder.objects.all()
+
+
+class OrderTransitionView(APIView):
+    """
+    Moves many orders to one status (admin only). Only orders whose current
+    status may move there (ORDER_TRANSITIONS) are changed, with a single
+    UPDATE; the rest are reported back as skipped, with the reason.
+    Delivering an order stamps delivery_date unless it already has one.
+    """
+    permission_classes = [IsAdminUser]
+
+    def post(self, request, *args, **kwargs):
+        serializer = OrderTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        order_ids = serializer.validated_data['order_ids']
+        target = serializer.validated_data['order_status']
+        allowed_from = [current for current, targets in ORDER_TRANSITIONS.items() if target in targets]
+
+        now = timezone.now()
+        changes = {'order_status': target, 'updated_at': now}
+        if target == OrderStatus.DELIVERED:
+            changes['delivery_date'] = Coalesce('delivery_date', Value(now))
+        with transaction.atomic():
+            # Lock the requested rows so the skipped list matches what the UPDATE changes
+            current = dict(
+                Orders.objects.select_for_update().filter(pk__in=order_ids).order_by('pk').values_list('pk', 'order_status')
+            )
+            eligible = [order_id for order_id in order_ids if current.get(order_id) in allowed_from]
+            if eligible:
+                Orders.objects.filter(pk__in=eligible, order_status__in=allowed_from).update(**changes)
+
+        skipped = []
+        for order_id in order_ids:
+            if order_id not in current:
+                skipped.append({'order_id': order_id, 'detail': "No such order."})
+            elif current[order_id] == target:
+                skipped.append({'order_id': order_id, 'detail': f"Already {target}."})
+            elif current[order_id] not in allowed_from:
+                skipped.append({'order_id': order_id, 'detail': f"An order cannot go from {current[order_id]} to {target}."})
+        return Response({
+            'order_status': target,
+            'updated': eligible,
+            'skipped': skipped,
+        }, status=status.HTTP_200_OK)
+
 
 # Payment Views
-class PaymentListCreate(generics.ListCreateAPIView):
+class PaymentListCreate(ArchiveMixin, IdempotencyMixin, EagerLoadingViewMixin, generics.ListCreateAPIView):
     queryset = Payments.objects.all()
     serializer_class = PaymentsSerializer
+    archived_serializer_class = ArchivedPaymentsSerializer
     permission_classes = [IsAdminUser]
     filter_backends = [DjangoFilterBackend]
-    # filterset_class = PaymentFilter # Removed filterset_class
+    filterset_class = PaymentFilter
+    archived_filterset_class = ArchivedPaymentFilter
 
-class PaymentRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
+    def get_archived_queryset(self):
+        return ArchivedPayment.objects.all()
+
+    def perform_create(self, serializer):
+        # Atomic so the payment.status_changed outbox job commits with the payment
+        with transaction.atomic():
+            serializer.save()
+
+class PaymentRetrieveUpdateDestroy(ArchiveMixin, EagerLoadingViewMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Payments.objects.all()
     serializer_class = PaymentsSerializer
+    archived_serializer_class = ArchivedPaymentsSerializer
     lookup_field = 'payment_id'
     permission_classes = [IsAdminUser]
 
+    def get_archived_queryset(self):
+        return ArchivedPayment.objects.all()
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            serializer.save()
+
+
+class OutboxStatsView(APIView):
+    """
+    Outbox queue depth and job latency per topic (admin only), for
+    monitoring the `run_worker` processes. See api/outbox.py stats().
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(outbox.stats(), status=status.HTTP_200_OK)
+
+
+class GCashWebhookView(APIView):
+    """
+    Receives GCash payment events. Checks the X-GCash-Signature HMAC and
+    stores the raw event; `manage.py process_webhooks` applies it later (see
+    api/webhooks.py). A redelivered event is acknowledged like a new one and
+    dropped by the unique event_id.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    throttle_classes = []
+
+    def post(self, request, *args, **kwargs):
+        config = webhooks.get_config()
+        if not config['SECRET']:
+            return Response({"detail": "Webhooks are not configured."}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        body = request.body
+        try:
+            webhooks.verify(body, request.headers.get(webhooks.HEADER), config['SECRET'], config['TOLERANCE'])
+        except webhooks.InvalidSignature as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_401_UNAUTHORIZED)
+        try:
+            event = webhooks.build_event(json.loads(body))
+        except ValueError as exc: # Undecodable JSON or webhooks.InvalidEvent
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        webhooks.store(event)
+        return Response({"detail": "Received."}, status=status.HTTP_200_OK)
+
 
 # CartItem Views
-class CartItemListCreate(generics.ListCreateAPIView):
+class CartItemListCreate(EagerLoadingViewMixin, generics.ListCreateAPIView):
     serializer_class = CartItemsSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, SearchFilter]
-    # filterset_class = CartItemFilter # Removed filterset_class
+    filterset_class = CartItemFilter
     search_fields = ['product__name']
-
+    cursor_ordering = ('-added_at', '-pk')
 
     def get_queryset(self):
         try:
@@ -330,12 +881,19 @@ class CartItemListCreate(generics.ListCreateAPIView):
         try:
             app_user = self.request.user.appuser
             cart, created = ShoppingCarts.objects.get_or_create(user=app_user)
-            serializer.save(cart=cart)
         except AppUser.DoesNotExist:
             raise generics.ValidationError("AppUser profile not found for this user.")
+        try:
+            # (cart, product, variant_key) is unique; a savepoint keeps a clash from spoiling the request
+            with transaction.atomic():
+                serializer.save(cart=cart)
+        except IntegrityError:
+            raise ValidationError({"detail": "This product (and size) is already in the cart. Update that line, "
+                                             "or use POST /api/cart/items/batch/ to add to it."})
+        cart_pricing.touch_cart(cart.pk)
 
 
-class CartItemRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
+class CartItemRetrieveUpdateDestroy(EagerLoadingViewMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = CartItems.objects.all()
     serializer_class = CartItemsSerializer
     lookup_field = 'cart_item_id'
@@ -348,26 +906,89 @@ class CartItemRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
                 self.permission_denied(self.request, message="You do not have permission to access this cart item.")
         return obj
 
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        cart_pricing.touch_cart(serializer.instance.cart_id)
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        cart_pricing.touch_cart(instance.cart_id)
+
+
+class CartSummaryView(APIView):
+    """
+    The current user's cart with discounted unit prices, line totals, item
+    count and grand total, priced by the database in one query (api/cart.py).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        cart_id = ShoppingCarts.objects.filter(user__user=request.user).values_list('cart_id', flat=True).first()
+        summary = cart_pricing.cart_summary(cart_id)
+        return Response(CartSummarySerializer(summary).data, status=status.HTTP_200_OK)
+
+
+class CartItemBatchView(APIView):
+    """
+    Applies a list of cart operations (set / increment / remove, see
+    CartOperationSerializer) atomically and returns the updated cart summary.
+
+    Operations on the same line are folded in order, then written with
+    database upserts, so adding a product that is already in the cart updates
+    its quantity. If any operation is invalid nothing is applied.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        operations = request.data if isinstance(request.data, list) else request.data.get('operations')
+        max_operations = getattr(settings, 'CART_BATCH_MAX_OPERATIONS', 100)
+        if not isinstance(operations, list) or not operations:
+            return Response({"detail": "Send a non-empty list of cart operations."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(operations) > max_operations:
+            return Response({"detail": f"At most {max_operations} operations per request."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            app_user = request.user.appuser
+        except AppUser.DoesNotExist:
+            return Response({"detail": "AppUser profile not found for this user."}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = [CartOperationSerializer(data=operation) for operation in operations]
+        errors = {index: row.errors for index, row in enumerate(rows) if not row.is_valid()}
+        valid = [(index, row.validated_data) for index, row in enumerate(rows) if index not in errors]
+        validated = [data for _, data in valid]
+        for position, message in cart_pricing.check_operations(validated).items():
+            errors[valid[position][0]] = {'detail': message}
+        if errors:
+            return Response(
+                {"detail": "No changes were applied.", "errors": [{'index': index, 'errors': errors[index]} for index in sorted(errors)]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        with transaction.atomic():
+            # Serializes concurrent batches for the same cart
+            cart, _ = ShoppingCarts.objects.select_for_update().get_or_create(user=app_user)
+            cart_pricing.apply_operations(cart.pk, cart_pricing.fold_operations(validated))
+            cart_pricing.touch_cart(cart.pk)
+        return Response(CartSummarySerializer(cart_pricing.cart_summary(cart.pk)).data, status=status.HTTP_200_OK)
+
 
 # OrderItem Views
-class OrderItemListCreate(generics.ListCreateAPIView):
+class OrderItemListCreate(EagerLoadingViewMixin, generics.ListCreateAPIView):
     serializer_class = OrderItemsSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, SearchFilter]
-    # filterset_class = OrderItemFilter # Removed filterset_class
+    filterset_class = OrderItemFilter
     search_fields = ['product__name']
 
 
     def get_queryset(self):
         try:
             app_user = self.request.user.appuser
-            user_orders = Orders.objects.filter(user=app_user)
-            return OrderItems.objects.filter(order__in=user_orders)
+            return OrderItems.objects.filter(order__user=app_user)
         except AppUser.DoesNotExist:
             return OrderItems.objects.none()
 
 
-class OrderItemRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
+class OrderItemRetrieveUpdateDestroy(EagerLoadingViewMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = OrderItems.objects.all()
     serializer_class = OrderItemsSerializer
     lookup_field = 'order_item_id'
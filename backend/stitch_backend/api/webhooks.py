@@ -0,0 +1,273 @@
+# stitch_backend/api/webhooks.py
+"""
+GCash payment webhooks.
+
+The provider POSTs one JSON event per payment status change to
+/api/webhooks/gcash/ (GCashWebhookView in api/views.py):
+
+    {"id": "evt_...", "type": "payment.succeeded", "occurred_at": "2026-10-18T09:30:00Z",
+     "order_id": 1234, "transaction_id": "GC...", "amount": "499.00"}
+
+The body is signed with the shared secret (GCASH_WEBHOOK['SECRET']) in the
+header
+
+    X-GCash-Signature: t=<unix time>,v1=<hex HMAC-SHA256 of "<t>.<body>">
+
+The timestamp is part of the signed message. A captured request is
+therefore refused once it is older than TOLERANCE.
+
+The view only verifies the signature and stores the event. That is one
+INSERT that ignores a conflict on the unique event_id, so a redelivered
+event costs the same as a new one and is dropped by the database. The
+provider gets its 200 within milliseconds and never waits on payment or
+order locks.
+
+`manage.py process_webhooks` applies the stored events in batches. It
+claims Received events with SELECT ... FOR UPDATE SKIP LOCKED, then locks
+the orders and payments they refer to. Each order's events are applied in
+occurred_at order. An event older than one already processed for its order
+arrived late and is ignored, so a delayed "succeeded" cannot undo a later
+"refunded". Payment changes follow PAYMENT_TRANSITIONS and are written with
+one bulk_update per batch, together with their payment.status_changed outbox
+jobs. The order follows its payment (ORDER_EFFECTS).
+
+`manage.py send_webhook` signs and posts events to a local server, standing
+in for the provider.
+"""
+import hashlib
+import hmac
+import time
+from collections import Counter
+from datetime import timedelta, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import outbox
+from .models import (
+    ArchivedOrder, Orders, OrderStatus, PAYMENT_TRANSITIONS, Payments, PaymentStatus, PaymentWebhookEvent,
+    WebhookEventStatus,
+)
+
+HEADER = 'X-GCash-Signature'
+
+DEFAULTS = {
+    'SECRET': '',               # shared with the provider; events are refused while empty
+    'TOLERANCE': 5 * 60,        # seconds a signature's timestamp may differ from our clock
+    'BATCH_SIZE': 500,          # events applied per transaction
+    'RETENTION': 30 * 24 * 60 * 60, # seconds handled events are kept; redeliveries within it are deduplicated
+}
+
+# Provider event type -> payment status; other types are stored and ignored
+EVENT_STATUSES = {
+    'payment.succeeded': PaymentStatus.COMPLETED,
+    'payment.failed': PaymentStatus.FAILED,
+    'payment.expired': PaymentStatus.FAILED,
+    'payment.refunded': PaymentStatus.REFUNDED,
+}
+
+# Payment status -> the order_status changes it makes, within ORDER_TRANSITIONS. A failed
+# payment leaves the order Pending: the customer may still pay.
+ORDER_EFFECTS = {
+    PaymentStatus.COMPLETED: {OrderStatus.PENDING: OrderStatus.PROCESSING},
+    PaymentStatus.REFUNDED: {
+        OrderStatus.PENDING: OrderStatus.CANCELLED,
+        OrderStatus.PROCESSING: OrderStatus.CANCELLED,
+        OrderStatus.DELIVERED: OrderStatus.REFUNDED,
+    },
+}
+
+
+class InvalidSignature(Exception):
+    """The signature header is missing, malformed, expired or does not match the body."""
+
+
+class InvalidEvent(ValueError):
+    """The body is not an event this endpoint can store."""
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'GCASH_WEBHOOK', {})}
+
+
+def sign(body, secret, timestamp=None):
+    """The X-GCash-Signature header value for `body` (bytes)."""
+    timestamp = int(time.time() if timestamp is None else timestamp)
+    digest = hmac.new(secret.encode(), f'{timestamp}.'.encode() + body, hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={digest}'
+
+
+def verify(body, header, secret, tolerance, now=None):
+    """Raises InvalidSignature unless `header` is a current signature of `body`."""
+    try:
+        parts = dict(part.strip().split('=', 1) for part in (header or '').split(','))
+        timestamp = int(parts['t'])
+        signature = parts['v1']
+    except (KeyError, ValueError):
+        raise InvalidSignature(f'Missing or malformed {HEADER} header.')
+    if abs((time.time() if now is None else now) - timestamp) > tolerance:
+        raise InvalidSignature('Signature timestamp is outside the tolerance.')
+    if not hmac.compare_digest(sign(body, secret, timestamp), f't={timestamp},v1={signature}'):
+        raise InvalidSignature('Signature does not match.')
+
+
+def build_event(data):
+    """An unsaved PaymentWebhookEvent for a decoded event body. Raises InvalidEvent."""
+    if not isinstance(data, dict):
+        raise InvalidEvent('The body must be a JSON object.')
+    event_id, event_type = data.get('id'), data.get('type')
+    if not isinstance(event_id, str) or not event_id or len(event_id) > 255:
+        raise InvalidEvent('"id" must be a non-empty string of up to 255 characters.')
+    if not isinstance(event_type, str) or not event_type or len(event_type) > 64:
+        raise InvalidEvent('"type" must be a non-empty string of up to 64 characters.')
+    try:
+        occurred_at = parse_datetime(str(data.get('occurred_at', '')))
+    except ValueError:
+        occurred_at = None
+    if occurred_at is None:
+        raise InvalidEvent('"occurred_at" must be an ISO 8601 date and time.')
+    if timezone.is_naive(occurred_at):
+        occurred_at = timezone.make_aware(occurred_at, dt_timezone.utc)
+    order_id = data.get('order_id')
+    try:
+        order_id = int(order_id) if order_id not in (None, '') else None
+    except (TypeError, ValueError):
+        raise InvalidEvent('"order_id" must be an integer.')
+    return PaymentWebhookEvent(
+        event_id=event_id, event_type=event_type, order_id=order_id, occurred_at=occurred_at, payload=data,
+    )
+
+
+def store(event):
+    """Saves a received event with one INSERT; a duplicate event_id is silently dropped."""
+    PaymentWebhookEvent.objects.bulk_create([event], ignore_conflicts=True)
+
+
+def _amount(value):
+    try:
+        return Decimal(str(value).replace(',', ''))
+    except InvalidOperation:
+        return None
+
+
+def process_batch(batch_size=None, now=None):
+    """
+    Claims up to batch_size Received events and applies them in one
+    transaction. Returns a Counter of the events by resulting status, empty
+    when there was nothing to claim.
+    """
+    now = now or timezone.now()
+    outcomes = Counter()
+    with transaction.atomic():
+        events = list(
+            PaymentWebhookEvent.objects.select_for_update(skip_locked=True)
+            .filter(status=WebhookEventStatus.RECEIVED)
+            .order_by('received_at', 'pk')[:batch_size or get_config()['BATCH_SIZE']]
+        )
+        if not events:
+            return outcomes
+
+        order_ids = {event.order_id for event in events if event.order_id is not None}
+        # Orders before payments, like checkout. Another processor holding some of these orders
+        # makes this wait, so each order's events are applied by one processor at a time.
+        orders = dict(
+            Orders.objects.select_for_update().filter(pk__in=order_ids).order_by('pk').values_list('pk', 'order_status')
+        )
+        payments = {
+            payment.order_id: payment
+            for payment in Payments.objects.select_for_update().filter(order_id__in=orders).order_by('pk')
+        }
+        # Read after the locks, so it includes events processed by whoever held them before us
+        latest = dict(
+            PaymentWebhookEvent.objects.filter(order_id__in=order_ids, status=WebhookEventStatus.PROCESSED)
+            .order_by().values('order_id').annotate(latest=Max('occurred_at')).values_list('order_id', 'latest')
+        )
+        archived = set()
+        if order_ids - set(orders):
+            archived = set(
+                ArchivedOrder.objects.filter(pk__in=order_ids - set(orders)).values_list('pk', flat=True)
+            )
+
+        original = {order_id: payment.payment_status for order_id, payment in payments.items()}
+        original_orders = dict(orders)
+        changed = set()
+
+        def outcome(event, status, detail=None):
+            event.status, event.detail, event.processed_at = status, detail, now
+            outcomes[status] += 1
+
+        for event in sorted(events, key=lambda event: (event.order_id or 0, event.occurred_at, event.pk)):
+            status = EVENT_STATUSES.get(event.event_type)
+            payment = payments.get(event.order_id)
+            if status is None:
+                outcome(event, WebhookEventStatus.IGNORED, f'Unhandled event type {event.event_type!r}.')
+            elif payment is None:
+                if event.order_id in archived:
+                    outcome(event, WebhookEventStatus.IGNORED, 'The order is archived.')
+                else:
+                    outcome(event, WebhookEventStatus.FAILED, f'No payment for order {event.order_id}.')
+            elif event.order_id in latest and event.occurred_at < latest[event.order_id]:
+                outcome(event, WebhookEventStatus.IGNORED, 'Superseded by a later event for the order.')
+            elif 'amount' in event.payload and _amount(event.payload['amount']) != payment.amount:
+                outcome(event, WebhookEventStatus.FAILED, f'Amount {event.payload.get("amount")} does not match {payment.amount}.')
+            elif status == payment.payment_status:
+                latest[event.order_id] = event.occurred_at
+                outcome(event, WebhookEventStatus.PROCESSED, f'Already {status}.')
+            elif status not in PAYMENT_TRANSITIONS[payment.payment_status]:
+                outcome(event, WebhookEventStatus.IGNORED, f'A payment cannot go from {payment.payment_status} to {status}.')
+            else:
+                payment.payment_status = status
+                if status == PaymentStatus.COMPLETED:
+                    payment.paid_at = event.occurred_at
+                payment.transaction_id = payment.transaction_id or event.payload.get('transaction_id') or None
+                orders[event.order_id] = ORDER_EFFECTS.get(status, {}).get(orders[event.order_id], orders[event.order_id])
+                changed.add(event.order_id)
+                latest[event.order_id] = event.occurred_at
+                outcome(event, WebhookEventStatus.PROCESSED)
+
+        if changed:
+            for order_id in changed:
+                payments[order_id].updated_at = now
+            Payments.objects.bulk_update(
+                [payments[order_id] for order_id in changed],
+                ['payment_status', 'paid_at', 'transaction_id', 'updated_at'],
+            )
+            # bulk_update sends no post_save, so queue what the payment signal would have
+            outbox.enqueue_many([
+                ('payment.status_changed', {
+                    'payment_id': payments[order_id].pk,
+                    'order_id': order_id,
+                    'payment_status': payments[order_id].payment_status,
+                    'previous_status': original[order_id],
+                })
+                for order_id in changed
+            ])
+            by_status = {}
+            for order_id in changed:
+                if orders[order_id] != original_orders[order_id]:
+                    by_status.setdefault(orders[order_id], []).append(order_id)
+            for order_status, ids in by_status.items():
+                Orders.objects.filter(pk__in=ids).update(order_status=order_status, updated_at=now)
+
+        PaymentWebhookEvent.objects.bulk_update(events, ['status', 'detail', 'processed_at'])
+    return outcomes
+
+
+def purge_handled(now=None, batch_size=1000):
+    """Deletes handled events received more than RETENTION ago. Returns the number deleted."""
+    cutoff = (now or timezone.now()) - timedelta(seconds=get_config()['RETENTION'])
+    purged = 0
+    while True:
+        pks = list(
+            PaymentWebhookEvent.objects.filter(
+                status__in=[WebhookEventStatus.PROCESSED, WebhookEventStatus.IGNORED, WebhookEventStatus.FAILED],
+                received_at__lt=cutoff,
+            ).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not pks:
+            return purged
+        purged += PaymentWebhookEvent.objects.filter(pk__in=pks).delete()[0]
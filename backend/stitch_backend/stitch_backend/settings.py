@@ -48,11 +48,92 @@ REST_FRAMEWORK = {
         "django_filters.rest_framework.DjangoFilterBackend",
         "rest_framework.filters.SearchFilter",
     ),
-    # Add pagination if you have it defined globally (e.g., in views.py CustomPagination)
-    # "DEFAULT_PAGINATION_CLASS": "api.views.CustomPagination", # Uncomment and adjust path if you have a global pagination class
-    # "PAGE_SIZE": 10, # Example page size if global pagination is used
+    # Cursor pagination on (created_at, pk) for every list view; ?page=<n> opts into the
+    # count/next/previous/total_pages envelope of api.pagination.CustomPagination
+    "DEFAULT_PAGINATION_CLASS": "api.pagination.KeysetPagination",
+    "PAGE_SIZE": 20,
+    # orjson-backed JSON (see api/renderers.py); falls back to DRF's stdlib json if orjson is missing
+    "DEFAULT_RENDERER_CLASSES": (
+        "api.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+    "DEFAULT_PARSER_CLASSES": (
+        "api.renderers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ),
+}
+
+# Above this many rows the offset pagination count comes from table statistics instead of COUNT(*)
+ESTIMATED_COUNT_THRESHOLD = 10000
+
+# Most relevant hits kept per product search (?search=), see api/search.py
+PRODUCT_SEARCH_MAX_HITS = 500
+
+# Lower bounds of the price ranges reported by /api/products/facets/ (the last range is open-ended)
+PRODUCT_PRICE_BUCKETS = [0, 10, 25, 50, 100]
+
+# Best-seller ranking windows served by /api/products/top/ (days; None = all time).
+# Run `manage.py rebuild_rankings` at least daily so sales age out of the shorter windows.
+PRODUCT_RANKING_WINDOWS = {"1d": 1, "7d": 7, "30d": 30, "all": None}
+
+# Largest batch accepted by PATCH /api/products/bulk/
+PRODUCT_BULK_UPDATE_MAX_ITEMS = 1000
+
+# Largest batch accepted by POST /api/orders/transition/
+ORDER_TRANSITION_MAX_ORDERS = 1000
+
+# Largest batch accepted by POST /api/cart/items/batch/
+CART_BATCH_MAX_OPERATIONS = 100
+
+# Carts expire this long after their last change; `manage.py sweep_carts` empties expired ones
+CART_TTL = timedelta(days=int(os.getenv("CART_TTL_DAYS", 30)))
+
+# Holds on hot-product stock (POST /api/reservations/) lapse after this; `manage.py reap_reservations`
+# returns lapsed units to their inventory slots
+INVENTORY_RESERVATION_TTL = timedelta(minutes=int(os.getenv("RESERVATION_TTL_MINUTES", 10)))
+# Most units of one product (or size) a user may hold at once, over all their live holds
+INVENTORY_RESERVATION_MAX_QUANTITY = 10
+
+# Idempotency-Key handling for order, payment, checkout and registration POSTs (see api/idempotency.py).
+# `manage.py purge_idempotency_keys` deletes expired keys.
+IDEMPOTENCY = {
+    "TTL": int(os.getenv("IDEMPOTENCY_TTL", 60 * 60 * 24)), # Seconds a stored response is replayed to retries
+    "WAIT_TIMEOUT": 10, # Seconds a duplicate waits for the original to finish before answering 409
+    "LOCK_TIMEOUT": 60, # Seconds after which an unfinished original is presumed dead and may be retried
+}
+
+# Closed orders unchanged for this many days are moved to the archive tables by `manage.py archive_orders`
+ORDER_ARCHIVE_AFTER_DAYS = int(os.getenv("ORDER_ARCHIVE_AFTER_DAYS", 365))
+
+# Transactional outbox for order and payment side effects (see api/outbox.py and api/jobs.py).
+# `manage.py run_worker` runs the jobs; GET /api/outbox/stats/ reports queue depth and latency.
+OUTBOX = {
+    "BATCH_SIZE": int(os.getenv("OUTBOX_BATCH_SIZE", 20)), # Jobs a worker claims per round trip
+    "MAX_ATTEMPTS": 8, # Failed attempts before a job is parked as Failed
+    "VISIBILITY_TIMEOUT": 5 * 60, # Seconds a claimed job may run before another worker may take it over
 }
 
+# GCash payment webhooks (see api/webhooks.py). POST /api/webhooks/gcash/ stores signed events;
+# `manage.py process_webhooks` applies them. Events are refused until the secret is set.
+GCASH_WEBHOOK = {
+    "SECRET": os.getenv("GCASH_WEBHOOK_SECRET", ""),
+    "TOLERANCE": 5 * 60, # Seconds a signature's timestamp may be off, which bounds replays
+    "BATCH_SIZE": int(os.getenv("GCASH_WEBHOOK_BATCH_SIZE", 500)), # Events applied per transaction
+}
+
+# Products or variants an order leaves at or below this stock are reported to ADMINS
+INVENTORY_LOW_STOCK_THRESHOLD = int(os.getenv("INVENTORY_LOW_STOCK_THRESHOLD", 5))
+
+# Outgoing email (order confirmations, payment receipts). Printed to the console unless configured.
+EMAIL_BACKEND = os.getenv("EMAIL_BACKEND", "django.core.mail.backends.console.EmailBackend")
+EMAIL_HOST = os.getenv("EMAIL_HOST", "localhost")
+EMAIL_PORT = int(os.getenv("EMAIL_PORT", 25))
+EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER", "")
+EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD", "")
+EMAIL_USE_TLS = os.getenv("EMAIL_USE_TLS", "False") == "True"
+DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", "Stitch Shop <no-reply@stitchshop.local>")
+
 # Simple JWT settings (standard configuration for tokens in response body)
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60), # Standard lifetime, adjust as needed
@@ -88,6 +169,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "api.middleware.CompressionMiddleware", # Before anything that reads or edits the response body
+    "api.middleware.QueryCaptureMiddleware", # Dev/staging only; inactive unless QUERY_CAPTURE is enabled
     "corsheaders.middleware.CorsMiddleware", # Placed early to allow CORS headers
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -97,6 +180,21 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# SQL capture for `manage.py advise_indexes` (see api/querylog.py). Development and staging only:
+# every request appends its normalised, timed statements to PATH.
+QUERY_CAPTURE = {
+    "ENABLED": os.getenv("QUERY_CAPTURE", "False") == "True",
+    "PATH": os.getenv("QUERY_CAPTURE_PATH", str(BASE_DIR / "query_capture.jsonl")),
+    "MIN_MS": float(os.getenv("QUERY_CAPTURE_MIN_MS", 0)), # Skip requests that spent less than this in SQL
+}
+
+# Response compression (see api/middleware.py). Brotli is used only when the Brotli package is installed.
+RESPONSE_COMPRESSION = {
+    "MIN_SIZE": int(os.getenv("COMPRESSION_MIN_SIZE", 1024)), # Bytes; smaller bodies aren't worth the CPU
+    "ENCODINGS": ["br", "gzip"], # Preference order when the client accepts both equally
+    "BROTLI_QUALITY": 5,
+}
+
 ROOT_URLCONF = "stitch_backend.urls"
 
 TEMPLATES = [
@@ -132,6 +230,26 @@ DATABASES = {
 }
 
 
+# Caching
+# Local memory works for development and tests. In production point CACHE_BACKEND/CACHE_LOCATION
+# at a shared cache (e.g. django.core.cache.backends.redis.RedisCache + redis://host:6379/0)
+# so every worker process sees the same catalog version.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", "stitch-shop"),
+    }
+}
+
+# Read-through cache for product/category reads (see api/cache.py)
+CATALOG_CACHE = {
+    "ALIAS": "default",
+    "TIMEOUT": int(os.getenv("CATALOG_CACHE_TIMEOUT", 60 * 15)), # Seconds; catalog edits and sell-outs invalidate at once, stock is served live
+    "LOCK_TIMEOUT": 10, # Seconds a single rebuild of a cold key may hold the rebuild lock
+    "WAIT_TIMEOUT": 5,  # Seconds concurrent readers wait for that rebuild before building themselves
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
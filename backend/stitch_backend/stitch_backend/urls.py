@@ -15,13 +15,15 @@ from rest_framework_simplejwt.views import (
 from api.views import ( # Assuming your app's views are in 'api'
     CreateUserView,
     AppUserListCreate, AppUserRetrieveUpdateDestroy,
-    CategoryListCreate, CategoryRetrieveUpdateDestroy,
+    CategoryListCreate, CategoryRetrieveUpdateDestroy, CategoryTreeView,
     AddressListCreate, AddressRetrieveUpdateDestroy,
     ShoppingCartListCreate, ShoppingCartRetrieveUpdateDestroy,
-    ProductListCreate, ProductRetrieveUpdateDestroy,
-    OrderListCreate, OrderRetrieveUpdateDestroy,
-    PaymentListCreate, PaymentRetrieveUpdateDestroy,
-    CartItemListCreate, CartItemRetrieveUpdateDestroy,
+    ProductListCreate, ProductRetrieveUpdateDestroy, ProductFacetsView, ProductTopView,
+    ProductBulkUpdateView, ProductVariantListCreate, ProductVariantRetrieveUpdateDestroy,
+    OrderListCreate, OrderRetrieveUpdateDestroy, OrderTransitionView,
+    PaymentListCreate, PaymentRetrieveUpdateDestroy, OutboxStatsView, GCashWebhookView,
+    CartItemListCreate, CartItemRetrieveUpdateDestroy, CartSummaryView,
+    CartItemBatchView, CheckoutView, ReservationListCreate, ReservationRelease,
     OrderItemListCreate, OrderItemRetrieveUpdateDestroy,
     ProtectedView,
     UserDetailView, # For getting current user's details (still useful)
@@ -47,6 +49,7 @@ urlpatterns = [
 
     path("api/categories/", CategoryListCreate.as_view(), name="category-list-create"),
     path("api/categories/<int:category_id>/", CategoryRetrieveUpdateDestroy.as_view(), name="category-detail"),
+    path("api/categories/tree/", CategoryTreeView.as_view(), name="category-tree"),
 
     path("api/addresses/", AddressListCreate.as_view(), name="address-list-create"),
     path("api/addresses/<int:address_id>/", AddressRetrieveUpdateDestroy.as_view(), name="address-detail"),
@@ -56,15 +59,28 @@ urlpatterns = [
 
     path("api/products/", ProductListCreate.as_view(), name="product-list-create"),
     path("api/products/<int:product_id>/", ProductRetrieveUpdateDestroy.as_view(), name="product-detail"),
+    path("api/products/facets/", ProductFacetsView.as_view(), name="product-facets"),
+    path("api/products/top/", ProductTopView.as_view(), name="product-top"),
+    path("api/products/bulk/", ProductBulkUpdateView.as_view(), name="product-bulk-update"),
+    path("api/products/<int:product_id>/variants/", ProductVariantListCreate.as_view(), name="product-variant-list-create"),
+    path("api/variants/<int:variant_id>/", ProductVariantRetrieveUpdateDestroy.as_view(), name="product-variant-detail"),
 
     path("api/orders/", OrderListCreate.as_view(), name="order-list-create"),
     path("api/orders/<int:order_id>/", OrderRetrieveUpdateDestroy.as_view(), name="order-detail"),
+    path("api/orders/transition/", OrderTransitionView.as_view(), name="order-transition"),
 
     path("api/payments/", PaymentListCreate.as_view(), name="payment-list-create"),
     path("api/payments/<int:payment_id>/", PaymentRetrieveUpdateDestroy.as_view(), name="payment-detail"),
+    path("api/outbox/stats/", OutboxStatsView.as_view(), name="outbox-stats"),
+    path("api/webhooks/gcash/", GCashWebhookView.as_view(), name="gcash-webhook"),
 
     path("api/cartitems/", CartItemListCreate.as_view(), name="cartitem-list-create"),
     path("api/cartitems/<int:cart_item_id>/", CartItemRetrieveUpdateDestroy.as_view(), name="cartitem-detail"),
+    path("api/cart/summary/", CartSummaryView.as_view(), name="cart-summary"),
+    path("api/cart/items/batch/", CartItemBatchView.as_view(), name="cart-items-batch"),
+    path("api/checkout/", CheckoutView.as_view(), name="checkout"),
+    path("api/reservations/", ReservationListCreate.as_view(), name="reservation-list-create"),
+    path("api/reservations/<int:reservation_id>/", ReservationRelease.as_view(), name="reservation-release"),
 
     path("api/orderitems/", OrderItemListCreate.as_view(), name="orderitem-list-create"),
     path("api/orderitems/<int:order_item_id>/", OrderItemRetrieveUpdateDestroy.as_view(), name="orderitem-detail"),